@@ -0,0 +1,18 @@
+from fastapi import Request
+
+from services.job_queue import JobQueue
+from services.llm_service import LLMService
+
+
+def get_llm_service(request: Request) -> LLMService:
+    """
+    Fournit l'instance de `LLMService` créée au démarrage de l'application.
+    """
+    return request.app.state.services.llm_service
+
+
+def get_job_queue(request: Request) -> JobQueue:
+    """
+    Fournit la file de tâches asynchrones créée au démarrage de l'application.
+    """
+    return request.app.state.services.job_queue
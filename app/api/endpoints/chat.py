@@ -1,15 +1,19 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from typing import List
+from core.config import Config
 from services.llm_service import LLMService
-from models.models import User, Message, ChatResponse, RegisterRequest, LoginRequest, AskRequest, SessionResponse
-from typing import Optional
+from services.job_queue import JobQueue, JobQueueFull
+from api.dependencies import get_llm_service, get_job_queue
+from models.models import User, Message, ChatResponse, RegisterRequest, LoginRequest, AskRequest, SessionResponse, JobResponse, SummaryResponse
+from typing import Literal, Optional, Union
 import logging 
+import json
 from datetime import datetime
 router = APIRouter()
-llm_service = LLMService()
 
 @router.post("/register", response_model=User)
-async def register_user(request: RegisterRequest):
+async def register_user(request: RegisterRequest, llm_service: LLMService = Depends(get_llm_service)):
     """
     Crée un nouvel utilisateur avec des informations obligatoires.
     """
@@ -34,7 +38,7 @@ async def register_user(request: RegisterRequest):
 
 
 @router.post("/login")
-async def login_user(request: LoginRequest):
+async def login_user(request: LoginRequest, llm_service: LLMService = Depends(get_llm_service)):
     """
     Authentifie un utilisateur et crée une nouvelle session.
     """
@@ -61,47 +65,124 @@ async def login_user(request: LoginRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la connexion : {str(e)}")
 
-@router.post("/ask", response_model=ChatResponse)
-async def ask_question(request: AskRequest):
+def _format_sse(event: dict) -> str:
+    """
+    Sérialise un événement au format Server-Sent Events.
+    """
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False, default=str)}\n\n"
+
+
+@router.post("/ask", response_model=Union[ChatResponse, JobResponse])
+async def ask_question(request: AskRequest, http_response: Response,
+                       mode: Literal["sync", "async"] = Query("sync"),
+                       llm_service: LLMService = Depends(get_llm_service),
+                       job_queue: JobQueue = Depends(get_job_queue)):
     """
     Permet à l'utilisateur de poser une question. Crée une nouvelle session si aucune session active n'existe.
+    En mode `async`, la question est mise en file et l'identifiant de la tâche est renvoyé immédiatement
+    (202) ; le résultat est ensuite consulté via `/jobs/{job_id}`.
     """
-    try:
-        # Récupérer une session active ou en créer une nouvelle
-        session = await llm_service.mongo_service.conversations_collection.find_one(
-            {"user_id": request.user_id, "is_active": True}
-        )
+    if mode == "async":
+        try:
+            job = await job_queue.submit(request)
+        except JobQueueFull:
+            raise HTTPException(status_code=503, detail="Serveur surchargé, veuillez réessayer plus tard.",
+                                headers={"Retry-After": "5"})
+        http_response.status_code = 202
+        return JobResponse(**job)
 
-        if not session:
-            # Créer une nouvelle session si aucune n'existe
-            session_id = await llm_service.create_new_session(request.user_id)
-        else:
-            session_id = session["session_id"]
+    try:
+        # Récupérer la session active et son historique en une requête, ou en créer une nouvelle
+        session = await llm_service.resolve_active_session(request.user_id)
 
         # Appeler la génération de réponse
-        response = await llm_service.generate_response(request.question, session_id, request.user_id)
+        response = await llm_service.generate_response(
+            request.question, session["session_id"], request.user_id, session,
+            response_mode=request.response_mode, include_items=request.include_items
+        )
         return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur serveur : {str(e)}")
+
+
+@router.post("/ask/stream")
+async def ask_question_stream(request: AskRequest, llm_service: LLMService = Depends(get_llm_service)):
+    """
+    Version streamée de `/ask` (Server-Sent Events) : les tokens de la réponse et la progression
+    des appels d'outils sont envoyés dès qu'ils sont disponibles.
+    """
+    try:
+        session = await llm_service.resolve_active_session(request.user_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur serveur : {str(e)}")
 
+    async def event_stream():
+        async for event in llm_service.stream_response(
+            request.question, session["session_id"], request.user_id, session,
+            response_mode=request.response_mode, include_items=request.include_items
+        ):
+            yield _format_sse(event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stats")
+async def get_stats(llm_service: LLMService = Depends(get_llm_service), job_queue: JobQueue = Depends(get_job_queue)):
+    """
+    Indicateurs de charge : limiteur d'appels au LLM (file d'attente, temps d'attente, rejets), caches et tâches.
+    """
+    return {**llm_service.stats(), "jobs": job_queue.stats()}
+
 
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, job_queue: JobQueue = Depends(get_job_queue)):
+    """
+    Retourne l'état d'une tâche asynchrone et, une fois terminée, la réponse générée.
+    """
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Tâche introuvable ou expirée.")
+    return JobResponse(**job)
 
 
 @router.get("/users/{user_id}/messages", response_model=List[Message])
-async def get_user_messages(user_id: str, session_id: Optional[str] = None):
+async def get_user_messages(user_id: str, response: Response, session_id: Optional[str] = None,
+                            before: Optional[int] = Query(None, ge=0), after: Optional[int] = Query(None, ge=0),
+                            offset: Optional[int] = Query(None, ge=0), limit: Optional[int] = Query(None, ge=1, le=500),
+                            llm_service: LLMService = Depends(get_llm_service)):
+    """
+    Récupère une page de messages d'une session (par défaut la plus récemment mise à jour).
+    Curseurs : `before` (messages précédant cette position), `after` (messages suivant cette position) ;
+    sans curseur, les `limit` derniers messages. `offset` conserve l'ancienne pagination par décalage.
+    Les curseurs des pages voisines sont renvoyés dans les en-têtes `X-Prev-Cursor` et `X-Next-Cursor`.
+    """
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="`before` et `after` ne peuvent pas être combinés.")
     try:
-        query = {"user_id": user_id}
-        if session_id:
-            query["session_id"] = session_id
-
-        # Trouver UNE conversation (session) spécifique
-        conversation = await llm_service.mongo_service.conversations_collection.find_one(query)
+        # Trouver UNE conversation (session) spécifique, sans charger ses messages
+        conversation = await llm_service.mongo_service.find_session_meta(user_id, session_id)
 
         if not conversation:
             return []
 
-        # Extraire les messages de cette session
-        messages = conversation.get("messages", [])
+        if offset is not None:
+            messages = await llm_service.get_messages_page(conversation, offset=offset, limit=limit)
+            return [Message(**msg) for msg in messages]
+
+        # Extraire la page de messages demandée
+        messages, start, count = await llm_service.get_messages_range(
+            conversation, limit or Config.message_page_size, before=before, after=after
+        )
+        if start > 0:
+            response.headers["X-Prev-Cursor"] = str(start)  # À passer dans `before`
+        if messages and start + len(messages) < count:
+            response.headers["X-Next-Cursor"] = str(start + len(messages) - 1)  # À passer dans `after`
         return [Message(**msg) for msg in messages]
 
     except Exception as e:
@@ -109,25 +190,42 @@ async def get_user_messages(user_id: str, session_id: Optional[str] = None):
         raise HTTPException(status_code=500, detail="Erreur interne du serveur.")
 
     
+@router.get("/sessions/{session_id}/summary", response_model=SummaryResponse)
+async def get_session_summary(session_id: str, llm_service: LLMService = Depends(get_llm_service)):
+    """
+    Retourne le résumé d'une session (complet, en points, en une ligne), tel qu'enregistré :
+    il est mis à jour en tâche de fond tous les `SUMMARY_EVERY_MESSAGES` nouveaux messages.
+    """
+    return await llm_service.get_session_summary(session_id)
+
+
 @router.get("/users/{user_id}/sessions", response_model=List[SessionResponse])
-async def get_user_sessions(user_id: str):
+async def get_user_sessions(user_id: str, response: Response, cursor: Optional[str] = None,
+                            limit: Optional[int] = Query(None, ge=1, le=200),
+                            llm_service: LLMService = Depends(get_llm_service)):
     """
-    Récupère toutes les sessions pour un utilisateur donné.
+    Récupère les sessions d'un utilisateur (métadonnées seulement), des plus récentes aux plus anciennes.
+    Le curseur de la page suivante est renvoyé dans l'en-tête `X-Next-Cursor` (paramètre `cursor`).
     """
     try:
-        sessions = await llm_service.mongo_service.conversations_collection.find({"user_id": user_id}).to_list(length=None)
-        if not sessions:
-            return []
-
-        return [
-            SessionResponse(
-                session_id=session["session_id"],
-                created_at=session.get("created_at", datetime.utcnow()),
-                updated_at=session.get("updated_at", datetime.utcnow()),
-                is_active=session.get("is_active", True),
-            )
-            for session in sessions
-        ]
+        sessions, next_cursor = await llm_service.mongo_service.list_sessions(
+            user_id, limit or Config.session_page_size, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logging.error(f"Erreur lors de la récupération des sessions pour l'utilisateur {user_id} : {e}")
         raise HTTPException(status_code=500, detail="Erreur interne du serveur.")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    return [
+        SessionResponse(
+            session_id=session["session_id"],
+            created_at=session.get("created_at", datetime.utcnow()),
+            updated_at=session.get("updated_at", datetime.utcnow()),
+            is_active=session.get("is_active", True),
+            message_count=session.get("message_count", 0),
+        )
+        for session in sessions
+    ]
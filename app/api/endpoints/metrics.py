@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Request, Response
+
+from core.metrics import render_metrics, update_service_gauges
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """
+    Expose les métriques au format texte Prometheus (métriques du worker courant).
+    """
+    services = request.app.state.services
+    update_service_gauges({**services.llm_service.stats(), "jobs": services.job_queue.stats()})
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
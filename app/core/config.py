@@ -6,13 +6,113 @@ load_dotenv()
 
 class Config:
     """
-    Classe de configuration pour MongoDB.
+    Classe de configuration de l'application (MongoDB, stockage et historique des conversations).
     Charge les variables depuis le fichier .env ou utilise des valeurs par défaut.
     """
     mongodb_uri = os.getenv("MONGODB_URI", "")  # URI MongoDB (obligatoire)
     database_name = os.getenv("DATABASE_NAME", "default_db")  # Nom de la base de données
     collection_name = os.getenv("COLLECTION_NAME", "default_collection")  # Nom de la collection
 
+    # ---- Pool de connexions MongoDB ----
+    mongo_max_pool_size = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))  # Connexions max par worker
+    mongo_min_pool_size = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))  # Connexions gardées ouvertes
+    mongo_max_idle_time_ms = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000"))  # Fermeture des connexions inactives
+    mongo_connect_timeout_ms = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+    mongo_server_selection_timeout_ms = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    mongo_socket_timeout_ms = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "20000"))
+    mongo_compressors = os.getenv("MONGO_COMPRESSORS", "")  # ex: "zstd,snappy" (paquets zstandard / python-snappy)
+
+    auto_create_indexes = os.getenv("AUTO_CREATE_INDEXES", "true").lower() == "true"  # Index créés au démarrage
+
+    # ---- Stockage des conversations ----
+    conversation_storage = os.getenv("CONVERSATION_STORAGE", "embedded")  # embedded | bucket
+    bucket_size = int(os.getenv("BUCKET_SIZE", "100"))  # Nombre de messages par bucket
+    session_page_size = int(os.getenv("SESSION_PAGE_SIZE", "20"))  # Sessions par page (liste des sessions)
+    message_page_size = int(os.getenv("MESSAGE_PAGE_SIZE", "50"))  # Messages par page (historique d'une session)
+
+    # ---- Sessions actives en mémoire (write-through vers MongoDB) ----
+    session_store_enabled = os.getenv("SESSION_STORE_ENABLED", "false").lower() == "true"  # Avec affinité de session
+    session_store_max_sessions = int(os.getenv("SESSION_STORE_MAX_SESSIONS", "10000"))
+    session_store_max_bytes = int(os.getenv("SESSION_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+    session_store_idle_ttl = float(os.getenv("SESSION_STORE_IDLE_TTL", "900"))  # Éviction après inactivité (s)
+
+    # ---- Écriture différée des messages (write-behind, par lots) ----
+    write_behind_enabled = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+    write_behind_batch_size = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))  # Messages en attente déclenchant l'écriture
+    write_behind_flush_seconds = float(os.getenv("WRITE_BEHIND_FLUSH_SECONDS", "0.5"))  # Délai max avant écriture
+    write_behind_max_pending = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "5000"))  # Au-delà, l'appelant attend l'écriture
+    write_behind_max_wait_seconds = float(os.getenv("WRITE_BEHIND_MAX_WAIT_SECONDS", "5"))  # Puis la sauvegarde est refusée (503)
+    write_behind_spill_path = os.getenv("WRITE_BEHIND_SPILL_PATH", "")  # Fichier de débordement ("" = aucun)
+    write_behind_write_concern = os.getenv("WRITE_BEHIND_WRITE_CONCERN", "1")  # 0 | 1 | majority
+    write_behind_journal = os.getenv("WRITE_BEHIND_JOURNAL", "false").lower() == "true"
+
+    # ---- Outils (vols, hôtels, restaurants, météo) ----
+    tool_max_results = int(os.getenv("TOOL_MAX_RESULTS", "10"))  # Résultats max renvoyés au LLM par appel
+    tool_timeout_seconds = float(os.getenv("TOOL_TIMEOUT_SECONDS", "10"))  # Délai max de chaque appel d'outil
+    response_mode = os.getenv("RESPONSE_MODE", "llm")  # llm | template | auto : présentation des résultats d'outils
+    response_mode_tools = os.getenv("RESPONSE_MODE_TOOLS", "")  # Surcharge par outil, ex: "get_weather_info=template"
+    tool_cache_enabled = os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true"
+    tool_cache_ttls = os.getenv(  # TTL par outil, en secondes
+        "TOOL_CACHE_TTLS",
+        "get_flights_info=300,get_hotels_info=3600,get_restaurants_info=3600,get_weather_info=1800"
+    )
+    tool_cache_max_entries = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "5000"))
+    tool_cache_max_bytes = int(os.getenv("TOOL_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+    # ---- Moteur de catalogue en mémoire (lecture des outils sans MongoDB) ----
+    catalog_engine_enabled = os.getenv("CATALOG_ENGINE_ENABLED", "false").lower() == "true"
+    catalog_engine_refresh_seconds = float(os.getenv("CATALOG_ENGINE_REFRESH_SECONDS", "86400"))  # 0 = jamais
+    catalog_engine_watch = os.getenv("CATALOG_ENGINE_WATCH", "false").lower() == "true"  # Rechargement par change stream
+
+    # ---- Résolution des villes et cuisines (valeurs distinctes du catalogue) ----
+    resolver_enabled = os.getenv("RESOLVER_ENABLED", "true").lower() == "true"
+    resolver_refresh_seconds = float(os.getenv("RESOLVER_REFRESH_SECONDS", "3600"))  # 0 = chargement au démarrage seulement
+    resolver_min_similarity = float(os.getenv("RESOLVER_MIN_SIMILARITY", "0.45"))  # Similarité min. des trigrammes
+    city_aliases = os.getenv("CITY_ALIASES", "")  # Alias supplémentaires, ex: "Big Apple=New York"
+    cuisine_aliases = os.getenv("CUISINE_ALIASES", "")  # ex: "ramen=japonaise"
+
+    # ---- Routage local des questions simples (sans appel au LLM pour choisir l'outil) ----
+    intent_router_enabled = os.getenv("INTENT_ROUTER_ENABLED", "false").lower() == "true"  # Nécessite le résolveur
+    intent_router_min_confidence = float(os.getenv("INTENT_ROUTER_MIN_CONFIDENCE", "0.6"))
+
+    # ---- Cache des réponses (questions répétées) ----
+    response_cache_enabled = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+    response_cache_semantic = os.getenv("RESPONSE_CACHE_SEMANTIC", "true").lower() == "true"  # Similarité d'embeddings
+    response_cache_embedding_model = os.getenv("RESPONSE_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+    response_cache_similarity = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))  # Seuil de similarité cosinus
+    response_cache_ttl = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    response_cache_max_entries = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+    response_cache_watch_catalog = os.getenv("RESPONSE_CACHE_WATCH_CATALOG", "false").lower() == "true"  # Change streams
+
+    # ---- Appels au LLM (OpenAI) ----
+    llm_max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))  # Appels simultanés max par worker
+    llm_requests_per_minute = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))  # 0 = pas de limite
+    llm_tokens_per_minute = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))  # 0 = pas de limite
+    llm_completion_tokens_estimate = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "500"))  # Tokens de réponse comptés d'avance
+    llm_max_queue_wait = float(os.getenv("LLM_MAX_QUEUE_WAIT", "10"))  # Attente max (s) avant de répondre 503
+    llm_max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))  # Nouvelles tentatives sur 429 / 5xx
+
+    # ---- Traitement asynchrone (/chat/ask?mode=async) ----
+    job_workers = int(os.getenv("JOB_WORKERS", "4"))  # Questions traitées simultanément par worker uvicorn
+    job_queue_size = int(os.getenv("JOB_QUEUE_SIZE", "100"))  # Au-delà, les nouvelles tâches sont refusées (503)
+    job_ttl_seconds = int(os.getenv("JOB_TTL_SECONDS", "86400"))  # Conservation des résultats dans `jobs`
+
+    # ---- Historique envoyé au LLM ----
+    history_mode = os.getenv("HISTORY_MODE", "last_n")  # full | last_n | token_budget | summary
+    history_max_turns = int(os.getenv("HISTORY_MAX_TURNS", "10"))  # Nombre de tours (question + réponse) conservés
+    history_token_budget = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))  # Budget de tokens pour l'historique
+    history_align_turns = int(os.getenv("HISTORY_ALIGN_TURNS", "4"))  # last_n : la fenêtre avance par blocs (1 = à chaque tour)
+
+    # ---- Résumé incrémental des sessions (toujours actif en mode d'historique `summary`) ----
+    summary_enabled = os.getenv("SUMMARY_ENABLED", "false").lower() == "true"
+    summary_every_messages = int(os.getenv("SUMMARY_EVERY_MESSAGES", "10"))  # Nouveaux messages déclenchant une mise à jour
+    summary_max_batch = int(os.getenv("SUMMARY_MAX_BATCH", "40"))  # Messages max envoyés au LLM par mise à jour
+
+    # ---- Assemblage des requêtes au LLM ----
+    llm_model = os.getenv("LLM_MODEL", "gpt-4o")
+    prompt_token_budget = int(os.getenv("PROMPT_TOKEN_BUDGET", "12000"))  # Tokens max par requête (0 = sans limite)
+    prompt_trim_turns = int(os.getenv("PROMPT_TRIM_TURNS", "4"))  # Tours retirés d'un coup au-delà du budget
+
     @staticmethod
     def validate():
         """
@@ -24,6 +124,12 @@ class Config:
             raise ValueError("La variable d'environnement DATABASE_NAME n'est pas définie.")
         if not Config.collection_name:
             raise ValueError("La variable d'environnement COLLECTION_NAME n'est pas définie.")
+        if Config.conversation_storage not in ("embedded", "bucket"):
+            raise ValueError(f"CONVERSATION_STORAGE invalide : {Config.conversation_storage}")
+        if Config.response_mode not in ("llm", "template", "auto"):
+            raise ValueError(f"RESPONSE_MODE invalide : {Config.response_mode}")
+        if Config.history_mode not in ("full", "last_n", "token_budget", "summary"):
+            raise ValueError(f"HISTORY_MODE invalide : {Config.history_mode}")
 
 # Validation des paramètres
 Config.validate()
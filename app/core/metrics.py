@@ -0,0 +1,155 @@
+# core/metrics.py
+"""
+Métriques Prometheus de l'application et en-tête `Server-Timing` par requête.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Bornes adaptées aux étapes rapides (MongoDB) comme aux appels au LLM
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "chatbot_http_request_duration_seconds", "Durée des requêtes HTTP.",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+STAGE_DURATION = Histogram(
+    "chatbot_stage_duration_seconds", "Durée de chaque étape du traitement d'une question.",
+    ["stage", "tool"], buckets=LATENCY_BUCKETS
+)
+STAGE_ERRORS = Counter(
+    "chatbot_stage_errors_total", "Étapes terminées par une exception.", ["stage", "tool"]
+)
+LLM_TOKENS = Counter(
+    "chatbot_llm_tokens_total", "Tokens consommés par les appels au LLM.", ["purpose", "kind"]
+)
+PROMPT_TOKENS = Histogram(
+    "chatbot_prompt_tokens", "Tokens de chaque partie des requêtes au LLM (comptés localement).", ["part"],
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+)
+LLM_QUEUE_WAIT = Histogram(
+    "chatbot_llm_queue_wait_seconds", "Attente d'un créneau avant un appel au LLM.", buckets=LATENCY_BUCKETS
+)
+LLM_QUEUE_DEPTH = Gauge("chatbot_llm_queue_depth", "Appels au LLM en attente d'un créneau.")
+LLM_IN_FLIGHT = Gauge("chatbot_llm_in_flight", "Appels au LLM en cours.")
+LLM_CONCURRENCY_LIMIT = Gauge("chatbot_llm_concurrency_limit", "Limite de concurrence courante vers le LLM.")
+LLM_REJECTED = Counter("chatbot_llm_rejected_total", "Appels au LLM rejetés pour surcharge.")
+LLM_RETRIES = Counter("chatbot_llm_retries_total", "Nouvelles tentatives d'appel au LLM.")
+INTENT_ROUTES = Counter(
+    "chatbot_intent_routes_total", "Questions routées localement (par outil) ou confiées au LLM (`llm`).", ["route"]
+)
+JOBS_QUEUED = Gauge("chatbot_jobs_queued", "Tâches asynchrones en attente.")
+MESSAGES_PENDING = Gauge("chatbot_messages_pending", "Messages en attente d'écriture différée.")
+MESSAGE_FLUSH_FAILURES = Counter("chatbot_message_flush_failures_total", "Échecs d'écriture différée des messages.")
+CACHE_HIT_RATE = Gauge("chatbot_cache_hit_rate", "Taux de succès des caches.", ["cache"])
+CATALOG_MEMORY_BYTES = Gauge("chatbot_catalog_memory_bytes", "Mémoire du catalogue en mémoire.", ["collection"])
+CATALOG_DOCUMENTS = Gauge("chatbot_catalog_documents", "Documents chargés dans le catalogue en mémoire.", ["collection"])
+
+# Étapes mesurées pendant la requête en cours (pour l'en-tête Server-Timing)
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def timed(stage: str, tool: str = ""):
+    """
+    Mesure la durée d'une étape : histogramme Prometheus et, si une requête HTTP est en cours,
+    entrée de l'en-tête Server-Timing.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage, tool).inc()
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - started, tool)
+
+
+def observe_stage(stage: str, elapsed: float, tool: str = "") -> None:
+    """Enregistre la durée d'une étape mesurée hors de `timed`."""
+    STAGE_DURATION.labels(stage, tool).observe(elapsed)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((f"{stage}_{tool}" if tool else stage, elapsed))
+
+
+def cached_prompt_tokens(usage: Dict) -> int:
+    """Tokens d'entrée servis par le cache de préfixe du fournisseur (format OpenAI ou LangChain)."""
+    details = usage.get("prompt_tokens_details") or {}
+    if "cached_tokens" in details:
+        return details["cached_tokens"] or 0
+    return (usage.get("input_token_details") or {}).get("cache_read") or 0
+
+
+def record_token_usage(purpose: str, usage: Dict) -> None:
+    """
+    Enregistre les tokens d'un appel (`prompt_tokens` / `completion_tokens` ou `input_tokens` / `output_tokens`).
+    Les tokens d'entrée lus depuis le cache du fournisseur sont comptés à part (`cached_prompt`).
+    """
+    prompt = usage.get("prompt_tokens", usage.get("input_tokens"))
+    completion = usage.get("completion_tokens", usage.get("output_tokens"))
+    cached = cached_prompt_tokens(usage)
+    if prompt:
+        LLM_TOKENS.labels(purpose, "prompt").inc(prompt)
+    if cached:
+        LLM_TOKENS.labels(purpose, "cached_prompt").inc(cached)
+    if completion:
+        LLM_TOKENS.labels(purpose, "completion").inc(completion)
+
+
+def observe_prompt_parts(parts: Dict[str, int]) -> None:
+    for part, tokens in parts.items():
+        PROMPT_TOKENS.labels(part).observe(tokens)
+
+
+def start_request_timings() -> List[Tuple[str, float]]:
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+
+def format_server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    """Valeur de l'en-tête Server-Timing (durées en millisecondes)."""
+    entries = [f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in timings]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def update_service_gauges(stats: Dict) -> None:
+    """Recopie dans les jauges l'état courant du limiteur, des caches, des files de tâches et d'écriture."""
+    limiter = stats.get("llm_limiter") or {}
+    LLM_QUEUE_DEPTH.set(limiter.get("queue_depth", 0))
+    LLM_IN_FLIGHT.set(limiter.get("in_flight", 0))
+    LLM_CONCURRENCY_LIMIT.set(limiter.get("concurrency_limit", 0))
+    JOBS_QUEUED.set((stats.get("jobs") or {}).get("queued", 0))
+    buffer = stats.get("message_buffer") or {}
+    MESSAGES_PENDING.set(buffer.get("pending", 0) + buffer.get("inflight", 0))
+    for cache in ("tool_cache", "response_cache", "session_store"):
+        if stats.get(cache):
+            CACHE_HIT_RATE.labels(cache).set(stats[cache]["hit_rate"])
+    for collection, table in ((stats.get("catalog_engine") or {}).get("collections") or {}).items():
+        CATALOG_MEMORY_BYTES.labels(collection).set(table["memory_bytes"])
+        CATALOG_DOCUMENTS.labels(collection).set(table["documents"])
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Métriques au format texte Prometheus et type de contenu associé."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+async def metrics_middleware(request, call_next):
+    """
+    Middleware HTTP : durée par route et en-tête Server-Timing détaillant les étapes mesurées.
+    Pour une réponse streamée, la durée mesurée s'arrête à l'envoi des en-têtes.
+    """
+    timings = start_request_timings()
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    route = getattr(request.scope.get("route"), "path", "inconnue")
+    HTTP_REQUEST_DURATION.labels(request.method, route, str(response.status_code)).observe(elapsed)
+    response.headers["Server-Timing"] = format_server_timing(timings, elapsed)
+    return response
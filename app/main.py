@@ -1,16 +1,30 @@
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from api.router import router as api_router
-from services.llm_service import LLMService
+from core.metrics import metrics_middleware
+from services.container import ServiceContainer
 import uvicorn
 
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Services partagés (client MongoDB, LLM) créés une seule fois par worker
+    services = ServiceContainer()
+    await services.startup()
+    app.state.services = services
+    yield
+    await services.shutdown()
+
+
 app = FastAPI(
     title="Agent conversationnel",
     description="API pour un agent conversationnel pour les voyages",
     version="1.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -19,10 +33,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Prev-Cursor", "X-Next-Cursor"],
 )
 
-# Instance du service LLM
-llm_service = LLMService()
+# Durées par route et en-tête Server-Timing
+app.middleware("http")(metrics_middleware)
 
 # Inclure les routes
 app.include_router(api_router)
@@ -1,4 +1,4 @@
-from typing import List, Optional, Literal
+from typing import Annotated, List, Optional, Literal, Union
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -28,6 +28,70 @@ class User(BaseModel):
     pays_de_residence: str
     ville_de_residence: str  
 
+# ---- Résultats structurés des outils ----
+class FlightItem(BaseModel):
+    kind: Literal["vol"] = "vol"
+    numero_de_vol: Optional[str] = None
+    compagnie_aerienne: Optional[str] = None
+    date_de_depart: Optional[datetime] = None
+    heure_de_depart: Optional[str] = None
+    heure_arrivee: Optional[str] = None
+
+class HotelItem(BaseModel):
+    kind: Literal["hotel"] = "hotel"
+    nom: Optional[str] = None
+    etoiles: Optional[float] = None
+    adresse: Optional[str] = None
+    date_de_disponibilite: Optional[str] = None
+
+class RestaurantItem(BaseModel):
+    kind: Literal["restaurant"] = "restaurant"
+    nom: Optional[str] = None
+    cuisine: Optional[str] = None
+    budget: Optional[str] = None
+    evaluation: Optional[float] = None
+    adresse: Optional[str] = None
+
+class WeatherItem(BaseModel):
+    kind: Literal["meteo"] = "meteo"
+    date: Optional[datetime] = None
+    condition: Optional[str] = None
+    temperature: Optional[float] = None
+
+ToolItem = Annotated[Union[FlightItem, HotelItem, RestaurantItem, WeatherItem], Field(discriminator="kind")]
+
+class ToolResult(BaseModel):
+    tool: str = Field(..., description="Nom de l'outil appelé.")
+    status: Literal["ok", "empty", "error"] = Field(..., description="Résultats trouvés, aucun résultat ou erreur.")
+    items: List[ToolItem] = Field(default=[], description="Résultats de l'outil.")
+    message: Optional[str] = Field(default=None, description="Message explicatif (aucun résultat, erreur).")
+    page: int = Field(default=1, description="Page de résultats retournée.")
+    has_more: bool = Field(default=False, description="Indique si d'autres résultats sont disponibles.")
+
+    def to_prompt(self) -> str:
+        """
+        Encodage compact pour le LLM : une ligne d'en-tête puis une ligne par résultat,
+        champs séparés par `|` (les libellés ne sont pas répétés à chaque résultat).
+        """
+        if self.status != "ok":
+            return self.message or ""
+        columns = [name for name in type(self.items[0]).model_fields if name != "kind"]
+        lines = [f"{self.tool} ({len(self.items)} résultats, page {self.page}"
+                 + (f", suite disponible avec page={self.page + 1})" if self.has_more else ")"),
+                 "|".join(columns)]
+        for item in self.items:
+            lines.append("|".join(compact_value(getattr(item, column)) for column in columns))
+        return "\n".join(lines)
+
+def compact_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d") if value.time() == datetime.min.time() else value.strftime("%Y-%m-%d %H:%M")
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).replace("|", "/").replace("\n", " ")
+
 # ---- Modèles pour les requêtes et réponses ----
 class ChatRequestWithContext(BaseModel):
     message: str = Field(..., description="Message envoyé par l'utilisateur.")
@@ -36,6 +100,7 @@ class ChatRequestWithContext(BaseModel):
 class ChatResponse(BaseModel):
     response: str = Field(..., description="Réponse générée par l'assistant.")
     suggestions: Optional[List[str]] = Field(default=None, description="Suggestions fournies par l'assistant.")
+    items: Optional[List[ToolResult]] = Field(default=None, description="Résultats bruts des outils (si demandés).")
 
 class SummaryRequest(BaseModel):
     session_id: str = Field(..., description="Identifiant de la session à résumer.")
@@ -44,6 +109,9 @@ class SummaryResponse(BaseModel):
     full_summary: str = Field(..., description="Résumé complet de la session.")
     bullet_points: List[str] = Field(..., description="Points principaux extraits de la session.")
     one_liner: str = Field(..., description="Résumé en une seule ligne.")
+    covered_messages: int = Field(default=0, description="Nombre de messages pris en compte par le résumé.")
+    message_count: int = Field(default=0, description="Nombre de messages de la session.")
+    updated_at: Optional[datetime] = Field(default=None, description="Date de la dernière mise à jour du résumé.")
 
 class RegisterRequest(BaseModel):
     username: str
@@ -61,10 +129,23 @@ class LoginRequest(BaseModel):
 class AskRequest(BaseModel):
     user_id: str
     question: str
+    response_mode: Optional[Literal["llm", "template", "auto"]] = Field(
+        default=None, description="Présentation des résultats d'outils : reformulation par le LLM, gabarit local ou automatique."
+    )
+    include_items: bool = Field(default=False, description="Inclure les résultats bruts des outils dans la réponse.")
+
+class JobResponse(BaseModel):
+    job_id: str = Field(..., description="Identifiant de la tâche.")
+    status: Literal["pending", "running", "done", "error"] = Field(..., description="État de la tâche.")
+    result: Optional[ChatResponse] = Field(default=None, description="Réponse, une fois la tâche terminée.")
+    error: Optional[str] = Field(default=None, description="Message d'erreur si la tâche a échoué.")
+    created_at: datetime
+    updated_at: datetime
 
 class SessionResponse(BaseModel):
     session_id: str
     created_at: datetime = datetime.utcnow()
     updated_at: datetime = datetime.utcnow()
     is_active: bool
+    message_count: int = Field(default=0, description="Nombre de messages de la session.")
 
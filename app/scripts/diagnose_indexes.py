@@ -0,0 +1,46 @@
+# scripts/diagnose_indexes.py
+"""
+Vérifie, via `explain()`, que chaque requête des outils et des sessions utilise un index.
+
+Usage (depuis le dossier `app`) :
+    python -m scripts.diagnose_indexes [--create] [--json]
+"""
+import argparse
+import asyncio
+import json
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services.index_manager import IndexManager  # noqa: E402
+from services.mongo_service import MongoService  # noqa: E402
+
+
+async def main(create: bool = False, as_json: bool = False) -> int:
+    mongo_service = MongoService()
+    manager = IndexManager(mongo_service)
+    if create:
+        await manager.ensure_indexes()
+
+    report = await manager.explain_queries()
+    mongo_service.close()
+
+    if as_json:
+        print(json.dumps(report, indent=2))
+    else:
+        for entry in report:
+            status = "OK " if entry["indexed"] else "SCAN"
+            indexes = ", ".join(entry["indexes"]) or "-"
+            print(f"[{status}] {entry['query']:<32} {entry['collection']:<14} {indexes:<48} {' > '.join(entry['stages'])}")
+
+    # Code de sortie non nul si une requête n'est pas couverte par un index
+    return 0 if all(entry["indexed"] for entry in report) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Diagnostic des index MongoDB utilisés par les outils.")
+    parser.add_argument("--create", action="store_true", help="Crée les index manquants avant le diagnostic.")
+    parser.add_argument("--json", action="store_true", help="Sortie au format JSON.")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(main(create=args.create, as_json=args.json)))
@@ -0,0 +1,97 @@
+# scripts/evaluate_intent_router.py
+"""
+Évalue le routage local des questions (services/intent_router.py) sur `data/intents_eval.jsonl`.
+
+Chaque ligne indique l'appel d'outil attendu, ou `null` si la question doit être laissée au LLM.
+Le rapport donne le taux de contournement du LLM, la précision des questions routées
+(un routage erroné produit une mauvaise réponse) et les raisons des renvois au LLM.
+
+Usage (depuis le dossier `app`) :
+    python -m scripts.evaluate_intent_router [--from-db] [--min-confidence 0.6] [--min-precision 1.0] [--verbose]
+"""
+import argparse
+import asyncio
+import json
+import os
+from collections import Counter
+
+from services.intent_router import DATA_DIR, IntentRouter
+from services.resolver import CatalogResolver
+
+EVAL_FILE = os.path.join(DATA_DIR, "intents_eval.jsonl")
+
+# Valeurs du catalogue utilisées sans base de données (villes et cuisines du jeu de démonstration)
+EVAL_CITIES = [
+    "Paris", "Lyon", "Marseille", "Nice", "Bordeaux", "Saint-Étienne", "Dubai", "Tokyo", "Rome", "Madrid",
+    "Berlin", "Lisbonne", "Casablanca", "Tunis", "Marrakech", "Montreal", "Londres", "Athenes", "Istanbul",
+    "New York",
+]
+EVAL_CUISINES = ["française", "italienne", "japonaise", "marocaine", "libanaise", "espagnole", "indienne"]
+
+
+async def load_resolver(from_db: bool) -> CatalogResolver:
+    if not from_db:
+        resolver = CatalogResolver(db=None)
+        resolver.load(EVAL_CITIES, EVAL_CUISINES)
+        return resolver
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    from services.mongo_service import MongoService
+
+    mongo_service = MongoService()
+    resolver = CatalogResolver(mongo_service.db)
+    await resolver.refresh()
+    mongo_service.close()
+    return resolver
+
+
+def evaluate(router: IntentRouter, rows: list, verbose: bool = False) -> dict:
+    outcomes, reasons = Counter(), Counter()
+    for row in rows:
+        routed, reason = router.analyze(row["text"])
+        expected = row["expected"]
+        if routed is None:
+            reasons[reason] += 1
+            outcomes["missed" if expected else "fallback"] += 1
+            if verbose and expected:
+                print(f"[LLM ] {row['text']!r} ({reason})")
+            continue
+        if expected and routed.tool == expected["name"] and routed.args == expected["args"]:
+            outcomes["correct"] += 1
+            if verbose:
+                print(f"[OK  ] {row['text']!r} -> {routed.tool}({routed.args}) p={routed.confidence}")
+        else:
+            outcomes["wrong"] += 1
+            print(f"[FAUX] {row['text']!r} -> {routed.tool}({routed.args}), attendu : {expected}")
+
+    routed_count = outcomes["correct"] + outcomes["wrong"]
+    routable = sum(1 for row in rows if row["expected"])
+    return {
+        "questions": len(rows),
+        "bypass_rate": routed_count / len(rows) if rows else 0.0,
+        "precision": outcomes["correct"] / routed_count if routed_count else 1.0,
+        "recall": outcomes["correct"] / routable if routable else 0.0,
+        "outcomes": dict(outcomes),
+        "fallback_reasons": dict(reasons),
+    }
+
+
+async def main(from_db: bool, min_confidence: float, min_precision: float, verbose: bool) -> int:
+    with open(EVAL_FILE, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    router = IntentRouter(await load_resolver(from_db), min_confidence=min_confidence)
+    report = evaluate(router, rows, verbose)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    # Code de sortie non nul si des questions sont routées vers un mauvais outil ou avec de mauvais paramètres
+    return 0 if report["precision"] >= min_precision else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Évaluation du routage local des questions.")
+    parser.add_argument("--from-db", action="store_true", help="Villes et cuisines lues dans MongoDB.")
+    parser.add_argument("--min-confidence", type=float, default=0.6, help="Probabilité minimale du classifieur.")
+    parser.add_argument("--min-precision", type=float, default=1.0, help="Précision exigée sur les questions routées.")
+    parser.add_argument("--verbose", action="store_true", help="Affiche le résultat de chaque question.")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(main(args.from_db, args.min_confidence, args.min_precision, args.verbose)))
@@ -0,0 +1,308 @@
+# scripts/ingest_catalog.py
+"""
+Import en masse du catalogue (vols, hôtels, restaurants, météo) depuis des fichiers CSV, Parquet ou JSONL.
+
+Les fichiers sont lus par blocs (mémoire bornée), les colonnes renommées selon les champs
+interrogés par les outils, les types convertis (dates, nombres), puis les documents écrits
+par `bulk_write` non ordonnés :
+- mode par défaut : upsert sur la clé naturelle de chaque document (import incrémental) ;
+- `--replace` : chargement dans une collection temporaire, création des index,
+  puis remplacement atomique de la collection (rechargement complet nocturne).
+
+Usage (depuis le dossier `app`) :
+    python -m scripts.ingest_catalog vols /data/vols.csv [--format csv|parquet|jsonl] [--replace]
+                                     [--chunk-size 50000] [--batch-size 5000] [--concurrency 4]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+import unicodedata
+from typing import Dict, Iterator, List
+
+import pandas as pd
+from dotenv import load_dotenv
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+load_dotenv()
+
+from services.index_manager import INDEX_SPECS, IndexManager  # noqa: E402
+from services.mongo_service import MongoService  # noqa: E402
+
+# Schéma de chaque collection : champs attendus par les outils, noms de colonnes acceptés,
+# types et clé naturelle (upsert).
+CATALOG_SCHEMAS = {
+    "vols": {
+        "aliases": {
+            "ville_dorigine": ["origine", "ville_de_depart", "origin", "origin_city"],
+            "ville_de_destination": ["destination", "ville_darrivee", "destination_city"],
+            "date_de_depart": ["date", "departure_date", "date_depart"],
+            "numero_de_vol": ["numero", "vol", "flight", "flight_number"],
+            "compagnie_aerienne": ["compagnie", "airline"],
+            "heure_de_depart": ["heure_depart", "departure_time"],
+            "heure_arrivee": ["heure_darrivee", "arrival_time"],
+        },
+        "dates": ["date_de_depart"],
+        "numbers": [],
+        "integers": [],
+        "key": ["numero_de_vol", "date_de_depart"],
+        # Toutes les parties de la clé sont obligatoires : sans numéro, les vols d'une date se remplaceraient
+        "required": ["ville_dorigine", "ville_de_destination", "date_de_depart", "numero_de_vol"],
+    },
+    "hotels": {
+        "aliases": {
+            "ville": ["city"],
+            "nom_de_lhôtel": ["nom", "nom_hotel", "hotel", "name"],
+            "etoiles": ["stars", "nombre_detoiles"],
+            "adresse": ["address"],
+            "date_de_disponibilite": ["disponibilite", "availability_date"],
+        },
+        "dates": [],
+        "numbers": [],
+        "integers": ["etoiles"],
+        "key": ["ville", "nom_de_lhôtel"],
+        "required": ["ville", "nom_de_lhôtel"],
+    },
+    "restaurants": {
+        "aliases": {
+            "ville": ["city"],
+            "nom_du_restaurant": ["nom", "restaurant", "name"],
+            "cuisine": ["type_de_cuisine"],
+            "budget": ["prix", "price"],
+            "evaluation": ["note", "rating"],
+            "adresse": ["address"],
+        },
+        "dates": [],
+        "numbers": ["evaluation"],
+        "integers": [],
+        "key": ["ville", "nom_du_restaurant"],
+        "required": ["ville", "nom_du_restaurant"],
+    },
+    "climat": {
+        "aliases": {
+            "ville": ["city"],
+            "date": ["jour", "day"],
+            "condition": ["conditions", "weather"],
+            "temperature_(°c)": ["temperature", "temperature_c", "temp"],
+        },
+        "dates": ["date"],
+        "numbers": ["temperature_(°c)"],
+        "integers": [],
+        "key": ["ville", "date"],
+        "required": ["ville", "date"],
+    },
+}
+
+
+def normalize_column(name: str) -> str:
+    """Forme normalisée d'un en-tête : "Ville d'origine" devient "ville_dorigine"."""
+    name = str(name).strip().lower().replace("'", "").replace("’", "")
+    return "_".join(name.split())
+
+
+def _unaccent(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def column_mapping(columns: List[str], kind: str) -> Dict[str, str]:
+    """
+    Associe chaque colonne source au champ du catalogue (comparaison sans accents).
+    Les colonnes inconnues sont conservées sous leur nom normalisé.
+    """
+    lookup = {}
+    for field, aliases in CATALOG_SCHEMAS[kind]["aliases"].items():
+        for alias in [field, *aliases]:
+            lookup[_unaccent(alias)] = field
+    mapping = {}
+    for column in columns:
+        normalized = normalize_column(column)
+        mapping[column] = lookup.get(_unaccent(normalized), normalized)
+    return mapping
+
+
+def read_chunks(path: str, file_format: str, chunk_size: int, sep: str = ",") -> Iterator[pd.DataFrame]:
+    """Lit le fichier par blocs de `chunk_size` lignes."""
+    if file_format == "csv":
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=str, sep=sep, skipinitialspace=True)
+    elif file_format == "jsonl":
+        yield from pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False)
+    else:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("La lecture des fichiers Parquet nécessite le paquet `pyarrow`.")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+
+
+def prepare_chunk(frame: pd.DataFrame, kind: str, dayfirst: bool = False) -> tuple:
+    """
+    Renomme et convertit un bloc. Retourne `(documents, lignes rejetées)` ;
+    une ligne est rejetée s'il lui manque un champ obligatoire (ou une date illisible).
+    """
+    schema = CATALOG_SCHEMAS[kind]
+    frame = frame.rename(columns=column_mapping(list(frame.columns), kind))
+    frame = frame.loc[:, ~frame.columns.duplicated()]
+
+    for column in frame.columns:
+        if frame[column].dtype == object:
+            frame[column] = frame[column].map(lambda value: value.strip() or None if isinstance(value, str) else value)
+    for column in schema["dates"]:
+        if column in frame:
+            dates = pd.to_datetime(frame[column], errors="coerce", dayfirst=dayfirst, utc=True)
+            frame[column] = dates.dt.tz_localize(None)
+    for column in schema["numbers"] + schema["integers"]:
+        if column in frame:
+            values = frame[column].astype(str).str.replace(",", ".", regex=False)
+            frame[column] = pd.to_numeric(values, errors="coerce")
+    for column in schema["integers"]:
+        if column in frame:
+            frame[column] = frame[column].round().astype("Int64")
+
+    missing = [column for column in schema["required"] if column not in frame]
+    if missing:
+        raise SystemExit(f"Colonnes obligatoires absentes pour `{kind}` : {', '.join(missing)}")
+    valid = frame[schema["required"]].notna().all(axis=1)
+
+    documents = []
+    for record in frame[valid].to_dict("records"):
+        document = {}
+        for field, value in record.items():
+            if value is None or value is pd.NA or (not isinstance(value, (list, dict)) and pd.isna(value)):
+                continue
+            if isinstance(value, pd.Timestamp):
+                value = value.to_pydatetime()
+            elif hasattr(value, "item"):  # scalaires numpy -> types Python
+                value = value.item()
+            document[field] = value
+        documents.append(document)
+    return documents, int((~valid).sum())
+
+
+def build_operations(documents: List[Dict], kind: str, replace: bool) -> list:
+    if replace:
+        return [InsertOne(document) for document in documents]
+    key = CATALOG_SCHEMAS[kind]["key"]
+    return [
+        UpdateOne({field: document.get(field) for field in key}, {"$set": document}, upsert=True)
+        for document in documents
+    ]
+
+
+class IngestionStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.read = 0
+        self.rejected = 0
+        self.written = 0
+        self.errors = 0
+
+    def report(self, prefix: str = "Progression") -> None:
+        elapsed = time.monotonic() - self.started
+        rate = self.written / elapsed if elapsed else 0
+        logging.info(
+            f"{prefix} : {self.read} lignes lues, {self.written} écrites, {self.rejected} rejetées, "
+            f"{self.errors} en erreur — {elapsed:.1f}s, {rate:,.0f} lignes/s"
+        )
+
+
+async def write_batch(collection, operations: list, stats: IngestionStats) -> None:
+    try:
+        result = await collection.bulk_write(operations, ordered=False)
+        stats.written += result.inserted_count + result.upserted_count + result.matched_count
+    except BulkWriteError as e:
+        details = e.details
+        stats.written += details.get("nInserted", 0) + details.get("nUpserted", 0) + details.get("nMatched", 0)
+        stats.errors += len(details.get("writeErrors", []))
+        logging.warning(f"{len(details.get('writeErrors', []))} erreurs d'écriture dans le lot.")
+
+
+async def ingest(kind: str, path: str, file_format: str, chunk_size: int = 50000, batch_size: int = 5000,
+                 concurrency: int = 4, replace: bool = False, dayfirst: bool = False, sep: str = ",") -> IngestionStats:
+    mongo_service = MongoService()
+    db = mongo_service.db
+    target = db[kind]
+    staging_name = f"{kind}_import_{int(time.time())}"
+    collection = db[staging_name] if replace else target
+
+    if not replace:
+        # L'upsert recherche chaque document par sa clé : les index doivent exister avant l'import
+        await IndexManager(mongo_service).ensure_indexes([kind])
+
+    stats = IngestionStats()
+    limiter = asyncio.Semaphore(concurrency)
+    pending = set()
+    failures = []  # Exceptions des lots échoués (réseau, AutoReconnect...), relevées à la fin de chaque lot
+
+    def batch_done(task: asyncio.Task) -> None:
+        pending.discard(task)
+        limiter.release()
+        if not task.cancelled() and task.exception() is not None:
+            failures.append(task.exception())
+            logging.error(f"Échec d'un lot d'écriture : {task.exception()}")
+    chunks = read_chunks(path, file_format, chunk_size, sep)
+    try:
+        while not failures:
+            # Lecture et conversion dans un thread : se superposent aux écritures en cours
+            frame = await asyncio.to_thread(next, chunks, None)
+            if frame is None:
+                break
+            documents, rejected = await asyncio.to_thread(prepare_chunk, frame, kind, dayfirst)
+            stats.read += len(frame)
+            stats.rejected += rejected
+            for start in range(0, len(documents), batch_size):
+                operations = build_operations(documents[start:start + batch_size], kind, replace)
+                await limiter.acquire()  # contre-pression : pas plus de `concurrency` lots en cours
+                task = asyncio.create_task(write_batch(collection, operations, stats))
+                pending.add(task)
+                task.add_done_callback(batch_done)
+            stats.report()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if failures:
+            raise RuntimeError(f"{len(failures)} lot(s) non écrit(s) : import interrompu.") from failures[0]
+        if replace and stats.errors:
+            # Ne jamais remplacer la collection en production par un chargement incomplet
+            raise RuntimeError(f"{stats.errors} documents en erreur : collection `{kind}` conservée.")
+
+        if replace:
+            # Index construits une seule fois sur les données chargées, puis bascule atomique
+            await collection.create_indexes(INDEX_SPECS.get(kind, []))
+            await collection.rename(kind, dropTarget=True)
+            logging.info(f"Collection `{kind}` remplacée par `{staging_name}`.")
+    except BaseException:
+        if replace:
+            await db.drop_collection(staging_name)
+        raise
+    finally:
+        mongo_service.close()
+
+    stats.report("Import terminé")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importe un fichier dans une collection du catalogue.")
+    parser.add_argument("kind", choices=sorted(CATALOG_SCHEMAS), help="Collection cible.")
+    parser.add_argument("path", help="Fichier CSV, Parquet ou JSONL.")
+    parser.add_argument("--format", choices=["csv", "parquet", "jsonl"],
+                        help="Format du fichier (déduit de l'extension par défaut).")
+    parser.add_argument("--replace", action="store_true",
+                        help="Remplace toute la collection (chargement puis bascule atomique).")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="Lignes lues par bloc.")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Opérations par `bulk_write`.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Lots écrits en parallèle.")
+    parser.add_argument("--dayfirst", action="store_true", help="Dates au format jour/mois/année.")
+    parser.add_argument("--sep", default=",", help="Séparateur CSV.")
+    args = parser.parse_args()
+
+    file_format = args.format or {".parquet": "parquet", ".jsonl": "jsonl", ".json": "jsonl"}.get(
+        os.path.splitext(args.path)[1].lower(), "csv"
+    )
+    stats = asyncio.run(ingest(
+        args.kind, args.path, file_format, chunk_size=args.chunk_size, batch_size=args.batch_size,
+        concurrency=args.concurrency, replace=args.replace, dayfirst=args.dayfirst, sep=args.sep,
+    ))
+    # Code de sortie non nul si des documents n'ont pas pu être écrits
+    raise SystemExit(1 if stats.errors else 0)
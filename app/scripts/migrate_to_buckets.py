@@ -0,0 +1,88 @@
+# scripts/migrate_to_buckets.py
+"""
+Migration des sessions existantes vers le stockage des messages par buckets.
+
+Usage (depuis le dossier `app`) :
+    python -m scripts.migrate_to_buckets [--dry-run] [--session-id ID]
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services.mongo_service import MongoService  # noqa: E402
+
+
+async def migrate_session(mongo_service: MongoService, session: dict, dry_run: bool = False) -> bool:
+    """
+    Déplace les messages d'une session dans des buckets de taille fixe.
+    Retourne False si la session a été modifiée pendant la migration (à relancer).
+    """
+    session_id = session["session_id"]
+    # Position explicite de chaque message (lue par `MongoService._read_buckets`)
+    messages = [{**message, "pos": position} for position, message in enumerate(session.get("messages", []))]
+    size = mongo_service.bucket_size
+    buckets = [
+        {
+            "session_id": session_id,
+            "seq": seq,
+            "messages": messages[seq * size:(seq + 1) * size],
+            "count": len(messages[seq * size:(seq + 1) * size]),
+            "created_at": datetime.utcnow(),
+        }
+        for seq in range((len(messages) + size - 1) // size)
+    ]
+    if dry_run:
+        logging.info(f"[dry-run] Session {session_id} : {len(messages)} messages -> {len(buckets)} buckets.")
+        return True
+
+    # Repartir d'un état propre si une migration précédente a été interrompue
+    await mongo_service.buckets_collection.delete_many({"session_id": session_id})
+    if buckets:
+        await mongo_service.buckets_collection.insert_many(buckets)
+
+    # Bascule conditionnelle : échoue si un message a été ajouté entre-temps
+    result = await mongo_service.conversations_collection.update_one(
+        {"session_id": session_id, "storage": {"$ne": "bucket"}, "messages": {"$size": len(messages)}},
+        {
+            "$set": {"storage": "bucket", "message_count": len(messages)},
+            "$unset": {"messages": ""},
+        },
+    )
+    if result.matched_count == 0:
+        await mongo_service.buckets_collection.delete_many({"session_id": session_id})
+        logging.warning(f"Session {session_id} modifiée pendant la migration, ignorée.")
+        return False
+
+    logging.info(f"Session {session_id} migrée : {len(messages)} messages, {len(buckets)} buckets.")
+    return True
+
+
+async def main(dry_run: bool = False, session_id: str = None):
+    mongo_service = MongoService()
+    await mongo_service.buckets_collection.create_index([("session_id", 1), ("seq", 1)], unique=True)
+
+    query = {"storage": {"$ne": "bucket"}}
+    if session_id:
+        query["session_id"] = session_id
+
+    migrated, skipped = 0, 0
+    async for session in mongo_service.conversations_collection.find(query):
+        if await migrate_session(mongo_service, session, dry_run=dry_run):
+            migrated += 1
+        else:
+            skipped += 1
+
+    logging.info(f"Migration terminée : {migrated} sessions migrées, {skipped} à relancer.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migre les conversations vers le stockage par buckets.")
+    parser.add_argument("--dry-run", action="store_true", help="Affiche le plan sans rien modifier.")
+    parser.add_argument("--session-id", help="Ne migrer qu'une seule session.")
+    args = parser.parse_args()
+    asyncio.run(main(dry_run=args.dry_run, session_id=args.session_id))
@@ -0,0 +1,203 @@
+# services/cache.py
+"""
+Cache des résultats des outils (vols, hôtels, restaurants, météo).
+"""
+import asyncio
+import json
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+def parse_ttls(spec: str) -> Dict[str, float]:
+    """Convertit "get_hotels_info=3600,get_weather_info=1800" en dictionnaire de TTL (secondes)."""
+    ttls = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, seconds = item.partition("=")
+        ttls[name.strip()] = float(seconds)
+    return ttls
+
+
+class CacheBackend(ABC):
+    """
+    Interface d'un stockage de cache. Les méthodes sont asynchrones pour permettre
+    un stockage partagé entre workers (Redis, Memcached...).
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        """Retourne la valeur associée à `key`, ou None si absente ou expirée."""
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        """Enregistre `value` pour `ttl` secondes."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Supprime une entrée."""
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """Vide le cache."""
+
+
+def _estimate_size(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if hasattr(value, "model_dump_json"):
+        return len(value.model_dump_json())
+    return sys.getsizeof(value)
+
+
+class InMemoryCache(CacheBackend):
+    """
+    Cache en mémoire du processus : expiration par TTL et éviction LRU
+    bornée en nombre d'entrées et en taille approximative.
+    """
+
+    def __init__(self, max_entries: int = 5000, max_bytes: int = 50 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expiration, taille, valeur)
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, size, value)
+        self.size_bytes += size
+
+        # Éviction des entrées les moins récemment utilisées
+        while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    async def delete(self, key: str) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        self.size_bytes = 0
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.size_bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class LoadCancelled(Exception):
+    """Le chargement partagé d'une entrée a été annulé avant d'aboutir."""
+
+
+class ToolCache:
+    """
+    Cache des appels d'outils, indexé par nom de fonction et arguments normalisés.
+    Les appels concurrents identiques non encore en cache ne déclenchent qu'une seule requête.
+    """
+
+    def __init__(self, backend: CacheBackend, ttls: Dict[str, float], default_ttl: float = 300):
+        self.backend = backend
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def make_key(fn_name: str, args: Dict) -> str:
+        """
+        Clé stable : arguments triés, valeurs absentes et page par défaut ignorées,
+        espaces superflus supprimés. La casse est conservée (les requêtes MongoDB y sont sensibles).
+        """
+        normalized = {}
+        for name, value in args.items():
+            if value is None or (name == "page" and value in (1, "1")):
+                continue
+            if isinstance(value, str):
+                value = " ".join(value.split())
+            elif isinstance(value, float) and value.is_integer():
+                value = int(value)
+            normalized[name] = value
+        return f"{fn_name}:{json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)}"
+
+    async def get_or_call(self, fn_name: str, args: Dict, loader: Callable[[], Awaitable[Any]],
+                          should_cache: Callable[[Any], bool] = lambda value: True) -> Any:
+        """
+        Retourne la valeur en cache ou la charge. Le chargement s'exécute dans sa propre tâche,
+        attendue (via `shield`) par tous les appelants, y compris le premier : l'annulation d'un
+        appelant (délai de l'outil, client déconnecté) n'interrompt ni le chargement ni les autres.
+        """
+        key = self.make_key(fn_name, args)
+        cached = await self.backend.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        task = self._inflight.get(key)
+        if task is not None:
+            # Un appel identique est déjà en cours : attendre son résultat
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key, fn_name, loader, should_cache))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._load_done(key, done))
+
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled() and not asyncio.current_task().cancelling():
+                # Le chargement lui-même a été annulé (arrêt...) : erreur ordinaire pour les appelants
+                raise LoadCancelled(f"Chargement annulé : {key}") from None
+            raise
+
+    async def _load(self, key: str, fn_name: str, loader: Callable[[], Awaitable[Any]],
+                    should_cache: Callable[[Any], bool]) -> Any:
+        value = await loader()
+        if should_cache(value):
+            await self.backend.set(key, value, self.ttls.get(fn_name, self.default_ttl))
+        return value
+
+    def _load_done(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # évite l'avertissement si aucun appel n'attendait plus ce résultat
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+        if isinstance(self.backend, InMemoryCache):
+            stats.update(entries=len(self.backend), size_bytes=self.backend.size_bytes,
+                         evictions=self.backend.evictions)
+        return stats
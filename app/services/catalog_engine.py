@@ -0,0 +1,384 @@
+# services/catalog_engine.py
+"""
+Copie en mémoire, au format colonnes, des collections du catalogue (vols, hôtels, restaurants, météo),
+pour répondre aux requêtes des outils sans aller-retour vers MongoDB.
+"""
+import asyncio
+import logging
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Description de chaque collection :
+# - categories : chaînes répétitives encodées par dictionnaire (codes entiers) ;
+# - numbers / dates : colonnes numériques ;
+# - les autres champs sont conservés tels quels (noms, adresses...) ;
+# - key / sort : index par ville (ou couple de villes), positions triées comme les requêtes des outils
+#   (`_id` en dernier départage les égalités : pagination stable).
+CATALOG_TABLES = {
+    "vols": {
+        "categories": ["ville_dorigine", "ville_de_destination", "compagnie_aerienne"],
+        "numbers": [],
+        "dates": ["date_de_depart"],
+        "key": ["ville_dorigine", "ville_de_destination"],
+        "sort": [("date_de_depart", 1), ("heure_de_depart", 1), ("numero_de_vol", 1), ("_id", 1)],
+    },
+    "hotels": {
+        "categories": ["ville"],
+        "numbers": ["etoiles"],
+        "dates": [],
+        "key": ["ville"],
+        "sort": [("etoiles", -1), ("nom_de_lhôtel", 1), ("_id", 1)],
+    },
+    "restaurants": {
+        "categories": ["ville", "cuisine", "budget"],
+        "numbers": ["evaluation"],
+        "dates": [],
+        "key": ["ville"],
+        "sort": [("evaluation", -1), ("nom_du_restaurant", 1), ("_id", 1)],
+    },
+    "climat": {
+        "categories": ["ville", "condition"],
+        "numbers": ["temperature_(°c)"],
+        "dates": ["date"],
+        "key": ["ville"],
+        "sort": [("date", 1), ("_id", 1)],
+    },
+}
+
+_RANGE_OPERATORS = {"$gte", "$gt", "$lte", "$lt"}
+
+
+class UnsupportedQuery(Exception):
+    """La requête ne peut pas être servie par le moteur : elle est envoyée à MongoDB."""
+
+
+def _to_datetime64(value) -> np.datetime64:
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return np.datetime64(value, "ms")
+    raise UnsupportedQuery(f"Date attendue : {value!r}")
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class ColumnTable:
+    """
+    Une collection en colonnes NumPy, avec un index des positions par clé, triées selon l'ordre
+    des outils. Les valeurs du premier champ de tri sont conservées triées par groupe, ce qui permet
+    de résoudre un intervalle de dates par recherche dichotomique.
+    """
+
+    def __init__(self, name: str, documents: Dict[str, list], size: int):
+        spec = CATALOG_TABLES[name]
+        self.name = name
+        self.size = size
+        self.key = spec["key"]
+        self.sort = spec["sort"]
+        self.columns: Dict[str, np.ndarray] = {}
+        self.dictionaries: Dict[str, np.ndarray] = {}
+        self.codes: Dict[str, Dict[str, int]] = {}
+
+        for field, values in documents.items():
+            if field in spec["categories"]:
+                texts = np.array(["" if value is None else str(value) for value in values], dtype=object)
+                dictionary, codes = np.unique(texts, return_inverse=True)
+                codes = codes.astype(np.int32)
+                codes[texts == ""] = -1
+                self.dictionaries[field] = dictionary
+                self.codes[field] = {value: code for code, value in enumerate(dictionary)}
+                self.columns[field] = codes
+            elif field in spec["numbers"]:
+                self.columns[field] = np.array([_to_float(value) for value in values], dtype=np.float64)
+            elif field in spec["dates"]:
+                self.columns[field] = np.array(
+                    [np.datetime64(value, "ms") if isinstance(value, datetime) else np.datetime64("NaT")
+                     for value in values],
+                    dtype="datetime64[ms]"
+                )
+            else:
+                self.columns[field] = np.array(values, dtype=object)
+        self._build_index()
+        self.memory_bytes = self._memory_bytes()
+
+    # ---- Index ----
+
+    def _sort_values(self, field: str) -> np.ndarray:
+        """Valeurs numériques ordonnées comme le tri MongoDB du champ (rang lexical pour les textes)."""
+        column = self.columns.get(field)
+        if column is None:
+            return np.zeros(self.size)
+        if field in self.dictionaries:
+            return column  # dictionnaire trié par np.unique : le code est le rang lexical
+        if column.dtype.kind == "M":
+            return column.astype(np.int64)
+        if column.dtype.kind == "f":
+            return column
+        _, ranks = np.unique(np.array(["" if value is None else str(value) for value in column], dtype=object),
+                             return_inverse=True)
+        return ranks
+
+    def _build_index(self) -> None:
+        sort_keys = []
+        for field, direction in self.sort:
+            values = self._sort_values(field)
+            sort_keys.append(-values if direction < 0 else values)
+        key_columns = [self.columns.get(field, np.full(self.size, -1, dtype=np.int32)) for field in self.key]
+        # np.lexsort : la dernière clé est la clé principale
+        self.order = np.lexsort(tuple(reversed(sort_keys)) + tuple(reversed(key_columns))) if self.size else np.array([], dtype=np.int64)
+
+        range_field = self.sort[0][0]
+        self.range_field = range_field if self.sort[0][1] > 0 and range_field in self.columns else None
+        self.range_values = self._sort_values(range_field)[self.order] if self.range_field else None
+
+        self.groups: Dict[Tuple[int, ...], Tuple[int, int]] = {}
+        if not self.size:
+            return
+        ordered_keys = np.stack([column[self.order] for column in key_columns], axis=1)
+        boundaries = np.flatnonzero(np.any(ordered_keys[1:] != ordered_keys[:-1], axis=1)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [self.size]))
+        for start, end in zip(starts, ends):
+            self.groups[tuple(int(code) for code in ordered_keys[start])] = (int(start), int(end))
+
+    # ---- Requêtes ----
+
+    def _encode(self, field: str, value) -> Optional[int]:
+        return self.codes[field].get(str(value))
+
+    def _mask(self, field: str, condition, positions: np.ndarray) -> np.ndarray:
+        column = self.columns.get(field)
+        if column is None:
+            return np.zeros(len(positions), dtype=bool)
+        values = column[positions]
+        operators = condition if isinstance(condition, dict) else {"$eq": condition}
+
+        mask = np.ones(len(positions), dtype=bool)
+        for operator, operand in operators.items():
+            if field in self.dictionaries:
+                dictionary = self.dictionaries[field]
+                if operator == "$eq":
+                    code = self._encode(field, operand)
+                    mask &= values == (code if code is not None else -2)
+                elif operator == "$in":
+                    codes = [code for code in (self._encode(field, item) for item in operand) if code is not None]
+                    mask &= np.isin(values, codes)
+                elif operator == "$regex":
+                    flags = re.IGNORECASE if "i" in operators.get("$options", "") else 0
+                    pattern = re.compile(operand, flags)
+                    codes = [code for code, text in enumerate(dictionary) if pattern.search(text)]
+                    mask &= np.isin(values, codes)
+                elif operator != "$options":
+                    raise UnsupportedQuery(f"{operator} sur {field}")
+            elif column.dtype.kind in "fM":
+                convert = _to_datetime64 if column.dtype.kind == "M" else _to_float
+                if operator == "$eq":
+                    mask &= values == convert(operand)
+                elif operator == "$in":
+                    mask &= np.isin(values, [convert(item) for item in operand])
+                elif operator == "$gte":
+                    mask &= values >= convert(operand)
+                elif operator == "$gt":
+                    mask &= values > convert(operand)
+                elif operator == "$lte":
+                    mask &= values <= convert(operand)
+                elif operator == "$lt":
+                    mask &= values < convert(operand)
+                else:
+                    raise UnsupportedQuery(f"{operator} sur {field}")
+            else:
+                raise UnsupportedQuery(f"Filtre sur le champ non indexé {field}")
+        return mask
+
+    def _range(self, condition, start: int, end: int) -> Tuple[int, int]:
+        """Restreint [start, end) par recherche dichotomique sur le premier champ de tri."""
+        values = self.range_values[start:end]
+        column = self.columns[self.range_field]
+        convert = _to_datetime64 if column.dtype.kind == "M" else _to_float
+        operators = condition if isinstance(condition, dict) else {"$gte": condition, "$lte": condition}
+        low, high = 0, len(values)
+        for operator, operand in operators.items():
+            bound = convert(operand)
+            bound = bound.astype(np.int64) if column.dtype.kind == "M" else bound
+            if operator == "$gte":
+                low = max(low, int(np.searchsorted(values, bound, "left")))
+            elif operator == "$gt":
+                low = max(low, int(np.searchsorted(values, bound, "right")))
+            elif operator == "$lte":
+                high = min(high, int(np.searchsorted(values, bound, "right")))
+            elif operator == "$lt":
+                high = min(high, int(np.searchsorted(values, bound, "left")))
+        return start + low, start + max(low, high)
+
+    def _value(self, field: str, position: int):
+        column = self.columns[field]
+        if field in self.dictionaries:
+            code = column[position]
+            return None if code < 0 else self.dictionaries[field][code]
+        value = column[position]
+        if column.dtype.kind == "M":
+            return None if np.isnat(value) else value.astype("datetime64[ms]").item()
+        if column.dtype.kind == "f":
+            return None if np.isnan(value) else float(value)
+        return value
+
+    def find(self, query: Dict, projection: Dict, sort: List[tuple], page: int, limit: int) -> Tuple[List[Dict], bool]:
+        if [tuple(item) for item in sort] != [tuple(item) for item in self.sort]:
+            raise UnsupportedQuery("Ordre de tri différent de celui de l'index")
+        codes = []
+        for field in self.key:
+            value = query.get(field)
+            if value is None or isinstance(value, dict):
+                raise UnsupportedQuery(f"Égalité sur {field} requise")
+            code = self._encode(field, value)
+            if code is None:
+                return [], False
+            codes.append(code)
+        if tuple(codes) not in self.groups:
+            return [], False
+        start, end = self.groups[tuple(codes)]
+
+        conditions = {field: condition for field, condition in query.items() if field not in self.key}
+        if self.range_field in conditions and (
+            not isinstance(conditions[self.range_field], dict) or set(conditions[self.range_field]) <= _RANGE_OPERATORS
+        ):
+            start, end = self._range(conditions.pop(self.range_field), start, end)
+
+        positions = self.order[start:end]
+        for field, condition in conditions.items():
+            positions = positions[self._mask(field, condition, positions)]
+
+        offset = (page - 1) * limit
+        selected = positions[offset:offset + limit + 1]
+        fields = [field for field, included in projection.items() if included and field in self.columns]
+        documents = [{field: self._value(field, position) for field in fields} for position in selected[:limit]]
+        return documents, len(selected) > limit
+
+    def _memory_bytes(self) -> int:
+        """Empreinte approximative : tableaux, dictionnaires, index et objets Python référencés."""
+        total = self.order.nbytes + (self.range_values.nbytes if self.range_values is not None else 0)
+        total += sum(sys.getsizeof(key) + 16 for key in self.groups)
+        for field, column in self.columns.items():
+            total += column.nbytes
+            if column.dtype == object:
+                total += sum(sys.getsizeof(value) for value in column)
+        for dictionary in self.dictionaries.values():
+            total += dictionary.nbytes + sum(sys.getsizeof(value) for value in dictionary)
+        return total
+
+
+class CatalogEngine:
+    """
+    Moteur de lecture du catalogue en mémoire. Les tables sont reconstruites à partir de MongoDB
+    (au démarrage, périodiquement ou sur événement du change stream) puis remplacées d'un bloc :
+    une requête voit toujours une version complète et cohérente.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.tables: Dict[str, ColumnTable] = {}
+        self.loaded_at: Dict[str, float] = {}
+        self.hits = 0
+        self.fallbacks = 0
+        self._refresh_lock = asyncio.Lock()
+        self._changed: set = set()
+        self._pending_refresh: Optional[asyncio.Task] = None
+
+    async def _load_table(self, name: str) -> ColumnTable:
+        documents: Dict[str, list] = {}
+        size = 0
+        # `_id` est chargé pour départager les égalités du tri, comme MongoDB
+        async for document in self.db[name].find({}).batch_size(10000):
+            for field, value in document.items():
+                documents.setdefault(field, [None] * size).append(value)
+            size += 1
+            for values in documents.values():
+                if len(values) < size:
+                    values.append(None)
+        # Construction (tri, encodage) hors de la boucle d'événements
+        return await asyncio.to_thread(ColumnTable, name, documents, size)
+
+    async def refresh(self, collections: Optional[Iterable[str]] = None) -> None:
+        """Recharge les collections indiquées (toutes par défaut) et remplace les tables d'un bloc."""
+        async with self._refresh_lock:
+            names = list(collections or CATALOG_TABLES)
+            started = time.monotonic()
+            loaded = {}
+            for name in names:
+                try:
+                    loaded[name] = await self._load_table(name)
+                except Exception as e:
+                    logging.error(f"Chargement de `{name}` dans le moteur de catalogue impossible : {e}")
+            self.tables = {**self.tables, **loaded}
+            now = time.time()
+            self.loaded_at.update({name: now for name in loaded})
+            logging.info(
+                f"Moteur de catalogue rechargé ({', '.join(loaded)}) en {time.monotonic() - started:.1f}s, "
+                f"{sum(table.size for table in loaded.values())} documents."
+            )
+
+    def find(self, collection: str, query: Dict, projection: Dict, sort: List[tuple], page: int,
+             limit: int) -> Tuple[List[Dict], bool]:
+        """Même contrat que `LLMService._find_page` ; lève `UnsupportedQuery` si la requête doit aller à MongoDB."""
+        table = self.tables.get(collection)
+        if table is None:
+            self.fallbacks += 1
+            raise UnsupportedQuery(f"Collection `{collection}` non chargée")
+        try:
+            result = table.find(query, projection, sort, page, limit)
+        except UnsupportedQuery:
+            self.fallbacks += 1
+            raise
+        self.hits += 1
+        return result
+
+    async def run_periodic_refresh(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.refresh()
+
+    async def watch(self, debounce: float = 5) -> None:
+        """
+        Recharge une collection après modification (change stream, replica set requis).
+        Les événements rapprochés (import en masse) sont regroupés pendant `debounce` secondes.
+        """
+        pipeline = [{"$match": {"ns.coll": {"$in": list(CATALOG_TABLES)}}}]
+        while True:
+            try:
+                async with self.db.watch(pipeline) as stream:
+                    async for change in stream:
+                        self._changed.add(change["ns"]["coll"])
+                        if self._pending_refresh is None or self._pending_refresh.done():
+                            self._pending_refresh = asyncio.create_task(self._refresh_changed(debounce))
+            except asyncio.CancelledError:
+                if self._pending_refresh:
+                    self._pending_refresh.cancel()
+                raise
+            except Exception as e:
+                logging.error(f"Change stream du moteur de catalogue interrompu : {e}")
+                await asyncio.sleep(30)
+
+    async def _refresh_changed(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        changed, self._changed = self._changed, set()
+        await self.refresh(changed)
+
+    def stats(self) -> Dict:
+        return {
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+            "collections": {
+                name: {"documents": table.size, "memory_bytes": table.memory_bytes, "loaded_at": self.loaded_at.get(name)}
+                for name, table in self.tables.items()
+            },
+        }
@@ -0,0 +1,70 @@
+# services/container.py
+"""
+Conteneur des services partagés par l'application (un seul par worker).
+"""
+import asyncio
+import logging
+
+from core.config import Config
+from services.job_queue import JobQueue
+from services.llm_service import LLMService
+from services.mongo_service import MongoService, create_mongo_client
+
+
+class ServiceContainer:
+    """
+    Regroupe le client MongoDB, `MongoService`, `LLMService` et la file de tâches asynchrones.
+    Créé au démarrage de l'application (lifespan) et fermé à l'arrêt.
+    """
+
+    def __init__(self, mongo_client=None):
+        # Un client fourni (tests de charge, base en mémoire) remplace celui construit depuis `Config`
+        self.mongo_client = mongo_client or create_mongo_client()
+        self.mongo_service = MongoService(self.mongo_client)
+        self.llm_service = LLMService(self.mongo_service)
+        self.job_queue = JobQueue(
+            self.mongo_service, self.llm_service,
+            workers=Config.job_workers, max_size=Config.job_queue_size, ttl_seconds=Config.job_ttl_seconds
+        )
+        self._watchers = []
+
+    async def startup(self) -> None:
+        if Config.auto_create_indexes:
+            await self.llm_service.initialize_indexes()
+        if self.llm_service.message_buffer:
+            # Rejoue les messages acceptés mais non écrits avant le dernier arrêt
+            await self.llm_service.message_buffer.start()
+        resolver = self.llm_service.resolver
+        if resolver:
+            try:
+                await resolver.refresh()
+            except Exception as e:
+                # Sans résolveur, les outils interrogent le catalogue avec les noms demandés
+                logging.error(f"Chargement du résolveur impossible : {e}")
+            if Config.resolver_refresh_seconds > 0:
+                self._watchers.append(asyncio.create_task(resolver.run_periodic_refresh(Config.resolver_refresh_seconds)))
+        catalog_engine = self.llm_service.catalog_engine
+        if catalog_engine:
+            await catalog_engine.refresh()
+            if Config.catalog_engine_refresh_seconds > 0:
+                self._watchers.append(asyncio.create_task(
+                    catalog_engine.run_periodic_refresh(Config.catalog_engine_refresh_seconds)
+                ))
+            if Config.catalog_engine_watch:
+                self._watchers.append(asyncio.create_task(catalog_engine.watch()))
+        if self.llm_service.response_cache and Config.response_cache_watch_catalog:
+            # Invalidation du cache de réponses à chaque modification du catalogue
+            self._watchers.append(asyncio.create_task(
+                self.llm_service.response_cache.watch_catalog(self.mongo_service.db)
+            ))
+        self.job_queue.start()
+        logging.info("Services initialisés.")
+
+    async def shutdown(self) -> None:
+        for watcher in self._watchers:
+            watcher.cancel()
+        await asyncio.gather(*self._watchers, return_exceptions=True)
+        await self.job_queue.stop()
+        await self.llm_service.close()  # Vide aussi le tampon d'écriture différée
+        self.mongo_service.close()
+        logging.info("Services arrêtés.")
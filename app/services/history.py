@@ -0,0 +1,108 @@
+# services/history.py
+"""
+Politique de fenêtrage de l'historique des conversations envoyé au LLM.
+"""
+from typing import Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from core.config import Config
+
+# Rôles des messages enregistrés avant l'utilisation du modèle `Message` (format LangChain)
+LEGACY_ROLES = {"human": "user", "ai": "assistant"}
+
+
+def message_role(msg: Dict) -> Optional[str]:
+    """Retourne le rôle d'un message stocké, y compris pour l'ancien format LangChain."""
+    return msg.get("role") or LEGACY_ROLES.get(msg.get("type"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation grossière du nombre de tokens (~4 caractères par token)."""
+    return len(text) // 4 + 1
+
+
+class HistoryPolicy:
+    """
+    Détermine quelle partie de l'historique est lue dans MongoDB et envoyée au LLM.
+
+    Modes disponibles :
+    - `full` : tout l'historique (comportement historique) ;
+    - `last_n` : les N derniers tours ;
+    - `token_budget` : les derniers messages tenant dans un budget de tokens ;
+    - `summary` : le résumé de la session (services/summarizer.py) suivi des N derniers tours.
+
+    En modes `last_n` et `summary`, le début de la fenêtre avance par blocs de `align_turns` tours (la fenêtre
+    contient alors entre N et N + `align_turns` - 1 tours) : l'historique envoyé garde le même début
+    pendant plusieurs tours, ce qui permet au fournisseur de réutiliser le préfixe mis en cache.
+    """
+
+    def __init__(self, mode: Optional[str] = None, max_turns: Optional[int] = None,
+                 token_budget: Optional[int] = None, align_turns: Optional[int] = None):
+        self.mode = mode or Config.history_mode
+        self.max_turns = max_turns if max_turns is not None else Config.history_max_turns
+        self.token_budget = token_budget if token_budget is not None else Config.history_token_budget
+        self.align_turns = align_turns if align_turns is not None else Config.history_align_turns
+
+    @property
+    def window_size(self) -> int:
+        """Nombre de messages conservés textuellement (un tour = question + réponse)."""
+        return self.max_turns * 2
+
+    def fetch_size(self) -> Optional[int]:
+        """
+        Nombre de messages à lire dans MongoDB (None pour tout l'historique).
+        """
+        if self.mode == "full":
+            return None
+        if self.mode in ("last_n", "summary") and self.align_turns > 1:
+            return self.window_size + (self.align_turns - 1) * 2
+        return self.window_size
+
+    def _aligned_start(self, message_count: int) -> int:
+        """Position du premier message de la fenêtre `last_n`, arrondie au bloc inférieur."""
+        step = self.align_turns * 2
+        return max((message_count - self.window_size) // step * step, 0)
+
+    def select(self, conv_data: Optional[Dict]) -> List[Dict]:
+        """
+        Sélectionne les messages bruts à envoyer au LLM selon le mode.
+        """
+        if not conv_data:
+            return []
+        messages = [msg for msg in conv_data.get("messages", []) if message_role(msg)]
+
+        if self.mode in ("last_n", "summary") and self.align_turns > 1 and "message_count" in conv_data:
+            first_position = conv_data["message_count"] - len(conv_data.get("messages", []))
+            skip = max(self._aligned_start(conv_data["message_count"]) - first_position, 0)
+            messages = [msg for msg in conv_data.get("messages", [])[skip:] if message_role(msg)]
+        elif self.mode != "full":
+            messages = messages[-self.window_size:]
+
+        if self.mode == "token_budget":
+            kept, used = [], 0
+            for msg in reversed(messages):
+                used += estimate_tokens(msg.get("content", ""))
+                if used > self.token_budget:
+                    break
+                kept.append(msg)
+            messages = list(reversed(kept))
+
+        return messages
+
+    def build(self, conv_data: Optional[Dict]) -> List[BaseMessage]:
+        """
+        Convertit la fenêtre sélectionnée en messages LangChain.
+        """
+        history: List[BaseMessage] = []
+        if self.mode == "summary" and conv_data and conv_data.get("history_summary"):
+            history.append(SystemMessage(
+                content=f"Résumé de la conversation précédente : {conv_data['history_summary']}"
+            ))
+
+        for msg in self.select(conv_data):
+            if message_role(msg) == "user":
+                history.append(HumanMessage(content=msg["content"]))
+            else:
+                history.append(AIMessage(content=msg["content"]))
+        return history
@@ -0,0 +1,126 @@
+# services/index_manager.py
+"""
+Déclaration et création des index MongoDB, et diagnostic des requêtes des outils.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from services.mongo_service import MongoService
+
+# Index par collection, alignés sur les requêtes réellement exécutées
+# (égalité d'abord, puis tri/intervalle).
+INDEX_SPECS: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("username", ASCENDING)], unique=True),
+    ],
+    "conversations": [
+        IndexModel([("session_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("is_active", ASCENDING)]),
+        # Liste paginée des sessions d'un utilisateur (tri et curseur sur updated_at, _id)
+        IndexModel([("user_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "conversation_buckets": [
+        IndexModel([("session_id", ASCENDING), ("seq", ASCENDING)], unique=True),
+    ],
+    "jobs": [
+        IndexModel([("job_id", ASCENDING)], unique=True),
+        # Suppression automatique des tâches expirées
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "vols": [
+        IndexModel([("ville_dorigine", ASCENDING), ("ville_de_destination", ASCENDING), ("date_de_depart", ASCENDING),
+                    ("heure_de_depart", ASCENDING), ("numero_de_vol", ASCENDING), ("_id", ASCENDING)]),
+        # Clé naturelle utilisée par l'import (scripts/ingest_catalog.py)
+        IndexModel([("numero_de_vol", ASCENDING), ("date_de_depart", ASCENDING)]),
+    ],
+    "hotels": [
+        IndexModel([("ville", ASCENDING), ("etoiles", DESCENDING), ("nom_de_lhôtel", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("ville", ASCENDING), ("nom_de_lhôtel", ASCENDING)]),
+    ],
+    "restaurants": [
+        IndexModel([("ville", ASCENDING), ("budget", ASCENDING), ("evaluation", DESCENDING),
+                    ("nom_du_restaurant", ASCENDING), ("_id", ASCENDING)]),
+        # Cuisine résolue vers les valeurs exactes du catalogue (égalité / $in)
+        IndexModel([("ville", ASCENDING), ("cuisine", ASCENDING), ("evaluation", DESCENDING),
+                    ("nom_du_restaurant", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("ville", ASCENDING), ("nom_du_restaurant", ASCENDING)]),
+    ],
+    "climat": [
+        IndexModel([("ville", ASCENDING), ("date", ASCENDING), ("_id", ASCENDING)]),
+    ],
+}
+
+# Formes de requêtes émises par l'application (valeurs d'exemple), utilisées par le diagnostic
+QUERY_SHAPES = [
+    ("ask_question (session active)", "conversations", {"user_id": "user_x", "is_active": True}),
+    ("historique de session", "conversations", {"session_id": "session_x"}),
+    ("liste des sessions (page suivante)", "conversations", {"user_id": "user_x", "updated_at": {"$lt": datetime(2025, 3, 1)}}),
+    ("get_flights_info", "vols", {
+        "ville_dorigine": "Paris",
+        "ville_de_destination": "Dubai",
+        "date_de_depart": {"$gte": datetime(2025, 3, 1), "$lt": datetime(2025, 4, 1)},
+    }),
+    ("get_hotels_info", "hotels", {"ville": "Paris", "etoiles": 4}),
+    ("get_restaurants_info", "restaurants", {"ville": "Paris", "budget": "$$", "evaluation": {"$gte": 4}}),
+    ("get_restaurants_info (cuisine)", "restaurants", {"ville": "Paris", "cuisine": {"$in": ["italienne"]}}),
+    ("get_weather_info", "climat", {"ville": "Paris", "date": datetime(2025, 3, 1)}),
+]
+
+
+def _plan_nodes(plan: Dict) -> List[Dict]:
+    """Liste les étapes d'un plan d'exécution (parcours en profondeur)."""
+    nodes = [plan]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            nodes.extend(_plan_nodes(plan[key]))
+    for child in plan.get("inputStages", []):
+        nodes.extend(_plan_nodes(child))
+    return nodes
+
+
+class IndexManager:
+    """
+    Crée les index déclarés dans `INDEX_SPECS` (opération idempotente)
+    et vérifie via `explain()` que les requêtes des outils les utilisent.
+    """
+
+    def __init__(self, mongo_service: MongoService):
+        self.db = mongo_service.db
+
+    async def ensure_indexes(self, collections: Optional[Iterable[str]] = None) -> Dict[str, List[str]]:
+        """
+        Crée les index manquants (de toutes les collections, ou seulement de `collections`).
+        Un index déjà présent avec la même définition est ignoré par MongoDB.
+        """
+        created = {}
+        for collection_name, indexes in INDEX_SPECS.items():
+            if collections is not None and collection_name not in collections:
+                continue
+            try:
+                created[collection_name] = await self.db[collection_name].create_indexes(indexes)
+            except Exception as e:
+                logging.error(f"Impossible de créer les index de `{collection_name}` : {e}")
+        logging.info(f"Index vérifiés : {created}")
+        return created
+
+    async def explain_queries(self) -> List[Dict]:
+        """
+        Retourne, pour chaque forme de requête, le plan choisi et l'index utilisé.
+        """
+        report = []
+        for name, collection_name, query in QUERY_SHAPES:
+            explanation = await self.db[collection_name].find(query).explain()
+            winning_plan = explanation.get("queryPlanner", {}).get("winningPlan", {})
+            nodes = _plan_nodes(winning_plan)
+            stages = [node.get("stage", "?") for node in nodes]
+            report.append({
+                "query": name,
+                "collection": collection_name,
+                "indexed": "IXSCAN" in stages and "COLLSCAN" not in stages,
+                "indexes": [node["indexName"] for node in nodes if "indexName" in node],
+                "stages": stages,
+            })
+        return report
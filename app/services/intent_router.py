@@ -0,0 +1,374 @@
+# services/intent_router.py
+"""
+Routage local des questions simples vers les outils, sans appel au LLM pour choisir l'outil.
+
+Une question est routée seulement si :
+- des mots-clés désignent un seul outil (vols, hôtels, restaurants ou météo) ;
+- le classifieur bayésien naïf, entraîné sur `data/intents_train.jsonl`, choisit le même outil
+  avec une probabilité d'au moins `min_confidence` ;
+- les paramètres obligatoires sont trouvés (villes connues du catalogue via le résolveur, dates
+  explicites) et aucun mot important n'est laissé sans interprétation.
+Dans tous les autres cas (question composée, date relative, référence à l'historique...),
+le LLM choisit les outils comme auparavant.
+"""
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import date as Date
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+
+from services.resolver import CatalogResolver, normalize_name
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+TRAINING_FILE = os.path.join(DATA_DIR, "intents_train.jsonl")
+
+# Mots-clés de chaque outil (formes normalisées)
+KEYWORDS = {
+    "get_flights_info": {"vol", "vols", "avion", "avions", "billet", "billets", "aerien", "aeriens", "decollage"},
+    "get_hotels_info": {"hotel", "hotels", "hebergement", "hebergements", "chambre", "chambres", "logement", "dormir"},
+    "get_restaurants_info": {"restaurant", "restaurants", "resto", "restos", "manger", "diner", "dejeuner", "cuisine"},
+    "get_weather_info": {"meteo", "temps", "temperature", "temperatures", "climat", "pluie", "pleut", "pleuvoir",
+                         "soleil", "prevision", "previsions"},
+}
+
+# Mots sans incidence sur l'intention ni sur les paramètres
+STOP_WORDS = {
+    "a", "au", "aux", "avec", "ce", "ces", "de", "des", "du", "en", "et", "je", "j", "l", "la", "le", "les",
+    "me", "moi", "mon", "ma", "mes", "on", "pour", "quel", "quelle", "quelles", "quels", "qu", "que", "qui",
+    "sur", "un", "une", "d", "s", "vous", "nous", "svp", "stp", "merci", "bonjour", "est", "sont", "il", "y",
+    "ya", "t", "va", "fait", "faire", "donne", "donnez", "montre", "montrez", "cherche", "recherche", "veux",
+    "voudrais", "aimerais", "trouve", "trouver", "liste", "dans", "ville", "disponible", "disponibles",
+    "quoi", "comment", "prevue", "prevu", "prevues", "prevus", "elle", "dispo", "plait", "ou",
+}
+
+# Mots renvoyant à la conversation ou à une date relative : le LLM est nécessaire
+CONTEXT_WORDS = {
+    "la-bas", "labas", "bas", "meme", "memes", "aussi", "encore", "autre", "autres", "suivant", "suivants",
+    "suivante", "suite", "precedent", "precedente", "demain", "aujourd", "hui", "apres", "weekend", "week",
+    "end", "semaine", "prochain", "prochaine", "soir", "matin", "moins", "plus", "cher", "chers",
+    "pas", "ne", "n", "sans", "sauf", "compare", "comparer", "entre", "mieux", "meilleur", "meilleurs",
+    "pourquoi", "combien",
+}
+# Expressions placées avant une ville qui désignent la ville de départ ou d'arrivée (formes normalisées).
+# La plus longue expression trouvée l'emporte : "a destination de" n'est pas lu comme "de".
+ROLE_MARKERS = sorted([
+    (("a", "destination", "de"), "destination"), (("a", "destination", "d"), "destination"),
+    (("destination", "de"), "destination"), (("destination", "d"), "destination"),
+    (("arrivee", "a"), "destination"), (("arrivant", "a"), "destination"),
+    (("au", "depart", "de"), "origin"), (("au", "depart", "d"), "origin"),
+    (("depart", "de"), "origin"), (("depart", "d"), "origin"),
+    (("en", "provenance", "de"), "origin"), (("en", "provenance", "d"), "origin"),
+    (("partant", "de"), "origin"), (("partant", "d"), "origin"),
+    (("de",), "origin"), (("depuis",), "origin"), (("d",), "origin"),
+    (("a",), "destination"), (("vers",), "destination"), (("pour",), "destination"), (("destination",), "destination"),
+], key=lambda marker: -len(marker[0]))
+
+MONTHS = {
+    "janvier": 1, "fevrier": 2, "mars": 3, "avril": 4, "mai": 5, "juin": 6, "juillet": 7,
+    "aout": 8, "septembre": 9, "octobre": 10, "novembre": 11, "decembre": 12,
+}
+_MONTHS = "|".join(MONTHS)
+DATE_PATTERNS = [
+    (re.compile(r"\b(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})\b"), True),
+    (re.compile(r"\b(?P<day>\d{1,2})/(?P<month>\d{1,2})/(?P<year>\d{4})\b"), True),
+    (re.compile(rf"\b(?P<day>\d{{1,2}})(?:er)?\s+(?P<month_name>{_MONTHS})\s+(?P<year>\d{{4}})\b"), True),
+    (re.compile(r"\b(?P<year>\d{4})-(?P<month>\d{1,2})\b"), False),
+    (re.compile(rf"\b(?P<month_name>{_MONTHS})\s+(?P<year>\d{{4}})\b"), False),
+]
+STARS_PATTERN = re.compile(r"\b(?P<stars>[1-5])\s*(?:etoiles?|\*)")
+RATING_PATTERN = re.compile(r"\bnote\s+(?:(?:minimale|minimum|min|d'au|au|moins|de|superieure|a)\s+)*(?P<rating>[0-5](?:[.,]\d)?)\b")
+# Mots qui accompagnent un paramètre : s'ils restent après extraction, le paramètre n'a pas été compris
+SLOT_WORDS = {"note", "etoile", "etoiles", "date", "mois"}
+# Marqueurs remplaçant les paramètres extraits (mots que le classifieur voit à leur place) ;
+# dans les exemples d'entraînement, les villes sont écrites `<ville>`
+SLOT_TOKENS = {"date": "xdatex", "month": "xmoisx", "stars": "xetoilesx", "rating": "xnotex",
+               "city": "xvillex", "cuisine": "xcuisinex"}
+SLOT_MARKERS = set(SLOT_TOKENS.values())
+
+
+def _fold(text: str) -> str:
+    """Minuscules sans accents, ponctuation conservée (pour les expressions de date)."""
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text: str) -> List[str]:
+    return normalize_name(text).split()
+
+
+def features(tokens: List[str]) -> List[str]:
+    """Mots utiles au classifieur : sans mots vides, au singulier approximatif ("hotels" -> "hotel")."""
+    return [
+        token[:-1] if len(token) > 3 and token[-1] in "sx" and token not in SLOT_MARKERS else token
+        for token in tokens if token not in STOP_WORDS
+    ]
+
+
+class NaiveBayesClassifier:
+    """Classifieur bayésien naïf multinomial (lissage de Laplace) sur les mots de la question."""
+
+    def __init__(self, examples: Iterable[Tuple[List[str], str]]):
+        self.word_counts: Dict[str, Counter] = defaultdict(Counter)
+        self.class_counts = Counter()
+        for tokens, label in examples:
+            self.class_counts[label] += 1
+            self.word_counts[label].update(features(tokens))
+        self.vocabulary = {word for counts in self.word_counts.values() for word in counts}
+        self.totals = {label: sum(counts.values()) for label, counts in self.word_counts.items()}
+        examples_count = sum(self.class_counts.values())
+        self.priors = {label: math.log(count / examples_count) for label, count in self.class_counts.items()}
+
+    def predict(self, tokens: List[str]) -> Dict[str, float]:
+        """Probabilité de chaque classe (les mots inconnus sont ignorés)."""
+        known = [token for token in features(tokens) if token in self.vocabulary]
+        scores = {}
+        for label, prior in self.priors.items():
+            denominator = self.totals[label] + len(self.vocabulary)
+            scores[label] = prior + sum(math.log((self.word_counts[label][token] + 1) / denominator) for token in known)
+        best = max(scores.values())
+        exponentials = {label: math.exp(score - best) for label, score in scores.items()}
+        total = sum(exponentials.values())
+        return {label: value / total for label, value in exponentials.items()}
+
+
+def load_examples(path: str = TRAINING_FILE) -> List[Tuple[str, str]]:
+    with open(path, encoding="utf-8") as f:
+        return [(row["text"], row["intent"]) for row in map(json.loads, filter(str.strip, f))]
+
+
+@dataclass
+class Extraction:
+    """Paramètres trouvés dans une question et mots restants (avec marqueurs de paramètres)."""
+    tokens: List[str] = field(default_factory=list)
+    cities: List[Tuple[str, Optional[str]]] = field(default_factory=list)  # (ville, rôle : origin / destination)
+    dates: List[Optional[Tuple[int, int, Optional[int]]]] = field(default_factory=list)  # (année, mois, jour)
+    cuisines: List[str] = field(default_factory=list)
+    stars: Optional[int] = None
+    rating: Optional[float] = None
+
+
+@dataclass
+class RoutedIntent:
+    tool: str
+    args: Dict
+    confidence: float
+
+    def tool_calls(self) -> List[Dict]:
+        """Appel d'outil au format LangChain, comme s'il avait été choisi par le LLM."""
+        return [{"name": self.tool, "args": self.args, "id": f"call_local_{uuid4().hex[:12]}", "type": "tool_call"}]
+
+
+class IntentRouter:
+    """
+    Extraction locale de l'intention et des paramètres d'une question.
+    `route` retourne un `RoutedIntent` si la question peut être traitée sans le LLM, sinon None.
+    """
+
+    def __init__(self, resolver: CatalogResolver, min_confidence: float = 0.6, max_unexplained_words: int = 0,
+                 examples: Optional[List[Tuple[str, str]]] = None):
+        self.resolver = resolver
+        self.min_confidence = min_confidence
+        self.max_unexplained_words = max_unexplained_words
+        self.classifier = NaiveBayesClassifier(
+            (self.extract(text, training=True).tokens, intent) for text, intent in (examples or load_examples())
+        )
+        self.routed = Counter()
+        self.fallbacks = Counter()
+
+    # ---- Extraction des paramètres ----
+
+    def _extract_dates(self, text: str, extraction: Extraction) -> str:
+        for pattern, has_day in DATE_PATTERNS:
+            for match in pattern.finditer(text):
+                parts = match.groupdict()
+                month = MONTHS[parts["month_name"]] if parts.get("month_name") else int(parts["month"])
+                day = int(parts["day"]) if has_day else None
+                try:
+                    Date(int(parts["year"]), month, day or 1)
+                    extraction.dates.append((int(parts["year"]), month, day))
+                except ValueError:
+                    extraction.dates.append(None)  # Date invalide : laissée au LLM
+            text = pattern.sub(f" {SLOT_TOKENS['date' if has_day else 'month']} ", text)
+        return text
+
+    def _match_city(self, words: List[str], start: int) -> Tuple[Optional[str], int]:
+        """Plus longue suite de mots (3 au plus) à partir de `start` désignant une ville connue."""
+        cities = self.resolver.cities
+        for size in (3, 2, 1):
+            if start + size > len(words):
+                continue
+            candidate = " ".join(words[start:start + size])
+            if size == 1 and candidate in STOP_WORDS:
+                break  # Un mot vide ("la", "de"...) ne désigne jamais une ville, même par alias
+            key = candidate if candidate in cities.variants else cities.aliases.get(candidate)
+            if key in cities.variants:
+                return cities.variants[key][0], size
+        word = words[start]
+        if word in STOP_WORDS:
+            return None, 1
+        # Faute de frappe : seulement pour un mot assez long absent du vocabulaire
+        if len(word) >= 5 and word not in self.classifier.vocabulary and word not in STOP_WORDS:
+            key, method = cities.resolve(word)
+            if method == "fuzzy":
+                return cities.variants[key][0], 1
+        return None, 1
+
+    @staticmethod
+    def _city_role(words: List[str], position: int) -> Optional[str]:
+        """Rôle (origin / destination) indiqué par l'expression qui précède la ville, s'il y en a une."""
+        for phrase, role in ROLE_MARKERS:
+            if position >= len(phrase) and tuple(words[position - len(phrase):position]) == phrase:
+                return role
+        return None
+
+    def _match_cuisine(self, word: str) -> Optional[str]:
+        """Cuisine connue désignée par un mot, au pluriel ou au masculin ("italiens" -> "italienne")."""
+        if word in STOP_WORDS or word in KEYWORDS["get_restaurants_info"]:
+            return None
+        cuisines = self.resolver.cuisines
+        for form in (word, word[:-1] if word.endswith("s") else None):
+            key = form if form in cuisines.variants else cuisines.aliases.get(form)
+            if key in cuisines.variants:
+                return cuisines.variants[key][0]
+        return None
+
+    def extract(self, message: str, training: bool = False) -> Extraction:
+        """
+        Extrait dates, étoiles, note minimale, cuisines et villes, et remplace chacun par un marqueur.
+        En entraînement, les villes ne sont pas résolues : elles sont écrites `<ville>` dans les exemples.
+        """
+        extraction = Extraction()
+        text = _fold(message).replace("<ville>", f" {SLOT_TOKENS['city']} ")
+        text = self._extract_dates(text, extraction)
+        match = STARS_PATTERN.search(text)
+        if match:
+            extraction.stars = int(match.group("stars"))
+            text = STARS_PATTERN.sub(f" {SLOT_TOKENS['stars']} ", text)
+        match = RATING_PATTERN.search(text)
+        if match:
+            extraction.rating = float(match.group("rating").replace(",", "."))
+            text = RATING_PATTERN.sub(f" {SLOT_TOKENS['rating']} ", text)
+
+        words = tokenize(text)
+        position = 0
+        while position < len(words):
+            word = words[position]
+            if word not in SLOT_MARKERS and not training:
+                cuisine = self._match_cuisine(word)
+                if cuisine:
+                    extraction.cuisines.append(cuisine)
+                    extraction.tokens.append(SLOT_TOKENS["cuisine"])
+                    position += 1
+                    continue
+                city, size = self._match_city(words, position)
+                if city:
+                    extraction.cities.append((city, self._city_role(words, position)))
+                    extraction.tokens.append(SLOT_TOKENS["city"])
+                    position += size
+                    continue
+            extraction.tokens.append(word)
+            position += 1
+        return extraction
+
+    # ---- Routage ----
+
+    def _unexplained_words(self, tool: str, tokens: List[str]) -> List[str]:
+        """Mots absents des exemples de l'outil : la question demande sans doute autre chose."""
+        known = self.classifier.word_counts[tool]
+        return [feature for feature in features(tokens) if feature not in known and feature not in SLOT_MARKERS]
+
+    @staticmethod
+    def _arguments(tool: str, extraction: Extraction) -> Optional[Dict]:
+        """Paramètres de l'outil, ou None si la question n'est pas assez précise."""
+        cities, dates = extraction.cities, extraction.dates
+        if len(dates) > 1 or None in dates:
+            return None
+        date = dates[0] if dates else None
+
+        if tool == "get_flights_info":
+            if len(cities) != 2 or extraction.stars or extraction.rating or extraction.cuisines:
+                return None
+            (first, first_role), (second, second_role) = cities
+            if first_role and first_role == second_role:
+                return None  # Deux villes de départ (ou d'arrivée) : sens du trajet incertain
+            if first_role == "destination" or second_role == "origin":
+                first, second = second, first
+            if first == second:
+                return None
+            args = {"origin_city": first, "destination_city": second}
+            if date:
+                args["departure_date"] = f"{date[0]:04d}-{date[1]:02d}"
+            return args
+
+        if len(cities) != 1:
+            return None
+        args = {"city": cities[0][0]}
+        if tool == "get_weather_info":
+            if extraction.stars or extraction.rating or extraction.cuisines:
+                return None
+            if date:
+                if date[2] is None:
+                    return None  # Mois entier : plage non prise en charge par l'outil
+                args["date"] = f"{date[0]:04d}-{date[1]:02d}-{date[2]:02d}"
+            return args
+        if date:
+            return None  # Les hôtels et restaurants ne sont pas filtrés par date
+        if tool == "get_hotels_info":
+            if extraction.rating or extraction.cuisines:
+                return None
+            if extraction.stars:
+                args["stars"] = extraction.stars
+            return args
+        # get_restaurants_info
+        if extraction.stars or len(extraction.cuisines) > 1:
+            return None
+        if extraction.cuisines:
+            args["cuisine"] = extraction.cuisines[0]
+        if extraction.rating:
+            args["rating"] = extraction.rating
+        return args
+
+    def analyze(self, message: str) -> Tuple[Optional[RoutedIntent], str]:
+        """Retourne `(intention routée ou None, raison)` ; la raison explique un éventuel renvoi au LLM."""
+        if not self.resolver.loaded:
+            return None, "resolver_not_loaded"
+        extraction = self.extract(message)
+        words = set(extraction.tokens)
+        if words & CONTEXT_WORDS:
+            return None, "context"
+        tools = [tool for tool, keywords in KEYWORDS.items() if words & keywords]
+        if len(tools) != 1:
+            return None, "no_keyword" if not tools else "multiple_intents"
+        tool = tools[0]
+        if words & SLOT_WORDS:
+            return None, "unparsed_slot"
+        if len(self._unexplained_words(tool, extraction.tokens)) > self.max_unexplained_words:
+            return None, "unexplained_words"
+        probabilities = self.classifier.predict(extraction.tokens)
+        predicted = max(probabilities, key=probabilities.get)
+        if predicted != tool or probabilities[predicted] < self.min_confidence:
+            return None, "low_confidence"
+        args = self._arguments(tool, extraction)
+        if args is None:
+            return None, "missing_slots"
+        return RoutedIntent(tool, args, round(probabilities[predicted], 4)), "routed"
+
+    def route(self, message: str) -> Optional[RoutedIntent]:
+        routed, reason = self.analyze(message)
+        if routed:
+            self.routed[routed.tool] += 1
+        else:
+            self.fallbacks[reason] += 1
+        return routed
+
+    def stats(self) -> Dict:
+        routed, fallbacks = sum(self.routed.values()), sum(self.fallbacks.values())
+        return {
+            "routed": dict(self.routed),
+            "fallbacks": dict(self.fallbacks),
+            "bypass_rate": routed / (routed + fallbacks) if routed + fallbacks else 0.0,
+        }
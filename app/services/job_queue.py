@@ -0,0 +1,114 @@
+# services/job_queue.py
+"""
+Exécution asynchrone des questions (`/chat/ask?mode=async`) : file de travail en mémoire,
+résultats persistés dans la collection MongoDB `jobs`.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+from fastapi import HTTPException
+
+from models.models import AskRequest
+from services.llm_service import LLMService
+from services.mongo_service import MongoService
+
+
+class JobQueueFull(Exception):
+    """La file d'attente a atteint sa capacité maximale."""
+
+
+class JobQueue:
+    """
+    File de tâches traitée par un nombre borné de workers asyncio.
+
+    Chaque tâche est enregistrée dans `jobs` (statut `pending`, `running`, `done` ou `error`)
+    avec une date d'expiration (index TTL) : n'importe quel worker uvicorn peut répondre au suivi.
+    """
+
+    def __init__(self, mongo_service: MongoService, llm_service: LLMService,
+                 workers: int = 4, max_size: int = 100, ttl_seconds: int = 86400):
+        self.jobs_collection = mongo_service.jobs_collection
+        self.llm_service = llm_service
+        self.workers = workers
+        self.ttl_seconds = ttl_seconds
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logging.info(f"File de tâches démarrée ({self.workers} workers).")
+
+    async def stop(self) -> None:
+        """
+        Arrête les workers. Les tâches en cours ou en attente sont marquées en erreur
+        (elles ne sont pas reprises au redémarrage).
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        while not self._queue.empty():
+            job_id, _ = self._queue.get_nowait()
+            await self._set_status(job_id, "error", error="Tâche interrompue par l'arrêt du serveur.")
+
+    async def submit(self, request: AskRequest) -> Dict:
+        """
+        Enregistre la tâche et la place dans la file. Lève `JobQueueFull` si la file est pleine.
+        """
+        if self._queue.full():
+            raise JobQueueFull()
+        now = datetime.utcnow()
+        job = {
+            "job_id": f"job_{uuid4()}",
+            "user_id": request.user_id,
+            "status": "pending",
+            "created_at": now,
+            "updated_at": now,
+            "expires_at": now + timedelta(seconds=self.ttl_seconds),
+        }
+        await self.jobs_collection.insert_one(dict(job))
+        try:
+            self._queue.put_nowait((job["job_id"], request))
+        except asyncio.QueueFull:
+            await self.jobs_collection.delete_one({"job_id": job["job_id"]})
+            raise JobQueueFull()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        return await self.jobs_collection.find_one({"job_id": job_id}, {"_id": 0, "expires_at": 0})
+
+    async def _set_status(self, job_id: str, status: str, **fields) -> None:
+        await self.jobs_collection.update_one(
+            {"job_id": job_id},
+            {"$set": {"status": status, "updated_at": datetime.utcnow(), **fields}}
+        )
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, request = await self._queue.get()
+            try:
+                await self._run(job_id, request)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str, request: AskRequest) -> None:
+        try:
+            await self._set_status(job_id, "running")
+            session = await self.llm_service.resolve_active_session(request.user_id)
+            response = await self.llm_service.generate_response(
+                request.question, session["session_id"], request.user_id, session,
+                response_mode=request.response_mode, include_items=request.include_items
+            )
+            await self._set_status(job_id, "done", session_id=session["session_id"], result=response.dict())
+        except asyncio.CancelledError:
+            await asyncio.shield(self._set_status(job_id, "error", error="Tâche interrompue par l'arrêt du serveur."))
+            raise
+        except Exception as e:
+            logging.error(f"Erreur lors du traitement de la tâche {job_id} : {e}")
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            await self._set_status(job_id, "error", error=detail)
+
+    def stats(self) -> Dict:
+        return {"queued": self._queue.qsize(), "max_size": self._queue.maxsize, "workers": self.workers}
@@ -1,18 +1,31 @@
 import os
-import json
+import asyncio
 import logging
-import pandas as pd
+import time
 from datetime import datetime
-from datetime import timedelta
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
 from uuid import uuid4
 
 from fastapi import HTTPException
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-from langchain_openai import ChatOpenAI
-from langchain.schema import FunctionMessage
-from models.models import User, Message, ChatResponse, Conversation
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from models.models import User, Message, ChatResponse, Conversation, SummaryResponse, ToolResult, FlightItem, HotelItem, RestaurantItem, WeatherItem
 from services.mongo_service import MongoService
+from core.config import Config
+from core.metrics import INTENT_ROUTES, cached_prompt_tokens, observe_prompt_parts, observe_stage, record_token_usage, timed
+from services.history import HistoryPolicy
+from services.index_manager import IndexManager
+from services.memory import SessionStore
+from services.message_buffer import MessageBuffer, MessageBufferFull, parse_write_concern
+from services.intent_router import IntentRouter, RoutedIntent
+from services.cache import InMemoryCache, ToolCache, parse_ttls
+from services.catalog_engine import CatalogEngine, UnsupportedQuery
+from services.prompt_builder import PromptBuilder
+from services.resolver import CatalogResolver, parse_aliases
+from services.summarizer import SUMMARY_FIELDS, SessionSummarizer, summary_state
+from services.response_cache import ResponseCache
+from services.rate_limiter import LLMOverloaded, LLMRateLimiter
+from services.renderers import parse_tool_modes, render_tool_results, resolve_response_mode
 from datetime import datetime
 from pytz import timezone
 
@@ -25,7 +38,8 @@ FUNCTION_DEFINITIONS = [
             "properties": {
                 "origin_city": {"type": "string", "description": "Nom complet de la ville de départ (ex: 'Mexico City')"},
                 "destination_city": {"type": "string", "description": "Nom complet de la ville d'arrivée (ex: 'Dubai')"},
-                "departure_date": {"type": "string", "description": "Date au format YYYY-MM ou YYYY-MM-DD (facultatif)"}
+                "departure_date": {"type": "string", "description": "Date au format YYYY-MM ou YYYY-MM-DD (facultatif)"},
+                "page": {"type": "integer", "description": "Page de résultats (1 par défaut), à demander lorsque d'autres résultats sont disponibles"}
             },
             "required": ["origin_city", "destination_city"]
         }
@@ -37,7 +51,8 @@ FUNCTION_DEFINITIONS = [
             "type": "object",
             "properties": {
                 "city": {"type": "string"},
-                "stars": {"type": "number", "description": "Nombre d'étoiles souhaité (1-5)"}
+                "stars": {"type": "number", "description": "Nombre d'étoiles souhaité (1-5)"},
+                "page": {"type": "integer", "description": "Page de résultats (1 par défaut), à demander lorsque d'autres résultats sont disponibles"}
             },
             "required": ["city"]
         }
@@ -51,7 +66,8 @@ FUNCTION_DEFINITIONS = [
         "city": {"type": "string", "description": "Nom de la ville"},
         "cuisine": {"type": "string", "description": "Type de cuisine (italienne, japonaise, etc.)"},
         "budget": {"type": "string", "description": "Budget approximatif ($, $$, $$$)"},
-        "rating": {"type": "number", "description": "Note minimale (1-5)"}
+        "rating": {"type": "number", "description": "Note minimale (1-5)"},
+        "page": {"type": "integer", "description": "Page de résultats (1 par défaut), à demander lorsque d'autres résultats sont disponibles"}
         },
         "required": ["city"]
     }
@@ -64,23 +80,168 @@ FUNCTION_DEFINITIONS = [
             "type": "object",
             "properties": {
                 "city": {"type": "string"},
-                "date": {"type": "string", "description": "Date pour la météo (facultative)."}
+                "date": {"type": "string", "description": "Date pour la météo (facultative)."},
+                "page": {"type": "integer", "description": "Page de résultats (1 par défaut), à demander lorsque d'autres résultats sont disponibles"}
             },
             "required": ["city"]
         }
     }
 ]
 
+# Format "tools" de l'API OpenAI : permet plusieurs appels d'outils en parallèle
+TOOL_DEFINITIONS = [{"type": "function", "function": definition} for definition in FUNCTION_DEFINITIONS]
+TOOL_NAMES = {definition["name"] for definition in FUNCTION_DEFINITIONS}
+
+# Champs de la session nécessaires à la construction de l'historique
+HISTORY_FIELDS = ["history_summary", "summary_upto"]
+
 class LLMService:
-    def __init__(self):
-        self.mongo_service = MongoService()
+    def __init__(self, mongo_service: Optional[MongoService] = None):
+        self.mongo_service = mongo_service or MongoService()
         self.chat_model = ChatOpenAI(
             api_key=os.getenv("OPENAI_API_KEY"),
-            model="gpt-4o"       
+            model=Config.llm_model,
+            max_retries=0,  # Les nouvelles tentatives sont gérées par `llm_limiter`
+            stream_usage=True  # Consommation de tokens aussi en mode streamé
+        )
+        self.llm_limiter = LLMRateLimiter(
+            max_concurrency=Config.llm_max_concurrency,
+            requests_per_minute=Config.llm_requests_per_minute,
+            tokens_per_minute=Config.llm_tokens_per_minute,
+            max_wait=Config.llm_max_queue_wait,
+            max_retries=Config.llm_max_retries
+        )
+        self.history_policy = HistoryPolicy()
+        self.session_store = SessionStore(
+            max_sessions=Config.session_store_max_sessions,
+            max_bytes=Config.session_store_max_bytes,
+            idle_ttl=Config.session_store_idle_ttl,
+            window=self.history_policy.fetch_size()
+        ) if Config.session_store_enabled else None
+        self.message_buffer = MessageBuffer(
+            self.mongo_service,
+            max_batch=Config.write_behind_batch_size,
+            flush_interval=Config.write_behind_flush_seconds,
+            max_pending=Config.write_behind_max_pending,
+            max_wait=Config.write_behind_max_wait_seconds,
+            spill_path=Config.write_behind_spill_path or None,
+            write_concern=parse_write_concern(Config.write_behind_write_concern, Config.write_behind_journal)
+        ) if Config.write_behind_enabled else None
+        summary_every = Config.summary_every_messages
+        if self.history_policy.mode == "summary":
+            # Le résumé remplace les tours sortis de la fenêtre : il doit avancer au moins aussi vite qu'elle
+            summary_every = min(summary_every, self.history_policy.window_size)
+        self.summarizer = SessionSummarizer(
+            self.mongo_service,
+            lambda prompt: self._generate_text(prompt, "summary"),
+            every_n=summary_every,
+            max_batch=Config.summary_max_batch
+        ) if Config.summary_enabled or self.history_policy.mode == "summary" else None
+        self.prompt_builder = PromptBuilder(
+            Config.llm_model, TOOL_DEFINITIONS,
+            token_budget=Config.prompt_token_budget, trim_turns=Config.prompt_trim_turns
         )
+        self.tool_cache = ToolCache(
+            InMemoryCache(Config.tool_cache_max_entries, Config.tool_cache_max_bytes),
+            parse_ttls(Config.tool_cache_ttls)
+        ) if Config.tool_cache_enabled else None
+        self.tool_response_modes = parse_tool_modes(Config.response_mode_tools)
+        self.catalog_engine = CatalogEngine(self.mongo_service.db) if Config.catalog_engine_enabled else None
+        self.resolver = CatalogResolver(
+            self.mongo_service.db, parse_aliases(Config.city_aliases), parse_aliases(Config.cuisine_aliases),
+            Config.resolver_min_similarity
+        ) if Config.resolver_enabled else None
+        self.intent_router = IntentRouter(
+            self.resolver, min_confidence=Config.intent_router_min_confidence
+        ) if Config.intent_router_enabled and self.resolver else None
+        self.response_cache = ResponseCache(
+            embeddings=OpenAIEmbeddings(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                model=Config.response_cache_embedding_model
+            ) if Config.response_cache_semantic else None,
+            similarity_threshold=Config.response_cache_similarity,
+            ttl=Config.response_cache_ttl,
+            max_entries=Config.response_cache_max_entries
+        ) if Config.response_cache_enabled else None
+        self._background_tasks = set()
+
+    async def close(self):
+        """
+        Attend la fin des tâches de fond (résumés) avant l'arrêt de l'application.
+        """
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        if self.message_buffer:
+            await self.message_buffer.stop()
+
+    def _estimate_request_tokens(self, messages: List[BaseMessage], with_tools: bool = False) -> int:
+        """Tokens d'un appel (prompt compté localement et réponse estimée) pour la limite de tokens par minute."""
+        return self.prompt_builder.count_messages(messages, with_tools) + Config.llm_completion_tokens_estimate
+
+    def _record_usage(self, purpose: str, estimated: int, usage: Dict) -> None:
+        """Comptabilise les tokens réels d'un appel et journalise la part servie par le cache du fournisseur."""
+        record_token_usage(purpose, usage)
+        self.llm_limiter.record_usage(estimated, usage.get("total_tokens"))
+        prompt = usage.get("prompt_tokens", usage.get("input_tokens")) or 0
+        if prompt:
+            cached = cached_prompt_tokens(usage)
+            logging.info(
+                f"Tokens `{purpose}` : {prompt} en entrée ({cached} en cache, {prompt - cached} hors cache, "
+                f"{estimated - Config.llm_completion_tokens_estimate} estimés)"
+            )
+
+    async def _generate(self, messages: List[BaseMessage], purpose: str, **kwargs):
+        """
+        Appel au LLM soumis au limiteur (concurrence, débit, nouvelles tentatives).
+        `purpose` (tool_selection, rephrase, summary) étiquette la durée et les tokens mesurés.
+        """
+        estimated = self._estimate_request_tokens(messages, "tools" in kwargs)
+        with timed(f"llm_{purpose}"):
+            response = await self.llm_limiter.call(lambda: self.chat_model.agenerate([messages], **kwargs), estimated)
+        self._record_usage(purpose, estimated, (response.llm_output or {}).get("token_usage") or {})
+        return response
+
+    async def _generate_text(self, messages: List[BaseMessage], purpose: str) -> str:
+        """Texte de la réponse d'un appel au LLM sans outils."""
+        response = await self._generate(messages, purpose)
+        return response.generations[0][0].message.content.strip()
+
+    async def _stream(self, messages: List[BaseMessage], purpose: str, **kwargs) -> AsyncIterator:
+        """
+        Version streamée de `_generate` (mesure aussi le délai avant le premier morceau).
+        """
+        estimated = self._estimate_request_tokens(messages, "tools" in kwargs)
+        usage = None
+        started = time.perf_counter()
+        first_chunk = True
+        with timed(f"llm_{purpose}"):
+            async for chunk in self.llm_limiter.stream(lambda: self.chat_model.astream(messages, **kwargs), estimated):
+                if first_chunk:
+                    observe_stage(f"llm_{purpose}_first_chunk", time.perf_counter() - started)
+                    first_chunk = False
+                usage = chunk.usage_metadata or usage
+                yield chunk
+        if usage:
+            self._record_usage(purpose, estimated, usage)
+
+    def stats(self) -> Dict:
+        """
+        Indicateurs du limiteur d'appels au LLM et des caches.
+        """
+        return {
+            "llm_limiter": self.llm_limiter.stats(),
+            "session_store": self.session_store.stats() if self.session_store else None,
+            "message_buffer": self.message_buffer.stats() if self.message_buffer else None,
+            "tool_cache": self.tool_cache.stats() if self.tool_cache else None,
+            "response_cache": self.response_cache.stats() if self.response_cache else None,
+            "catalog_engine": self.catalog_engine.stats() if self.catalog_engine else None,
+            "resolver": self.resolver.stats() if self.resolver else None,
+            "intent_router": self.intent_router.stats() if self.intent_router else None,
+            "summarizer": self.summarizer.stats() if self.summarizer else None,
+        }
+
     async def initialize_indexes(self):
-        await self.mongo_service.users_collection.create_index("username", unique=True)
-        await self.mongo_service.conversations_collection.create_index("session_id")
+        await IndexManager(self.mongo_service).ensure_indexes()
 
     async def get_user_by_username(self, username: str) -> Optional[User]:
         user_data = await self.mongo_service.users_collection.find_one({"username": username})
@@ -109,6 +270,9 @@ class LLMService:
         Crée une nouvelle session pour l'utilisateur et marque les sessions existantes comme inactives.
         """
         try:
+            if self.session_store:
+                self.session_store.deactivate_user(user_id)
+
             # Marquer les sessions existantes comme inactives
             await self.mongo_service.conversations_collection.update_many(
                 {"user_id": user_id, "is_active": True},
@@ -117,15 +281,12 @@ class LLMService:
 
             # Créer une nouvelle session
             session_id = f"{user_id}_session_{uuid4()}"
-            new_session = {
-                "session_id": session_id,
-                "user_id": user_id,
-                "messages": [],
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow(),
-                "is_active": True,  # Nouvelle session active
-            }
+            new_session = self.mongo_service.new_session_document(session_id, user_id)
             await self.mongo_service.conversations_collection.insert_one(new_session)
+            if self.session_store:
+                self.session_store.put(user_id, {
+                    "session_id": session_id, "storage": new_session["storage"], "messages": [], "message_count": 0
+                })
 
             return session_id
         except Exception as e:
@@ -135,6 +296,75 @@ class LLMService:
 
 
     
+    async def load_session(self, query: Dict) -> Optional[Dict]:
+        """
+        Charge une session et la fenêtre d'historique utile en une seule requête.
+        Les messages encore en attente d'écriture différée sont ajoutés à la fenêtre.
+        """
+        last = self.history_policy.fetch_size()
+        # Pris avant la lecture : des messages écrits pendant la lecture ne sont plus dans le tampon
+        snapshot = self.message_buffer.snapshot() if self.message_buffer else ()
+        session = await self.mongo_service.get_session_window(query, last=last, fields=HISTORY_FIELDS)
+        if self.message_buffer:
+            session = self.message_buffer.merge_pending(session, last, snapshot)
+        return session
+
+    async def get_messages_page(self, session: Dict, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Page de messages d'une session (`session_id`, `storage`, `message_count`), complétée
+        par les messages en attente d'écriture différée, qui suivent les messages enregistrés.
+        """
+        snapshot = self.message_buffer.snapshot() if self.message_buffer else ()
+        messages = await self.mongo_service.get_messages_page(session, offset=offset, limit=limit)
+        if self.message_buffer and (limit is None or len(messages) < limit):
+            known = {msg.get("id") for msg in messages}
+            pending = [
+                msg for msg in self.message_buffer.pending(session["session_id"], snapshot) if msg.get("id") not in known
+            ]
+            pending = pending[max(offset - session.get("message_count", 0), 0):]
+            messages += pending if limit is None else pending[:limit - len(messages)]
+        return messages
+
+    async def get_messages_range(self, session: Dict, limit: int, before: Optional[int] = None,
+                                 after: Optional[int] = None) -> tuple:
+        """
+        Page de messages repérée par position (indice du message dans la session, stable car les messages sont
+        seulement ajoutés) : `limit` messages avant `before`, après `after`, ou les plus récents.
+        Retourne `(messages, position du premier message renvoyé, nombre total de messages)`.
+        """
+        count = session.get("message_count", 0)
+        if self.message_buffer:
+            count += len(self.message_buffer.pending(session["session_id"]))
+        if after is not None:
+            start = after + 1
+        else:
+            end = count if before is None else min(before, count)
+            start = max(end - limit, 0)
+            limit = end - start
+        if start >= count or limit <= 0:
+            return [], start, count
+        return await self.get_messages_page(session, offset=start, limit=limit), start, count
+
+    async def resolve_active_session(self, user_id: str) -> Dict:
+        """
+        Retourne la session active de l'utilisateur (avec son historique) ou en crée une nouvelle.
+        """
+        with timed("session_lookup"):
+            if self.session_store:
+                session = self.session_store.get_active(user_id)
+                if session:
+                    return session
+
+            session = await self.load_session({"user_id": user_id, "is_active": True})
+            if session:
+                if self.session_store:
+                    self.session_store.put(user_id, session)
+                return session
+
+            # Créer une nouvelle session si aucune n'existe
+            session_id = await self.create_new_session(user_id)
+            return {"session_id": session_id, "messages": [], "message_count": 0}
+
     async def get_conversations_by_user(self, user_id: str) -> List[Conversation]:
         """
         Récupère toutes les conversations d'un utilisateur.
@@ -142,88 +372,183 @@ class LLMService:
         conversations = await self.mongo_service.conversations_collection.find({"user_id": user_id}).to_list(length=None)
         return [Conversation(**conv) for conv in conversations]
 
-    async def generate_response(self, message: str, session_id: str, user_id: str) -> ChatResponse:
+    async def _build_messages(self, message: str, session_id: str, conv_data: Optional[Dict] = None) -> list:
+        """
+        Construit la liste des messages envoyés au LLM (instructions, historique, question).
+        `conv_data` permet de réutiliser une session déjà chargée par `resolve_active_session`.
+        """
+        with timed("history_load"):
+            # Récupération de la fenêtre utile de la conversation existante
+            if conv_data is None and self.session_store:
+                conv_data = self.session_store.get(session_id)
+            if conv_data is None:
+                conv_data = await self.load_session({"session_id": session_id})
+            history = self.history_policy.build(conv_data)
+
+        # Instructions et schémas stables en tête, historique réduit au budget de tokens
+        messages, prompt_stats = self.prompt_builder.build(history, message)
+        observe_prompt_parts(prompt_stats.as_dict())
+        logging.debug(f"Tokens de la requête : {prompt_stats.as_dict()} (total {prompt_stats.total})")
+        return messages
+
+    def _route_locally(self, message: str) -> Optional[RoutedIntent]:
+        """
+        Choix local de l'outil pour une question simple (évite l'appel `tool_selection` au LLM).
+        Retourne None si la question doit être confiée au LLM.
+        """
+        if not self.intent_router:
+            return None
+        with timed("intent_routing"):
+            routed = self.intent_router.route(message)
+        INTENT_ROUTES.labels(routed.tool if routed else "llm").inc()
+        if routed:
+            logging.info(f"Question routée localement vers `{routed.tool}` {routed.args} (p={routed.confidence})")
+        return routed
+
+    async def _call_function(self, fn_name: str, args: Dict) -> ToolResult:
+        """
+        Exécute l'outil demandé par le LLM et retourne son résultat structuré.
+        """
+        logging.info(f"Appel de la fonction `{fn_name}` avec arguments: {args}")
+        if self.tool_cache:
+            function_response = await self.tool_cache.get_or_call(
+                fn_name, args,
+                lambda: self._query_tool(fn_name, args),
+                should_cache=lambda result: result.status != "error"
+            )
+        else:
+            function_response = await self._query_tool(fn_name, args)
+        logging.info(f"Réponse de la fonction `{fn_name}`: {function_response}")
+        return function_response
+
+    async def _query_tool(self, fn_name: str, args: Dict) -> ToolResult:
+        """Exécute la requête MongoDB de l'outil (hors cache)."""
+        with timed("tool_query", fn_name):
+            return await getattr(self, fn_name)(**args)
+
+    async def _execute_tool_call(self, tool_call: Dict) -> ToolResult:
+        """
+        Exécute un appel d'outil avec son propre délai maximal.
+        Une erreur est renvoyée comme résultat (statut `error`) et ne bloque pas les autres appels.
+        """
+        fn_name = tool_call["name"]
+        if fn_name not in TOOL_NAMES:
+            logging.warning(f"Fonction `{fn_name}` non implémentée.")
+            return ToolResult(tool=fn_name, status="error", message="Désolé, cette fonctionnalité n'est pas encore disponible.")
+        try:
+            with timed("tool", fn_name):
+                return await asyncio.wait_for(
+                    self._call_function(fn_name, tool_call.get("args") or {}),
+                    timeout=Config.tool_timeout_seconds
+                )
+        except asyncio.TimeoutError:
+            logging.error(f"Délai dépassé pour la fonction `{fn_name}`.")
+            return ToolResult(tool=fn_name, status="error", message=f"Le service `{fn_name}` n'a pas répondu à temps.")
+        except Exception as e:
+            logging.error(f"Erreur lors de l'appel de la fonction `{fn_name}` : {str(e)}")
+            return ToolResult(tool=fn_name, status="error", message="Une erreur est survenue lors de l'obtention des données. Veuillez réessayer.")
+
+    @staticmethod
+    def _add_tool_results(messages: list, llm_message: AIMessage, tool_calls: List[Dict], results: List[ToolResult]) -> bool:
+        """
+        Ajoute la demande d'outils et leurs résultats (encodage compact) à la conversation envoyée au LLM.
+        Retourne True si au moins un outil a renvoyé des données à reformuler.
+        """
+        messages.append(llm_message)
+        for tool_call, result in zip(tool_calls, results):
+            messages.append(ToolMessage(content=result.to_prompt(), tool_call_id=tool_call["id"]))
+        return any(result.status == "ok" for result in results)
+
+    @staticmethod
+    def _with_items(response: ChatResponse, include_items: bool) -> ChatResponse:
+        """Retire les résultats bruts des outils de la réponse s'ils n'ont pas été demandés."""
+        return response if include_items else response.copy(update={"items": None})
+
+    def _response_mode(self, message: str, tool_calls: List[Dict], response_mode: Optional[str]) -> str:
+        return resolve_response_mode(
+            message, [call["name"] for call in tool_calls],
+            Config.response_mode, self.tool_response_modes, response_mode
+        )
+
+    async def generate_response(self, message: str, session_id: str, user_id: str,
+                                session: Optional[Dict] = None, response_mode: Optional[str] = None,
+                                include_items: bool = False) -> ChatResponse:
         try:
             logging.info(f"Début de `generate_response` pour le message: {message}, session_id: {session_id}, user_id: {user_id}")
 
-            # Initialisation des messages avec instructions pour le LLM
-            messages = [
-                SystemMessage(content=(
-                    "Vous êtes un assistant intelligent spécialisé dans la recherche d'informations pratiques (hôtels, restaurants, vols, météo). "
-                    "Utilisez toujours les fonctions pour fournir des informations précises, puis reformulez de manière claire pour l'utilisateur."
-                ))
-            ]
+            messages = await self._build_messages(message, session_id, session)
+            user_msg = messages[-1]
 
-            # Récupération de la conversation existante
-            conv_data = await self.mongo_service.conversations_collection.find_one({"session_id": session_id})
-            if conv_data:
-                for msg in conv_data.get("messages", []):
-                    if msg.get("role") == "user":
-                        messages.append(HumanMessage(content=msg["content"]))
-                    elif msg.get("role") == "assistant":
-                        messages.append(AIMessage(content=msg["content"]))
-
-            # Ajout du message utilisateur actuel
-            user_msg = HumanMessage(content=message)
-            messages.append(user_msg)
-
-            # Appel initial au LLM
-            response = await self.chat_model.agenerate(
-                [messages],
-                functions=FUNCTION_DEFINITIONS,
-                function_call="auto"
-            )
-            llm_message = response.generations[0][0].message
-            logging.info(f"Réponse brute du LLM : {llm_message}")
-
-            # Si un `function_call` est détecté
-            function_call = llm_message.additional_kwargs.get("function_call")
-            if function_call:
-                fn_name = function_call["name"]
-                args = json.loads(function_call.get("arguments", "{}"))
-
-                if hasattr(self, fn_name):
-                    try:
-                        logging.info(f"Appel de la fonction `{fn_name}` avec arguments: {args}")
-                        function_response = await getattr(self, fn_name)(**args)
-                        logging.info(f"Réponse de la fonction `{fn_name}`: {function_response}")
-
-                        if "Aucun" in function_response:
-                            final_message = function_response  # Pas besoin de reformuler si aucun résultat
-                        else:
-                            # Ajouter les résultats pour reformulation
-                            messages.append(FunctionMessage(
-                                name=fn_name, 
-                                content=function_response,
-                            ))                            
-                            refined_response = await self.chat_model.agenerate([messages])
-
-                            # Si la reformulation est vide, utilise les données brutes formatées
-                            if refined_response.generations[0][0].message.content.strip():
-                                final_message = refined_response.generations[0][0].message.content
-                            else:
-                                logging.warning("Reformulation vide. Utilisation des résultats bruts.")
-                                final_message = f"Voici les résultats trouvés :\n{function_response}"
-
-                    except Exception as e:
-                        logging.error(f"Erreur lors de l'appel de la fonction `{fn_name}` : {str(e)}")
-                        final_message = "Une erreur est survenue lors de l'obtention des données. Veuillez réessayer."
+            # Question déjà traitée : réponse servie sans appel au LLM
+            cache_scope, cached = await self._lookup_cached_response(message, user_id, messages)
+            if cached:
+                await self.save_messages(session_id, user_id, [user_msg, AIMessage(content=cached.response)])
+                return self._with_items(cached, include_items)
+
+            cacheable_tools, results = [], []
+
+            routed = self._route_locally(message)
+            if routed:
+                # Outil et paramètres déterminés localement, sans appel au LLM
+                llm_message = AIMessage(content="", tool_calls=routed.tool_calls())
+            else:
+                # Appel initial au LLM
+                response = await self._generate(
+                    messages, "tool_selection",
+                    tools=TOOL_DEFINITIONS,
+                    tool_choice="auto"
+                )
+                llm_message = response.generations[0][0].message
+                logging.info(f"Réponse brute du LLM : {llm_message}")
+
+            # Si des appels d'outils sont demandés, ils sont exécutés en parallèle
+            tool_calls = llm_message.tool_calls
+            if tool_calls:
+                results = await asyncio.gather(*(self._execute_tool_call(call) for call in tool_calls))
+                cacheable_tools = [result.tool for result in results if result.status != "error"]
+
+                if not self._add_tool_results(messages, llm_message, tool_calls, results):
+                    # Pas besoin de reformuler si aucun résultat
+                    final_message = "\n".join(result.message or "" for result in results)
+                elif self._response_mode(message, tool_calls, response_mode) == "template":
+                    # Simple consultation : mise en forme locale, sans second appel au LLM
+                    final_message = render_tool_results(tool_calls, results)
                 else:
-                    logging.warning(f"Fonction `{fn_name}` non implémentée.")
-                    final_message = "Désolé, cette fonctionnalité n'est pas encore disponible."
+                    # Reformulation de tous les résultats en un seul appel
+                    refined_response = await self._generate(
+                        messages, "rephrase",
+                        tools=TOOL_DEFINITIONS,
+                        tool_choice="none"
+                    )
+
+                    # Si la reformulation est vide, utilise les données brutes formatées
+                    if refined_response.generations[0][0].message.content.strip():
+                        final_message = refined_response.generations[0][0].message.content
+                    else:
+                        logging.warning("Reformulation vide. Utilisation des résultats bruts.")
+                        final_message = render_tool_results(tool_calls, results)
 
             else:
-                # Si aucun function_call détecté
-                logging.warning("Aucun function_call détecté.")
+                # Si aucun appel d'outil détecté
+                logging.warning("Aucun appel d'outil détecté.")
                 final_message = llm_message.content or "Je n'ai pas compris votre demande. Pouvez-vous préciser ?"
 
             # Sauvegarde des messages dans la base de données
             assistant_msg = AIMessage(content=final_message)
-            await self.save_message(session_id, user_id, user_msg)
-            await self.save_message(session_id, user_id, assistant_msg)
-
-            return ChatResponse(response=final_message)
-
+            await self.save_messages(session_id, user_id, [user_msg, assistant_msg])
+            self._schedule_summary_refresh(session_id)
+
+            chat_response = ChatResponse(response=final_message, items=results or None)
+            self._store_cached_response(message, cache_scope, chat_response, cacheable_tools)
+            return self._with_items(chat_response, include_items)
+
+        except LLMOverloaded as e:
+            logging.warning(f"LLM surchargé, requête rejetée : {e}")
+            raise HTTPException(status_code=503, detail="Service momentanément surchargé. Veuillez réessayer plus tard.",
+                                headers={"Retry-After": str(max(1, round(e.retry_after)))})
+        except HTTPException:
+            # Sauvegarde refusée (tampon d'écriture plein) ou impossible : le statut est transmis au client
+            raise
         except Exception as e:
             logging.error(f"Erreur dans `generate_response` : {str(e)}")
             return ChatResponse(
@@ -231,37 +556,252 @@ class LLMService:
                 suggestions=["Réessayer", "Contacter le support"]
             )
 
-    async def save_message(self, session_id: str, user_id: str, message: Message):
+    async def stream_response(self, message: str, session_id: str, user_id: str,
+                              session: Optional[Dict] = None, response_mode: Optional[str] = None,
+                              include_items: bool = False) -> AsyncIterator[Dict]:
         """
-        Sauvegarde un message dans la session correspondante.
+        Version streamée de `generate_response` : produit des événements au fil de l'eau
+        (`tool_call`, `tool_result`, `token`, `done`, `error`) au lieu d'attendre la réponse complète.
+        Les messages sont sauvegardés une fois le flux terminé.
         """
         try:
-            # Vérifier si la session existe
-            session = await self.mongo_service.conversations_collection.find_one({"session_id": session_id})
-            if not session:
-                raise HTTPException(status_code=404, detail="Session introuvable.")
-
-            # Ajouter le message à la session
-            await self.mongo_service.conversations_collection.update_one(
-                {"session_id": session_id},
-                {
-                    "$push": {"messages": message.dict()},
-                    "$set": {"updated_at": datetime.utcnow()}
+            logging.info(f"Début de `stream_response` pour le message: {message}, session_id: {session_id}, user_id: {user_id}")
+
+            messages = await self._build_messages(message, session_id, session)
+            user_msg = messages[-1]
+            yield {"event": "start", "data": {"session_id": session_id}}
+
+            # Question déjà traitée : réponse servie sans appel au LLM
+            cache_scope, cached = await self._lookup_cached_response(message, user_id, messages)
+            if cached:
+                yield {"event": "token", "data": {"content": cached.response}}
+                await self.save_messages(session_id, user_id, [user_msg, AIMessage(content=cached.response)])
+                yield {"event": "done", "data": self._with_items(cached, include_items).dict()}
+                return
+
+            cacheable_tools, results = [], []
+
+            routed = self._route_locally(message)
+            gathered = AIMessage(content="", tool_calls=routed.tool_calls()) if routed else None
+            if not routed:
+                # Premier appel streamé : le texte est relayé directement, les appels d'outils sont accumulés
+                async for chunk in self._stream(
+                    messages, "tool_selection",
+                    tools=TOOL_DEFINITIONS,
+                    tool_choice="auto"
+                ):
+                    gathered = chunk if gathered is None else gathered + chunk
+                    if chunk.content:
+                        yield {"event": "token", "data": {"content": chunk.content}}
+
+            tool_calls = gathered.tool_calls if gathered else []
+            if tool_calls:
+                for call in tool_calls:
+                    yield {"event": "tool_call", "data": {"id": call["id"], "name": call["name"], "arguments": call["args"]}}
+
+                # Exécution parallèle, progression signalée dans l'ordre de fin des outils
+                tasks = {
+                    asyncio.ensure_future(self._execute_tool_call(call)): call
+                    for call in tool_calls
                 }
-            )
+                pending = set(tasks)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        call = tasks[task]
+                        result = task.result()
+                        yield {"event": "tool_result", "data": {
+                            "id": call["id"], "name": call["name"], "status": result.status, "count": len(result.items)
+                        }}
+                results = [task.result() for task in tasks]
+                cacheable_tools = [result.tool for result in results if result.status != "error"]
+
+                if not self._add_tool_results(messages, gathered, tool_calls, results):
+                    # Pas besoin de reformuler si aucun résultat
+                    final_message = "\n".join(result.message or "" for result in results)
+                    yield {"event": "token", "data": {"content": final_message}}
+                elif self._response_mode(message, tool_calls, response_mode) == "template":
+                    # Simple consultation : mise en forme locale, sans second appel au LLM
+                    final_message = render_tool_results(tool_calls, results)
+                    yield {"event": "token", "data": {"content": final_message}}
+                else:
+                    # Reformulation streamée token par token
+                    tokens = []
+                    async for chunk in self._stream(
+                        messages, "rephrase",
+                        tools=TOOL_DEFINITIONS,
+                        tool_choice="none"
+                    ):
+                        if chunk.content:
+                            tokens.append(chunk.content)
+                            yield {"event": "token", "data": {"content": chunk.content}}
+                    final_message = "".join(tokens)
+
+                    if not final_message.strip():
+                        logging.warning("Reformulation vide. Utilisation des résultats bruts.")
+                        final_message = render_tool_results(tool_calls, results)
+                        yield {"event": "token", "data": {"content": final_message}}
+            else:
+                final_message = gathered.content if gathered else ""
+                if not final_message:
+                    final_message = "Je n'ai pas compris votre demande. Pouvez-vous préciser ?"
+                    yield {"event": "token", "data": {"content": final_message}}
+
+            # Sauvegarde des messages une fois le flux terminé
+            assistant_msg = AIMessage(content=final_message)
+            await self.save_messages(session_id, user_id, [user_msg, assistant_msg])
+            self._schedule_summary_refresh(session_id)
+
+            chat_response = ChatResponse(response=final_message, items=results or None)
+            self._store_cached_response(message, cache_scope, chat_response, cacheable_tools)
+            yield {"event": "done", "data": self._with_items(chat_response, include_items).dict()}
+
+        except LLMOverloaded as e:
+            logging.warning(f"LLM surchargé, flux interrompu : {e}")
+            yield {"event": "error", "data": ChatResponse(
+                response="Service momentanément surchargé. Veuillez réessayer plus tard.",
+                suggestions=["Réessayer"]
+            ).dict()}
+        except Exception as e:
+            logging.error(f"Erreur dans `stream_response` : {str(e)}")
+            yield {"event": "error", "data": ChatResponse(
+                response="Une erreur critique est survenue. Veuillez réessayer plus tard.",
+                suggestions=["Réessayer", "Contacter le support"]
+            ).dict()}
+
+    async def save_message(self, session_id: str, user_id: str, message: BaseMessage):
+        """
+        Sauvegarde un message dans la session correspondante.
+        """
+        await self.save_messages(session_id, user_id, [message])
+
+    async def save_messages(self, session_id: str, user_id: str, messages: List[BaseMessage]):
+        """
+        Sauvegarde plusieurs messages (question et réponse) en une seule écriture.
+        """
+        stored_messages = [
+            Message(
+                id=f"msg_{uuid4()}",
+                role="user" if isinstance(message, HumanMessage) else "assistant",
+                content=message.content,
+                user_id=user_id,
+            ).dict()
+            for message in messages
+        ]
+        if self.message_buffer:
+            # Écriture différée : la session n'est pas vérifiée ici (une session inconnue est journalisée à l'écriture)
+            try:
+                with timed("save_messages"):
+                    await self.message_buffer.enqueue(session_id, stored_messages)
+            except MessageBufferFull as e:
+                logging.error(f"Messages de la session {session_id} refusés : {e}")
+                raise HTTPException(status_code=503, detail="Service momentanément surchargé, veuillez réessayer.",
+                                    headers={"Retry-After": str(max(1, round(Config.write_behind_max_wait_seconds)))})
+            if self.session_store:
+                self.session_store.append(session_id, stored_messages)
+            return
+        try:
+            # Ajouter les messages à la session (document de session ou bucket)
+            with timed("save_messages"):
+                found = await self.mongo_service.append_messages(session_id, stored_messages)
         except Exception as e:
-            logging.error(f"Erreur lors de la sauvegarde du message pour la session {session_id} : {e}")
+            logging.error(f"Erreur lors de la sauvegarde des messages pour la session {session_id} : {e}")
+            if self.session_store:
+                # Écriture incertaine : la session sera relue depuis MongoDB
+                self.session_store.discard(session_id)
             raise HTTPException(status_code=500, detail="Erreur lors de la sauvegarde du message.")
+        if not found:
+            if self.session_store:
+                self.session_store.discard(session_id)
+            raise HTTPException(status_code=404, detail="Session introuvable.")
+        if self.session_store:
+            self.session_store.append(session_id, stored_messages)
+
+    def _run_in_background(self, coroutine) -> None:
+        """
+        Lance une tâche de fond en gardant une référence jusqu'à sa fin (attendue par `close`).
+        """
+        task = asyncio.create_task(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def _schedule_summary_refresh(self, session_id: str) -> None:
+        """
+        Lance en tâche de fond la mise à jour du résumé de la session (si le résumé est activé).
+        """
+        if not self.summarizer:
+            return
+        self._run_in_background(self.refresh_history_summary(session_id))
+
+    async def _lookup_cached_response(self, message: str, user_id: str, messages: list) -> tuple:
+        """
+        Cherche une réponse en cache pour la question. Retourne `(portée, réponse ou None)`.
+        La portée dépend de l'historique envoyé au LLM (messages hors instructions et question).
+        """
+        if not self.response_cache:
+            return None, None
+        scope = self.response_cache.scope_for(user_id, messages[1:-1])
+        with timed("response_cache_lookup"):
+            cached = await self.response_cache.lookup(message, scope)
+        if cached:
+            logging.info(f"Réponse servie depuis le cache pour : {message}")
+        return scope, cached
+
+    def _store_cached_response(self, message: str, scope: Optional[str], response: ChatResponse, tools: List[str]) -> None:
+        """
+        Met en cache (en tâche de fond) une réponse construite à partir des outils du catalogue.
+        """
+        if self.response_cache and scope and tools:
+            self._run_in_background(self.response_cache.store(message, scope, response, tools))
+
+    async def refresh_history_summary(self, session_id: str) -> None:
+        """
+        Intègre au résumé de la session les messages pas encore résumés (delta seulement).
+        """
+        fields = await self.summarizer.refresh(session_id)
+        if fields and self.session_store:
+            self.session_store.update(session_id, **fields)
 
+    async def get_session_summary(self, session_id: str) -> SummaryResponse:
+        """
+        Résumé enregistré d'une session, sans appel au LLM (`covered_messages` indique sa fraîcheur).
+        """
+        session = await self.mongo_service.conversations_collection.find_one(
+            {"session_id": session_id}, {"_id": 0, "message_count": 1, **{field: 1 for field in SUMMARY_FIELDS}}
+        )
+        if not session:
+            raise HTTPException(status_code=404, detail="Session introuvable.")
+        if self.message_buffer:
+            session["message_count"] = session.get("message_count", 0) + len(self.message_buffer.pending(session_id))
+        return SummaryResponse(**summary_state(session))
 
+    def _city_filter(self, city: str):
+        """Valeur(s) du catalogue correspondant à la ville demandée (casse, accents, alias, fautes de frappe)."""
+        return self.resolver.city_filter(city) if self.resolver else city
 
-    async def get_flights_info(self, origin_city: str, destination_city: str, departure_date: Optional[str] = None) -> str:
+    async def _find_page(self, collection: str, query: Dict, projection: Dict, sort: List[tuple], page: int = 1) -> tuple:
+        """
+        Exécute une requête d'outil bornée : projection côté serveur, tri déterministe
+        et au plus `tool_max_results` documents. Retourne `(documents, d'autres résultats existent)`.
+        """
+        limit = Config.tool_max_results
+        page = max(int(page or 1), 1)
+        if self.catalog_engine:
+            try:
+                return self.catalog_engine.find(collection, query, projection, sort, page, limit)
+            except UnsupportedQuery as e:
+                logging.debug(f"Requête envoyée à MongoDB ({e}).")
+        cursor = self.mongo_service.db[collection].find(query, {"_id": 0, **projection})
+        documents = await cursor.sort(sort).skip((page - 1) * limit).limit(limit + 1).to_list(length=limit + 1)
+        return documents[:limit], len(documents) > limit
+
+    async def get_flights_info(self, origin_city: str, destination_city: str, departure_date: Optional[str] = None, page: int = 1) -> ToolResult:
         logging.info(f"Recherche de vols de {origin_city} à {destination_city}, date : {departure_date}")
 
         try:
             query = {
-                "ville_dorigine": origin_city,
-                "ville_de_destination": destination_city
+                "ville_dorigine": self._city_filter(origin_city),
+                "ville_de_destination": self._city_filter(destination_city)
             }
 
             if departure_date:
@@ -280,62 +820,87 @@ class LLMService:
                     }
                 except ValueError:
                     logging.error("Format de date invalide. Utilisez 'YYYY-MM'.")
-                    return "Format de date invalide. Utilisez 'YYYY-MM'."
-
-            # Utilisation correcte de to_list() pour récupérer les résultats
-            flights = await self.mongo_service.db["vols"].find(query).to_list(length=None)
+                    return ToolResult(tool="get_flights_info", status="error", message="Format de date invalide. Utilisez 'YYYY-MM'.")
+
+            # Seuls les champs affichés sont lus, par ordre de départ
+            flights, has_more = await self._find_page(
+                "vols", query,
+                {"numero_de_vol": 1, "compagnie_aerienne": 1, "date_de_depart": 1, "heure_de_depart": 1, "heure_arrivee": 1},
+                [("date_de_depart", 1), ("heure_de_depart", 1), ("numero_de_vol", 1), ("_id", 1)],
+                page
+            )
 
             if not flights:
-                return f"Aucun vol disponible entre {origin_city} et {destination_city} à la date spécifiée."
-
-            # Formater les résultats des vols
-            return "\n".join([
-                f"Vol {flight.get('numero_de_vol', 'N/A')} ({flight.get('compagnie_aerienne', 'N/A')}) | "
-                f"Départ : {flight.get('date_de_depart', 'N/A')} {flight.get('heure_de_depart', 'N/A')} | "
-                f"Arrivée : {flight.get('heure_arrivee', 'N/A')}"
-                for flight in flights
-            ])
+                return ToolResult(
+                    tool="get_flights_info", status="empty",
+                    message=f"Aucun vol disponible entre {origin_city} et {destination_city} à la date spécifiée."
+                )
+
+            return ToolResult(
+                tool="get_flights_info", status="ok", page=page, has_more=has_more,
+                items=[
+                    FlightItem(
+                        numero_de_vol=_as_text(flight.get("numero_de_vol")),
+                        compagnie_aerienne=_as_text(flight.get("compagnie_aerienne")),
+                        date_de_depart=flight.get("date_de_depart") if isinstance(flight.get("date_de_depart"), datetime) else None,
+                        heure_de_depart=_as_text(flight.get("heure_de_depart")),
+                        heure_arrivee=_as_text(flight.get("heure_arrivee")),
+                    )
+                    for flight in flights
+                ]
+            )
 
         except Exception as e:
             logging.error(f"Erreur lors du chargement des vols : {str(e)}")
-            return "Service des vols temporairement indisponible."
+            return ToolResult(tool="get_flights_info", status="error", message="Service des vols temporairement indisponible.")
 
 
 
-    async def get_hotels_info(self, city: str, stars: Optional[int] = None) -> str:
+    async def get_hotels_info(self, city: str, stars: Optional[int] = None, page: int = 1) -> ToolResult:
         logging.info(f"Recherche d'hôtels pour la ville : {city}, étoiles : {stars}")
 
         try:
-            query = {"ville": city}
+            query = {"ville": self._city_filter(city)}
 
             if stars:
                 query["etoiles"] = stars
 
-            # Utilisation correcte de to_list()
-            hotels = await self.mongo_service.db["hotels"].find(query).to_list(length=None)
+            # Seuls les champs affichés sont lus, les mieux classés d'abord
+            hotels, has_more = await self._find_page(
+                "hotels", query,
+                {"nom_de_lhôtel": 1, "etoiles": 1, "adresse": 1, "date_de_disponibilite": 1},
+                [("etoiles", -1), ("nom_de_lhôtel", 1), ("_id", 1)],
+                page
+            )
 
             if not hotels:
-                return f"Aucun hôtel trouvé à {city}."
-
-            return "\n\n".join([
-                f"{hotel.get('nom_de_lhôtel', 'N/A')} ({hotel.get('etoiles', 'N/A')} étoiles)\n"
-                f"Adresse : {hotel.get('adresse', 'N/A')}\n"
-                f"Date de disponibilité : {hotel.get('date_de_disponibilite', 'N/A')}"
-                for hotel in hotels
-            ])
+                return ToolResult(tool="get_hotels_info", status="empty", message=f"Aucun hôtel trouvé à {city}.")
+
+            return ToolResult(
+                tool="get_hotels_info", status="ok", page=page, has_more=has_more,
+                items=[
+                    HotelItem(
+                        nom=_as_text(hotel.get("nom_de_lhôtel")),
+                        etoiles=_as_number(hotel.get("etoiles")),
+                        adresse=_as_text(hotel.get("adresse")),
+                        date_de_disponibilite=_as_text(hotel.get("date_de_disponibilite")),
+                    )
+                    for hotel in hotels
+                ]
+            )
 
         except Exception as e:
             logging.error(f"Erreur lors du chargement des hôtels : {str(e)}")
-            return "Service hôtelier temporairement indisponible."
+            return ToolResult(tool="get_hotels_info", status="error", message="Service hôtelier temporairement indisponible.")
 
-    async def get_restaurants_info(self, city: str, cuisine: Optional[str] = None, budget: Optional[str] = None, rating: Optional[float] = None) -> str:
+    async def get_restaurants_info(self, city: str, cuisine: Optional[str] = None, budget: Optional[str] = None, rating: Optional[float] = None, page: int = 1) -> ToolResult:
         logging.info(f"Recherche de restaurants pour la ville : {city}, cuisine : {cuisine}, budget : {budget}, note minimale : {rating}")
 
         try:
-            query = {"ville": city}
+            query = {"ville": self._city_filter(city)}
 
             if cuisine:
-                query["cuisine"] = {"$regex": cuisine, "$options": "i"}  
+                query["cuisine"] = self.resolver.cuisine_filter(cuisine) if self.resolver else {"$regex": cuisine, "$options": "i"}
             if budget:
                 query["budget"] = budget
             if rating:
@@ -343,40 +908,46 @@ class LLMService:
 
             logging.debug(f"Requête MongoDB : {query}")
 
-            # Utilisation correcte de to_list()
-            restaurants = await self.mongo_service.db["restaurants"].find(query).to_list(length=None)
+            # Seuls les champs affichés sont lus, les mieux notés d'abord
+            restaurants, has_more = await self._find_page(
+                "restaurants", query,
+                {"nom_du_restaurant": 1, "cuisine": 1, "budget": 1, "evaluation": 1, "adresse": 1},
+                [("evaluation", -1), ("nom_du_restaurant", 1), ("_id", 1)],
+                page
+            )
 
             logging.debug(f"Résultats MongoDB : {restaurants}")
 
             if not restaurants:
-                return f"Aucun restaurant trouvé à {city}."
-
-            # Construire une liste formatée avec des sauts de ligne bien placés
-            result = []
-            for restaurant in restaurants:
-                    result.append(
-                        f"Nom: {restaurant.get('nom_du_restaurant', 'N/A')}, "
-                        f"Cuisine: {restaurant.get('cuisine', 'N/A')}, "
-                        f"Budget: {restaurant.get('budget', 'N/A')}, "
-                        f"Note: {restaurant.get('evaluation', 'N/A')}, "
-                        f"Adresse: {restaurant.get('adresse', 'N/A')}"
+                return ToolResult(tool="get_restaurants_info", status="empty", message=f"Aucun restaurant trouvé à {city}.")
+
+            return ToolResult(
+                tool="get_restaurants_info", status="ok", page=page, has_more=has_more,
+                items=[
+                    RestaurantItem(
+                        nom=_as_text(restaurant.get("nom_du_restaurant")),
+                        cuisine=_as_text(restaurant.get("cuisine")),
+                        budget=_as_text(restaurant.get("budget")),
+                        evaluation=_as_number(restaurant.get("evaluation")),
+                        adresse=_as_text(restaurant.get("adresse")),
                     )
-
-            return "; ".join(result)  # Les résultats sont séparés par "; " pour être plus lisibles.
+                    for restaurant in restaurants
+                ]
+            )
 
 
         except Exception as e:
             logging.error(f"Erreur lors du chargement des restaurants : {str(e)}")
-            return "Service des restaurants temporairement indisponible."
+            return ToolResult(tool="get_restaurants_info", status="error", message="Service des restaurants temporairement indisponible.")
 
 
 
 
-    async def get_weather_info(self, city: str, date: Optional[str] = None) -> str:
+    async def get_weather_info(self, city: str, date: Optional[str] = None, page: int = 1) -> ToolResult:
         logging.info(f"Recherche de la météo pour la ville : {city}, date : {date}")
 
         try:
-            query = {"ville": city}
+            query = {"ville": self._city_filter(city)}
 
             if date:
                 try:
@@ -385,20 +956,45 @@ class LLMService:
                     query["date"] = date_obj
                 except ValueError:
                     logging.error(f"Format de date invalide : {date}")
-                    return "Format de date invalide. Utilisez le format YYYY-MM-DD."
-
-            # Utilisation correcte de to_list()
-            weather = await self.mongo_service.db["climat"].find(query).to_list(length=None)
+                    return ToolResult(tool="get_weather_info", status="error", message="Format de date invalide. Utilisez le format YYYY-MM-DD.")
+
+            # Seuls les champs affichés sont lus, par ordre chronologique
+            weather, has_more = await self._find_page(
+                "climat", query,
+                {"date": 1, "condition": 1, "temperature_(°c)": 1},
+                [("date", 1), ("_id", 1)],
+                page
+            )
 
             if not weather:
-                return f"Aucune information météo trouvée pour {city} à la date spécifiée."
-
-            return "\n".join([
-                f"{entry.get('date', 'N/A')}: {entry.get('condition', 'N/A')}, "
-                f"Température : {entry.get('temperature_(°c)', 'N/A')} °C"
-                for entry in weather
-            ])
+                return ToolResult(
+                    tool="get_weather_info", status="empty",
+                    message=f"Aucune information météo trouvée pour {city} à la date spécifiée."
+                )
+
+            return ToolResult(
+                tool="get_weather_info", status="ok", page=page, has_more=has_more,
+                items=[
+                    WeatherItem(
+                        date=entry.get("date") if isinstance(entry.get("date"), datetime) else None,
+                        condition=_as_text(entry.get("condition")),
+                        temperature=_as_number(entry.get("temperature_(°c)")),
+                    )
+                    for entry in weather
+                ]
+            )
 
         except Exception as e:
             logging.error(f"Erreur lors de la recherche météo : {str(e)}")
-            return "Service météo temporairement indisponible."
\ No newline at end of file
+            return ToolResult(tool="get_weather_info", status="error", message="Service météo temporairement indisponible.")
+
+
+def _as_text(value) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def _as_number(value) -> Optional[float]:
+    try:
+        return None if value is None else float(value)
+    except (TypeError, ValueError):
+        return None
@@ -1,10 +1,14 @@
 # services/memory.py
 """
-Gestion de la mémoire des conversations
+Gestion de la mémoire des conversations : historique LangChain en mémoire et sessions actives
+gardées en mémoire devant MongoDB.
 """
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.messages import BaseMessage
-from typing import List
 
 class InMemoryHistory(BaseChatMessageHistory):
     """
@@ -20,4 +24,148 @@ class InMemoryHistory(BaseChatMessageHistory):
     
     def clear(self) -> None:
         """Réinitialise l'historique de la conversation"""
-        self.messages = []
\ No newline at end of file
+        self.messages = []
+
+class SessionStore:
+    """
+    Sessions actives gardées en mémoire (par worker) : fenêtre d'historique, compteurs et résumé,
+    tels que retournés par `MongoService.get_session_window`.
+
+    - Lecture : la session active d'un utilisateur et son historique sont servis sans MongoDB.
+    - Écriture : MongoDB reste la référence (write-through) ; la copie en mémoire n'est mise à jour
+      qu'après une écriture réussie, et retirée en cas d'échec.
+    - Éviction : LRU au-delà de `max_sessions` ou de `max_bytes`, et sessions inactives depuis
+      plus de `idle_ttl` secondes. Le TTL borne aussi le décalage possible avec une écriture faite
+      par un autre worker : l'affinité de session (sticky routing) est recommandée.
+    """
+
+    def __init__(self, max_sessions: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 idle_ttl: float = 900, window: Optional[int] = None):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.window = window  # Messages conservés par session (None : tout l'historique)
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        self._active: Dict[str, str] = {}  # user_id -> session_id
+        self._sizes: Dict[str, int] = {}
+        self._last_access: Dict[str, float] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _estimate_size(session: Dict) -> int:
+        return 512 + sum(len(str(msg.get("content", ""))) * 2 + 256 for msg in session.get("messages", []))
+
+    @staticmethod
+    def _copy(session: Dict) -> Dict:
+        """Copie remise à l'appelant : la liste de messages stockée n'est jamais partagée."""
+        return {**session, "messages": list(session.get("messages", []))}
+
+    def _touch(self, session_id: str) -> None:
+        self._sessions.move_to_end(session_id)
+        self._last_access[session_id] = time.monotonic()
+
+    def _resize(self, session_id: str) -> None:
+        size = self._estimate_size(self._sessions[session_id])
+        self.total_bytes += size - self._sizes.get(session_id, 0)
+        self._sizes[session_id] = size
+
+    def _remove(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return
+        self.total_bytes -= self._sizes.pop(session_id, 0)
+        self._last_access.pop(session_id, None)
+        if self._active.get(session.get("user_id")) == session_id:
+            del self._active[session["user_id"]]
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        # Les sessions les moins récemment utilisées sont en tête : les expirées aussi
+        while self._sessions:
+            oldest = next(iter(self._sessions))
+            expired = now - self._last_access[oldest] > self.idle_ttl
+            if not expired and len(self._sessions) <= self.max_sessions and self.total_bytes <= self.max_bytes:
+                break
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _trim(self, session: Dict) -> None:
+        if self.window is not None and len(session["messages"]) > self.window:
+            session["messages"] = session["messages"][-self.window:]
+
+    def _lookup(self, session_id: Optional[str]) -> Optional[Dict]:
+        if session_id is None or session_id not in self._sessions:
+            self.misses += 1
+            return None
+        if time.monotonic() - self._last_access[session_id] > self.idle_ttl:
+            self._remove(session_id)
+            self.evictions += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch(session_id)
+        return self._copy(self._sessions[session_id])
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        return self._lookup(session_id)
+
+    def get_active(self, user_id: str) -> Optional[Dict]:
+        """Session active de l'utilisateur, si elle est en mémoire."""
+        return self._lookup(self._active.get(user_id))
+
+    def put(self, user_id: str, session: Dict, active: bool = True) -> None:
+        """Enregistre une session lue dans MongoDB (ou tout juste créée)."""
+        session_id = session["session_id"]
+        if active and self._active.get(user_id) not in (None, session_id):
+            # Une seule session active par utilisateur
+            self._remove(self._active[user_id])
+        self._remove(session_id)
+        stored = {**self._copy(session), "user_id": user_id}
+        self._trim(stored)
+        self._sessions[session_id] = stored
+        if active:
+            self._active[user_id] = session_id
+        self._touch(session_id)
+        self._resize(session_id)
+        self._evict()
+
+    def append(self, session_id: str, messages: List[Dict]) -> None:
+        """Reporte des messages déjà enregistrés dans MongoDB."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return
+        session["messages"] = session["messages"] + list(messages)
+        session["message_count"] = session.get("message_count", 0) + len(messages)
+        self._trim(session)
+        self._touch(session_id)
+        self._resize(session_id)
+        self._evict()
+
+    def update(self, session_id: str, **fields) -> None:
+        """Reporte des champs déjà modifiés dans MongoDB (résumé glissant...)."""
+        if session_id in self._sessions:
+            self._sessions[session_id].update(fields)
+
+    def discard(self, session_id: str) -> None:
+        """Retire une session dont la copie en mémoire n'est plus fiable."""
+        self._remove(session_id)
+
+    def deactivate_user(self, user_id: str) -> None:
+        """Retire la session active d'un utilisateur (nouvelle session créée)."""
+        session_id = self._active.get(user_id)
+        if session_id:
+            self._remove(session_id)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
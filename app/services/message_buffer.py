@@ -0,0 +1,375 @@
+# services/message_buffer.py
+"""
+Écriture différée (write-behind) des messages des conversations.
+
+Les messages sont placés dans un tampon en mémoire et la réponse est renvoyée sans attendre
+MongoDB ; une tâche de fond les écrit par lots (`bulk_write` non ordonné, une opération par
+session) dès que `max_batch` messages sont en attente ou toutes les `flush_interval` secondes.
+
+Durabilité :
+- fichier de débordement optionnel (`spill_path`) : chaque message y est ajouté (dans un thread)
+  avant d'être accepté, et les segments non écrits sont rejoués au démarrage suivant (perte limitée
+  au cache du système en cas d'arrêt brutal de la machine, aucune en cas d'arrêt du processus) ;
+- write concern configurable pour les écritures par lots ;
+- contre-pression : au-delà de `max_pending` messages non écrits, l'appelant attend au plus
+  `max_wait` secondes puis reçoit `MessageBufferFull` ;
+- vidage complet du tampon à l'arrêt de l'application.
+
+Le rejeu est idempotent pour le stockage `embedded` : le lot d'une session n'est ajouté d'un bloc
+que si aucun de ses messages (identifiants uniques) n'est déjà présent ; sinon seuls les messages
+absents sont ajoutés. En mode `bucket` (ajouts non idempotents), seules les sessions dont
+l'écriture a échoué sont réessayées.
+"""
+import asyncio
+import glob
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from bson import json_util
+from pymongo import UpdateOne
+from pymongo.write_concern import WriteConcern
+
+from core.config import Config
+from core.metrics import MESSAGE_FLUSH_FAILURES
+from services.mongo_service import MongoService
+
+
+class MessageBufferFull(Exception):
+    """Trop de messages en attente d'écriture (MongoDB lent ou indisponible)."""
+
+
+def parse_write_concern(w: str, journal: bool = False) -> WriteConcern:
+    """"1", "majority"... -> WriteConcern."""
+    return WriteConcern(w=int(w) if w.isdigit() else w, j=journal or None)
+
+
+class MessageBuffer:
+    """
+    Tampon des messages en attente d'écriture, par session (l'ordre des messages est conservé).
+    Les messages en attente ou en cours d'écriture restent lisibles via `pending` (lecture de ses propres écritures).
+    """
+
+    def __init__(self, mongo_service: MongoService, max_batch: int = 200, flush_interval: float = 0.5,
+                 max_pending: int = 5000, max_wait: float = 5.0, spill_path: Optional[str] = None,
+                 write_concern: Optional[WriteConcern] = None):
+        self.mongo_service = mongo_service
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_wait = max_wait
+        self.spill_path = spill_path
+        self.collection = mongo_service.conversations_collection
+        if write_concern is not None:
+            self.collection = self.collection.with_options(write_concern=write_concern)
+
+        self._pending: Dict[str, List[Dict]] = {}
+        self._inflight: Dict[str, List[Dict]] = {}
+        self._pending_count = 0
+        self._segments: List[str] = []  # Segments du fichier de débordement couvrant les messages non écrits
+        self._spill_file = None
+        self._segment_seq = 0
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._spill_lock = asyncio.Lock()  # Même ordre dans le fichier de débordement et dans le tampon
+        self._space = asyncio.Condition()  # Signalée après chaque écriture (contre-pression)
+        self._task: Optional[asyncio.Task] = None
+
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.last_flush_seconds = 0.0
+
+    # ---- Cycle de vie ----
+
+    async def start(self) -> None:
+        """Rejoue les segments non écrits d'une exécution précédente puis lance la tâche d'écriture."""
+        if self.spill_path:
+            await asyncio.to_thread(self._recover)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Arrête la tâche de fond (sans interrompre une écriture en cours) et écrit tout ce qui reste."""
+        if self._task:
+            async with self._flush_lock:
+                self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self._pending_count:
+            logging.error(f"{self._pending_count} messages non écrits à l'arrêt (conservés dans le fichier de débordement).")
+        await asyncio.to_thread(self._close_segment)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    # ---- Fichier de débordement (exécuté dans un thread) ----
+
+    def _segment_path(self, seq: int) -> str:
+        # Les noms se trient dans l'ordre d'écriture (horodatage, puis numéro) : c'est l'ordre de rejeu
+        return f"{self.spill_path}.{int(time.time() * 1000):013d}.{os.getpid()}.{seq:06d}"
+
+    def _spill(self, session_id: str, messages: List[Dict]) -> None:
+        if self._spill_file is None:
+            self._segment_seq += 1
+            path = self._segment_path(self._segment_seq)
+            self._spill_file = open(path, "a", encoding="utf-8")
+            self._segments.append(path)
+        self._spill_file.write(json_util.dumps({"session_id": session_id, "messages": messages}) + "\n")
+        self._spill_file.flush()
+
+    def _close_segment(self) -> None:
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    @staticmethod
+    def _write_segment(path: str, batch: Dict[str, List[Dict]]) -> str:
+        with open(path, "w", encoding="utf-8") as f:
+            for session_id, messages in batch.items():
+                f.write(json_util.dumps({"session_id": session_id, "messages": messages}) + "\n")
+        return path
+
+    @staticmethod
+    def _remove_segments(paths: List[str]) -> None:
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _recover(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.spill_path))
+        os.makedirs(directory, exist_ok=True)
+        segments = sorted(glob.glob(f"{self.spill_path}.*"))
+        recovered = 0
+        for path in segments:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json_util.loads(line)
+                    except ValueError:
+                        logging.warning(f"Ligne illisible ignorée dans {path} (écriture interrompue).")
+                        continue
+                    self._pending.setdefault(entry["session_id"], []).extend(entry["messages"])
+                    recovered += len(entry["messages"])
+            self._segments.append(path)
+        self._pending_count += recovered
+        if recovered:
+            logging.info(f"{recovered} messages non écrits rejoués depuis {len(segments)} segment(s).")
+
+    # ---- Tampon ----
+
+    def _backlog(self) -> int:
+        return self._pending_count + sum(len(messages) for messages in self._inflight.values())
+
+    async def enqueue(self, session_id: str, messages: List[Dict]) -> None:
+        """
+        Accepte des messages pour écriture différée. Si trop de messages ne sont pas encore écrits
+        (MongoDB lent ou indisponible), l'appelant attend une écriture au plus `max_wait` secondes,
+        puis `MessageBufferFull` est levée.
+        """
+        if self._backlog() >= self.max_pending:
+            self._wake.set()
+            try:
+                async with self._space:
+                    await asyncio.wait_for(
+                        self._space.wait_for(lambda: self._backlog() < self.max_pending), timeout=self.max_wait
+                    )
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise MessageBufferFull(f"{self._backlog()} messages en attente d'écriture.") from None
+
+        async with self._spill_lock:
+            if self.spill_path:
+                await asyncio.to_thread(self._spill, session_id, messages)
+            self._pending.setdefault(session_id, []).extend(messages)
+            self._pending_count += len(messages)
+        if self._pending_count >= self.max_batch:
+            self._wake.set()
+
+    def snapshot(self) -> tuple:
+        """
+        Messages non confirmés au moment de l'appel (références, coût constant). À prendre avant une
+        lecture dans MongoDB : une écriture terminée pendant la lecture retire ses messages du tampon.
+        """
+        return self._inflight, self._pending
+
+    def pending(self, session_id: str, snapshot: tuple = ()) -> List[Dict]:
+        """Messages de la session non confirmés par MongoDB (maintenant ou dans `snapshot`), dans l'ordre d'envoi."""
+        seen, messages = set(), []
+        for source in (*snapshot, self._inflight, self._pending):
+            for msg in source.get(session_id, []):
+                if msg.get("id") not in seen:
+                    seen.add(msg.get("id"))
+                    messages.append(msg)
+        return messages
+
+    def merge_pending(self, session: Optional[Dict], last: Optional[int] = None, snapshot: tuple = ()) -> Optional[Dict]:
+        """
+        Complète une session lue dans MongoDB avec ses messages en attente (absents de la lecture),
+        en gardant les `last` derniers messages.
+        """
+        if not session:
+            return session
+        pending = self.pending(session["session_id"], snapshot)
+        if not pending:
+            return session
+        known = {msg.get("id") for msg in session.get("messages", [])}
+        missing = [msg for msg in pending if msg.get("id") not in known]
+        messages = session.get("messages", []) + missing
+        return {
+            **session,
+            "messages": messages[-last:] if last is not None else messages,
+            "message_count": session.get("message_count", 0) + len(missing),
+        }
+
+    # ---- Écriture ----
+
+    def _requeue(self, batch: Dict[str, List[Dict]], segments: List[str]) -> None:
+        """Remet des messages en tête du tampon (avant ceux arrivés entre-temps) pour la prochaine tentative."""
+        for session_id, messages in self._pending.items():
+            batch.setdefault(session_id, []).extend(messages)
+        self._pending = batch
+        self._pending_count = sum(len(messages) for messages in batch.values())
+        self._segments = segments + self._segments
+
+    async def flush(self) -> None:
+        """Écrit tous les messages en attente (un seul vidage à la fois)."""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            async with self._spill_lock:
+                batch, self._pending, self._pending_count = self._pending, {}, 0
+                segments, self._segments = self._segments, []
+                await asyncio.to_thread(self._close_segment)
+            self._inflight = batch
+            started = time.perf_counter()
+            try:
+                failed = await self._write(batch)
+                retry_segments = []
+                if failed and segments:
+                    # Segment limité aux sessions en échec : le rejeu ne réécrit pas les sessions déjà enregistrées
+                    try:
+                        retry_segments = [await asyncio.to_thread(self._write_segment, f"{segments[0]}.r", failed)]
+                    except OSError as e:
+                        logging.error(f"Réécriture du fichier de débordement impossible : {e}")
+                        retry_segments = segments
+            except BaseException as e:
+                self._inflight = {}
+                self._requeue(batch, segments)
+                self.failures += 1
+                MESSAGE_FLUSH_FAILURES.inc()
+                if not isinstance(e, asyncio.CancelledError):
+                    logging.error(f"Écriture différée des messages impossible ({self._pending_count} en attente) : {e}")
+                    return
+                raise
+
+            if failed:
+                self._requeue(failed, retry_segments)
+                self.failures += 1
+                MESSAGE_FLUSH_FAILURES.inc()
+            self._inflight = {}
+            await asyncio.to_thread(self._remove_segments, [path for path in segments if path not in retry_segments])
+            self.flushes += 1
+            self.flushed += sum(len(messages) for session_id, messages in batch.items() if session_id not in failed)
+            self.last_flush_seconds = time.perf_counter() - started
+            async with self._space:
+                self._space.notify_all()
+
+    async def _write(self, batch: Dict[str, List[Dict]]) -> Dict[str, List[Dict]]:
+        """Écrit un lot. Retourne les messages des sessions dont l'ajout a échoué (à réessayer seules)."""
+        if Config.conversation_storage == "bucket":
+            # Les buckets dépendent du compteur de la session : écriture session par session
+            return await self._append_each(batch, list(batch))
+
+        operations = self._push_operations(batch)
+        result = await self.collection.bulk_write(operations, ordered=False)
+        if result.matched_count < len(operations):
+            # Sessions stockées en buckets, messages déjà écrits (rejeu) ou sessions supprimées
+            return await self._write_unmatched(batch)
+        return {}
+
+    @staticmethod
+    def _push_operations(batch: Dict[str, List[Dict]]) -> List[UpdateOne]:
+        now = datetime.utcnow()
+        return [
+            UpdateOne(
+                # Idempotent : rien n'est ajouté si l'un des messages du lot est déjà enregistré
+                {"session_id": session_id, "storage": {"$ne": "bucket"},
+                 "messages.id": {"$nin": [msg.get("id") for msg in messages]}},
+                {"$push": {"messages": {"$each": messages}}, "$inc": {"message_count": len(messages)},
+                 "$set": {"updated_at": now}},
+            )
+            for session_id, messages in batch.items()
+        ]
+
+    async def _write_unmatched(self, batch: Dict[str, List[Dict]]) -> Dict[str, List[Dict]]:
+        """
+        Termine un lot dont des opérations n'ont rien modifié : sessions en buckets, sessions supprimées,
+        ou lot en partie déjà écrit (écriture appliquée puis signalée en échec, lot remis en file avec des
+        messages plus récents, segments rejoués). Seuls les messages absents de MongoDB sont ajoutés.
+        """
+        sessions = await self.mongo_service.conversations_collection.find(
+            {"session_id": {"$in": list(batch)}}, {"_id": 0, "session_id": 1, "storage": 1, "messages.id": 1}
+        ).to_list(length=None)
+        found, missing = {}, {}
+        for session in sessions:
+            session_id = session["session_id"]
+            found[session_id] = session.get("storage")
+            if found[session_id] == "bucket":
+                continue
+            stored = {msg.get("id") for msg in session.get("messages", [])}
+            remaining = [msg for msg in batch[session_id] if msg.get("id") not in stored]
+            if len(remaining) < len(batch[session_id]):
+                logging.info(f"Session {session_id} : {len(batch[session_id]) - len(remaining)} messages déjà enregistrés ignorés.")
+            if remaining:
+                missing[session_id] = remaining
+        for session_id in batch:
+            if session_id not in found:
+                logging.error(f"Session {session_id} introuvable : {len(batch[session_id])} messages ignorés.")
+
+        failed = await self._append_each(batch, [session_id for session_id, storage in found.items() if storage == "bucket"])
+        if missing:
+            result = await self.collection.bulk_write(self._push_operations(missing), ordered=False)
+            if result.matched_count < len(missing):
+                # Écriture concurrente (autre worker) : nouvelle tentative, idempotente, au prochain vidage
+                failed.update(missing)
+        return failed
+
+    async def _append_each(self, batch: Dict[str, List[Dict]], session_ids: List[str]) -> Dict[str, List[Dict]]:
+        # Ajouts non idempotents : une session déjà écrite n'est pas réessayée avec celles en échec
+        results = await asyncio.gather(
+            *(self.mongo_service.append_messages(session_id, batch[session_id]) for session_id in session_ids),
+            return_exceptions=True
+        )
+        failed = {}
+        for session_id, result in zip(session_ids, results):
+            if isinstance(result, BaseException):
+                logging.error(f"Écriture des messages de la session {session_id} impossible : {result}")
+                failed[session_id] = batch[session_id]
+            elif not result:
+                logging.error(f"Session {session_id} introuvable : {len(batch[session_id])} messages ignorés.")
+        return failed
+
+    def stats(self) -> Dict:
+        return {
+            "pending": self._pending_count,
+            "inflight": sum(len(messages) for messages in self._inflight.values()),
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "last_flush_seconds": round(self.last_flush_seconds, 4),
+        }
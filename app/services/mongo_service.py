@@ -1,24 +1,78 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DESCENDING, ReturnDocument
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+import base64
+import json
 from models.models import User, Message, Conversation
+from core.config import Config
 import logging
 import os
 
 # Configurer le logging
 logging.basicConfig(level=logging.INFO)
 
+# Métadonnées renvoyées par la liste des sessions (sans les messages)
+SESSION_LIST_PROJECTION = {"session_id": 1, "created_at": 1, "updated_at": 1, "is_active": 1, "message_count": 1}
+
+
+def encode_session_cursor(session: Dict) -> str:
+    """Curseur opaque de pagination des sessions : position (`updated_at`, `_id`) de la dernière session renvoyée."""
+    key = {"u": session["updated_at"].isoformat(), "i": str(session["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_session_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Lève ValueError si le curseur est invalide."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(key["u"]), ObjectId(key["i"])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise ValueError(f"Curseur invalide : {cursor}") from e
+
+
+def create_mongo_client() -> AsyncIOMotorClient:
+    """
+    Crée le client MongoDB partagé par l'application, avec les réglages de pool de `Config`.
+    """
+    options = {
+        "maxPoolSize": Config.mongo_max_pool_size,
+        "minPoolSize": Config.mongo_min_pool_size,
+        "maxIdleTimeMS": Config.mongo_max_idle_time_ms,
+        "connectTimeoutMS": Config.mongo_connect_timeout_ms,
+        "serverSelectionTimeoutMS": Config.mongo_server_selection_timeout_ms,
+        "socketTimeoutMS": Config.mongo_socket_timeout_ms,
+    }
+    if Config.mongo_compressors:
+        options["compressors"] = Config.mongo_compressors
+    return AsyncIOMotorClient(os.getenv("MONGODB_URI"), **options)
+
+
 class MongoService:
     """
     Service pour interagir avec MongoDB (utilisateurs et conversations).
     """
 
-    def __init__(self):
-        # Initialisation de la connexion MongoDB
-        self.client = AsyncIOMotorClient(os.getenv("MONGODB_URI"))
+    def __init__(self, client: Optional[AsyncIOMotorClient] = None):
+        # Initialisation de la connexion MongoDB (client partagé si fourni)
+        self.client = client or create_mongo_client()
         self.db = self.client[os.getenv("DATABASE_NAME")]
         self.users_collection = self.db["users"]
         self.conversations_collection = self.db["conversations"]
+        # Messages des sessions stockées en mode "bucket" (blocs de taille fixe)
+        self.buckets_collection = self.db["conversation_buckets"]
+        self.bucket_size = Config.bucket_size
+        # Tâches du mode asynchrone (/chat/ask?mode=async)
+        self.jobs_collection = self.db["jobs"]
+
+    def close(self) -> None:
+        """
+        Ferme le pool de connexions MongoDB.
+        """
+        self.client.close()
+        logging.info("Connexion MongoDB fermée.")
 
     # ---- Méthodes pour les utilisateurs ----
 
@@ -126,18 +180,175 @@ class MongoService:
             return Conversation(**conversation_data)
         return None
 
-    async def summarize_conversation(self, conversation_id: str) -> str:
+    async def summarize_conversation(self, session_id: str) -> str:
         """
-        Résume une conversation spécifique.
+        Retourne le résumé enregistré d'une session, tenu à jour en tâche de fond
+        (services/summarizer.py), sans relire ses messages.
         """
-        conversation = await self.get_conversation_history(conversation_id)
-        if not conversation:
+        session = await self.conversations_collection.find_one({"session_id": session_id}, {"_id": 0, "history_summary": 1})
+        if not session:
             return "Aucune conversation trouvée."
+        return session.get("history_summary") or "Aucun résumé disponible pour le moment."
+
+    async def list_sessions(self, user_id: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Sessions d'un utilisateur, des plus récemment mises à jour aux plus anciennes, sans leurs messages.
+        Pagination par clé (`updated_at`, `_id`) : coût indépendant du nombre de sessions précédentes.
+        Retourne `(sessions, curseur de la page suivante ou None)`.
+        """
+        query: Dict = {"user_id": user_id}
+        if cursor:
+            updated_at, last_id = decode_session_cursor(cursor)
+            query["$or"] = [
+                {"updated_at": {"$lt": updated_at}},
+                {"updated_at": updated_at, "_id": {"$lt": last_id}},
+            ]
+        # Une session de plus que demandé indique s'il reste une page
+        sessions = await self.conversations_collection.find(query, SESSION_LIST_PROJECTION) \
+            .sort([("updated_at", DESCENDING), ("_id", DESCENDING)]) \
+            .limit(limit + 1) \
+            .to_list(length=limit + 1)
+        next_cursor = encode_session_cursor(sessions[limit - 1]) if len(sessions) > limit else None
+        return sessions[:limit], next_cursor
+
+    async def find_session_meta(self, user_id: str, session_id: Optional[str] = None) -> Optional[Dict]:
+        """
+        Métadonnées d'une session de l'utilisateur (sans ses messages) ; à défaut de `session_id`,
+        la plus récemment mise à jour.
+        """
+        projection = {"_id": 0, "session_id": 1, "storage": 1, "message_count": 1}
+        if session_id:
+            return await self.conversations_collection.find_one({"user_id": user_id, "session_id": session_id}, projection)
+        return await self.conversations_collection.find_one(
+            {"user_id": user_id}, projection, sort=[("updated_at", DESCENDING), ("_id", DESCENDING)]
+        )
+
+    # ---- Stockage des messages (mode "embedded" ou "bucket") ----
+
+    def new_session_document(self, session_id: str, user_id: str) -> Dict:
+        """
+        Construit le document d'une nouvelle session selon le mode de stockage configuré.
+        En mode "bucket", la session ne contient que des métadonnées et des compteurs.
+        """
+        session = {
+            "session_id": session_id,
+            "user_id": user_id,
+            "storage": Config.conversation_storage,
+            "message_count": 0,
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+            "is_active": True,
+        }
+        if Config.conversation_storage == "embedded":
+            session["messages"] = []
+        return session
+
+    async def append_messages(self, session_id: str, messages: List[Dict]) -> bool:
+        """
+        Ajoute des messages à une session en une seule écriture (`$push` + `$each`).
+        Retourne False si la session n'existe pas (`matched_count`), sans lecture préalable.
+        Le mode configuré est essayé en premier pour éviter un aller-retour inutile.
+        """
+        if Config.conversation_storage == "bucket":
+            return await self._append_to_buckets(session_id, messages) or await self._append_embedded(session_id, messages)
+        return await self._append_embedded(session_id, messages) or await self._append_to_buckets(session_id, messages)
+
+    async def _append_embedded(self, session_id: str, messages: List[Dict]) -> bool:
+        # Stockage historique : messages intégrés au document de session
+        result = await self.conversations_collection.update_one(
+            {"session_id": session_id, "storage": {"$ne": "bucket"}},
+            {
+                "$push": {"messages": {"$each": messages}},
+                "$inc": {"message_count": len(messages)},
+                "$set": {"updated_at": datetime.utcnow()},
+            },
+        )
+        return result.matched_count > 0
+
+    async def _append_to_buckets(self, session_id: str, messages: List[Dict]) -> bool:
+        # Le compteur de la session détermine les buckets cibles (position // taille)
+        session = await self.conversations_collection.find_one_and_update(
+            {"session_id": session_id, "storage": "bucket"},
+            {"$inc": {"message_count": len(messages)}, "$set": {"updated_at": datetime.utcnow()}},
+            projection={"_id": 0, "message_count": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not session:
+            return False
+
+        # Regrouper les messages par bucket (un seul en général, deux en fin de bucket).
+        # Chaque message garde sa position réservée (`pos`) : deux ajouts concurrents restent
+        # ordonnés dans le bucket, et une position perdue (échec après `$inc`) ne décale pas la lecture.
+        first_position = session["message_count"] - len(messages)
+        by_bucket: Dict[int, List[Dict]] = {}
+        for position, message in enumerate(messages, start=first_position):
+            by_bucket.setdefault(position // self.bucket_size, []).append({**message, "pos": position})
+
+        for seq, bucket_messages in by_bucket.items():
+            await self.buckets_collection.update_one(
+                {"session_id": session_id, "seq": seq},
+                {
+                    "$push": {"messages": {"$each": bucket_messages, "$sort": {"pos": 1}}},
+                    "$inc": {"count": len(bucket_messages)},
+                    "$setOnInsert": {"created_at": datetime.utcnow()},
+                },
+                upsert=True,
+            )
+        return True
 
-        # Créer un résumé simple
-        summary = f"Résumé de la conversation {conversation.id} :\n"
-        for msg in conversation.messages:
-            summary += f"{msg['role']}: {msg['content']}\n"
+    async def _read_buckets(self, session_id: str, start: int, end: int) -> List[Dict]:
+        """
+        Lit les messages d'indices [start, end) dans les buckets d'une session.
+        """
+        if end <= start:
+            return []
+        first_seq, last_seq = start // self.bucket_size, (end - 1) // self.bucket_size
+        buckets = await self.buckets_collection.find(
+            {"session_id": session_id, "seq": {"$gte": first_seq, "$lte": last_seq}},
+            {"_id": 0, "seq": 1, "messages": 1},
+        ).sort("seq", 1).to_list(length=None)
+
+        # Sélection par position et non par décalage : une position réservée mais jamais écrite laisse un trou
+        positioned = []
+        for bucket in buckets:
+            for index, message in enumerate(bucket.get("messages", [])):
+                # Buckets issus de la migration : position implicite (messages contigus)
+                position = message.pop("pos", bucket["seq"] * self.bucket_size + index)
+                if start <= position < end:
+                    positioned.append((position, message))
+        positioned.sort(key=lambda item: item[0])
+        return [message for _, message in positioned]
+
+    async def get_session_window(self, query: Dict, last: Optional[int] = None,
+                                 fields: Optional[List[str]] = None) -> Optional[Dict]:
+        """
+        Récupère une session avec uniquement ses `last` derniers messages (tous si None).
+        """
+        projection = {"_id": 0, "session_id": 1, "storage": 1, "message_count": 1}
+        for field in fields or []:
+            projection[field] = 1
+        projection["messages"] = {"$slice": -last} if last is not None else 1
 
-        logging.info(f"Résumé généré pour la conversation {conversation_id}.")
-        return summary
+        session = await self.conversations_collection.find_one(query, projection)
+        if session and session.get("storage") == "bucket":
+            count = session.get("message_count", 0)
+            start = max(count - last, 0) if last is not None else 0
+            session["messages"] = await self._read_buckets(session["session_id"], start, count)
+        return session
+
+    async def get_messages_page(self, session: Dict, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Retourne une page de messages d'une session (indices [offset, offset + limit)).
+        `session` doit contenir au moins `session_id`, `storage` et `message_count`.
+        """
+        if session.get("storage") == "bucket":
+            count = session.get("message_count", 0)
+            end = count if limit is None else min(offset + limit, count)
+            return await self._read_buckets(session["session_id"], offset, end)
+
+        slice_spec = [offset, limit] if limit is not None else [offset, 2 ** 31 - 1]
+        conversation = await self.conversations_collection.find_one(
+            {"session_id": session["session_id"]},
+            {"_id": 0, "messages": {"$slice": slice_spec}},
+        )
+        return conversation.get("messages", []) if conversation else []
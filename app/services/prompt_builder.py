@@ -0,0 +1,121 @@
+# services/prompt_builder.py
+"""
+Assemblage des messages envoyés au LLM et comptage local des tokens.
+
+Le début de la requête (schémas des outils, instructions, historique ancien) reste identique
+d'une requête à l'autre tant que possible : le cache de préfixe du fournisseur (OpenAI met
+en cache les préfixes de plus de 1024 tokens) s'applique alors à cette partie.
+"""
+import json
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from services.history import estimate_tokens
+
+SYSTEM_PROMPT = (
+    "Vous êtes un assistant intelligent spécialisé dans la recherche d'informations pratiques (hôtels, restaurants, vols, météo). "
+    "Utilisez toujours les fonctions pour fournir des informations précises, puis reformulez de manière claire pour l'utilisateur. "
+    "Si la question porte sur plusieurs sujets (vols, hôtels, météo...), appelez toutes les fonctions nécessaires en une seule fois."
+)
+
+# Surcoût de chaque message (rôle, séparateurs) et amorce de la réponse, selon le format de chat OpenAI
+TOKENS_PER_MESSAGE = 3
+TOKENS_REPLY_PRIMING = 3
+
+
+def load_tokenizer(model: str) -> Callable[[str], int]:
+    """
+    Compteur de tokens du modèle (tiktoken). Sans tiktoken, ou si son encodage ne peut pas
+    être chargé (téléchargement impossible), l'estimation de 4 caractères par token est utilisée.
+    """
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logging.warning(f"Tokenizer indisponible pour {model}, estimation approximative utilisée : {e}")
+        return estimate_tokens
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+@dataclass
+class PromptStats:
+    """Tokens de chaque partie de la requête (comptés localement)."""
+    tools: int = 0
+    system: int = 0
+    history: int = 0
+    question: int = 0
+    trimmed_messages: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.tools + self.system + self.history + self.question + TOKENS_REPLY_PRIMING
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"tools": self.tools, "system": self.system, "history": self.history, "question": self.question}
+
+
+class PromptBuilder:
+    """
+    Construit `[instructions, historique, question]` :
+    - les instructions sont un message unique, identique octet pour octet à chaque requête ;
+    - si la requête dépasse `token_budget`, les plus anciens messages de l'historique sont retirés
+      par blocs de `trim_turns` tours, pour que le début de l'historique (et donc le préfixe mis
+      en cache) ne change pas à chaque tour ;
+    - un résumé de conversation (message système en tête de l'historique) n'est jamais retiré.
+    """
+
+    def __init__(self, model: str, tools: Optional[List[Dict]] = None, token_budget: int = 0, trim_turns: int = 4):
+        self.system_message = SystemMessage(content=SYSTEM_PROMPT)
+        self.token_budget = token_budget
+        self.trim_size = max(trim_turns, 1) * 2
+        self._count = lru_cache(maxsize=4096)(load_tokenizer(model))
+        # Les schémas sont envoyés avec chaque appel d'outils : comptés une seule fois
+        self.tools_tokens = self._count(json.dumps(tools, ensure_ascii=False)) if tools else 0
+
+    def count_text(self, text: str) -> int:
+        return self._count(text)
+
+    def count_message(self, message: BaseMessage) -> int:
+        content = message.content if isinstance(message.content, str) else json.dumps(message.content, ensure_ascii=False)
+        tokens = TOKENS_PER_MESSAGE + self._count(content)
+        for call in getattr(message, "tool_calls", None) or []:
+            tokens += self._count(call["name"]) + self._count(json.dumps(call["args"], ensure_ascii=False))
+        return tokens
+
+    def count_messages(self, messages: List[BaseMessage], with_tools: bool = False) -> int:
+        total = sum(self.count_message(message) for message in messages) + TOKENS_REPLY_PRIMING
+        return total + (self.tools_tokens if with_tools else 0)
+
+    def build(self, history: List[BaseMessage], question: str) -> tuple:
+        """Retourne `(messages, PromptStats)` pour une question et l'historique sélectionné."""
+        pinned = [message for message in history[:1] if isinstance(message, SystemMessage)]
+        turns = history[len(pinned):]
+        question_message = HumanMessage(content=question)
+
+        stats = PromptStats(
+            tools=self.tools_tokens,
+            system=self.count_message(self.system_message) + sum(self.count_message(m) for m in pinned),
+            question=self.count_message(question_message),
+        )
+        sizes = [self.count_message(message) for message in turns]
+        stats.history = sum(sizes)
+
+        if self.token_budget:
+            start = 0
+            while stats.total > self.token_budget and start < len(turns):
+                dropped = sizes[start:start + self.trim_size]
+                stats.history -= sum(dropped)
+                stats.trimmed_messages += len(dropped)
+                start += len(dropped)
+            turns = turns[start:]
+            if stats.trimmed_messages:
+                logging.info(f"Historique réduit de {stats.trimmed_messages} messages (budget de {self.token_budget} tokens).")
+
+        return [self.system_message, *pinned, *turns, question_message], stats
@@ -0,0 +1,252 @@
+# services/rate_limiter.py
+"""
+Limitation des appels sortants vers OpenAI : concurrence adaptative, débits (requêtes et tokens
+par minute), nouvelles tentatives sur erreurs transitoires et rejet rapide en cas de surcharge.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+import openai
+
+from core.metrics import LLM_QUEUE_WAIT, LLM_REJECTED, LLM_RETRIES
+
+
+class LLMOverloaded(Exception):
+    """Le LLM ne peut pas traiter la requête dans le délai d'attente maximal."""
+
+    def __init__(self, message: str, retry_after: float = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Seau à jetons rempli en continu (`rate_per_minute` jetons par minute, capacité d'une minute).
+    Un débit nul désactive la limite.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60
+        self.capacity = rate_per_minute
+        self.level = rate_per_minute
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float, deadline: float) -> None:
+        """
+        Prélève `amount` jetons, en attendant si nécessaire (ordre d'arrivée).
+        Lève `LLMOverloaded` si les jetons ne seront pas disponibles avant `deadline`.
+        """
+        if not self.rate:
+            return
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            wait = max(amount - self.level, 0) / self.rate
+            if time.monotonic() + wait > deadline:
+                raise LLMOverloaded("Débit maximal vers le LLM atteint.", retry_after=wait)
+            if wait:
+                await asyncio.sleep(wait)
+                self._refill()
+            self.level -= amount
+
+    def adjust(self, amount: float) -> None:
+        """Corrige le niveau après coup (consommation réelle différente de l'estimation)."""
+        if self.rate:
+            self._refill()
+            self.level -= amount
+
+
+class LLMRateLimiter:
+    """
+    Encadre chaque appel au LLM :
+    - concurrence limitée et adaptative (divisée par deux sur un 429, puis augmentée d'un cran
+      après une série de succès, sans dépasser `max_concurrency`) ;
+    - seaux à jetons pour les requêtes et les tokens par minute ;
+    - attente bornée par `max_wait` : au-delà, `LLMOverloaded` est levée plutôt que d'empiler les requêtes ;
+    - nouvelles tentatives avec délai exponentiel aléatoire sur 429, 5xx et erreurs réseau,
+      en respectant l'en-tête `Retry-After`.
+    """
+
+    def __init__(self, max_concurrency: int = 16, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_wait: float = 10, max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 20):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.retries = 0
+        self.throttled = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_observed_wait = 0.0
+        self._successes = 0
+        self._slots = asyncio.Condition()
+
+    # ---- Créneaux de concurrence ----
+
+    async def _acquire_slot(self, deadline: float) -> None:
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            async with self._slots:
+                while self.in_flight >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise LLMOverloaded("Trop de requêtes en cours vers le LLM.")
+                    try:
+                        await asyncio.wait_for(self._slots.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        raise LLMOverloaded("Trop de requêtes en cours vers le LLM.")
+                self.in_flight += 1
+        finally:
+            self.waiting -= 1
+            waited = time.monotonic() - started
+            self.waits += 1
+            LLM_QUEUE_WAIT.observe(waited)
+            self.total_wait += waited
+            self.max_observed_wait = max(self.max_observed_wait, waited)
+
+    async def _release_slot(self) -> None:
+        async with self._slots:
+            self.in_flight -= 1
+            self._slots.notify_all()
+
+    async def _admit(self, estimated_tokens: int) -> None:
+        deadline = time.monotonic() + self.max_wait
+        try:
+            await self._acquire_slot(deadline)
+        except LLMOverloaded:
+            self.rejected += 1
+            LLM_REJECTED.inc()
+            raise
+        try:
+            await self.requests.acquire(1, deadline)
+            await self.tokens.acquire(estimated_tokens, deadline)
+        except LLMOverloaded:
+            self.rejected += 1
+            LLM_REJECTED.inc()
+            await self._release_slot()
+            raise
+
+    # ---- Adaptation et nouvelles tentatives ----
+
+    def _on_success(self) -> None:
+        self.completed += 1
+        self._successes += 1
+        if self.limit < self.max_concurrency and self._successes >= self.limit:
+            self.limit += 1
+            self._successes = 0
+
+    def _on_throttled(self) -> None:
+        self.throttled += 1
+        self._successes = 0
+        self.limit = max(1, self.limit // 2)
+        logging.warning(f"Limite de débit OpenAI atteinte : concurrence réduite à {self.limit}.")
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+            return True
+        return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1)):
+            try:
+                return min(float(headers[header]) * scale, self.max_delay)
+            except (KeyError, TypeError, ValueError):
+                continue
+        # Délai exponentiel avec aléa complet pour étaler les nouvelles tentatives
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def _handle_error(self, error: Exception, attempt: int) -> None:
+        """Attend avant une nouvelle tentative, ou relève l'erreur si elle est définitive."""
+        if not self._is_retryable(error):
+            raise error
+        if isinstance(error, openai.RateLimitError):
+            self._on_throttled()
+        if attempt >= self.max_retries:
+            raise LLMOverloaded(f"Le LLM est indisponible après {attempt + 1} tentatives : {error}") from error
+        self.retries += 1
+        LLM_RETRIES.inc()
+        delay = self._retry_delay(error, attempt)
+        logging.warning(f"Appel au LLM en échec ({error.__class__.__name__}), nouvelle tentative dans {delay:.1f}s.")
+        await asyncio.sleep(delay)
+
+    # ---- Points d'entrée ----
+
+    async def call(self, factory: Callable[[], Awaitable], estimated_tokens: int = 0):
+        """Exécute `factory()` (un appel au LLM) sous le contrôle du limiteur."""
+        attempt = 0
+        while True:
+            await self._admit(estimated_tokens)
+            try:
+                result = await factory()
+                self._on_success()
+                return result
+            except Exception as e:
+                error = e
+            finally:
+                await self._release_slot()
+            await self._handle_error(error, attempt)
+            attempt += 1
+
+    async def stream(self, factory: Callable[[], AsyncIterator], estimated_tokens: int = 0) -> AsyncIterator:
+        """
+        Relaie un flux du LLM sous le contrôle du limiteur. Une nouvelle tentative n'est possible
+        que si l'erreur survient avant le premier morceau reçu.
+        """
+        attempt = 0
+        while True:
+            await self._admit(estimated_tokens)
+            started = False
+            error = None
+            try:
+                async for chunk in factory():
+                    started = True
+                    yield chunk
+                self._on_success()
+                return
+            except Exception as e:
+                if started:
+                    raise
+                error = e
+            finally:
+                await self._release_slot()
+            await self._handle_error(error, attempt)
+            attempt += 1
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Reporte sur le seau de tokens l'écart entre l'estimation et la consommation réelle."""
+        if actual_tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "concurrency_limit": self.limit,
+            "max_concurrency": self.max_concurrency,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "avg_wait_seconds": self.total_wait / self.waits if self.waits else 0.0,
+            "max_wait_seconds": self.max_observed_wait,
+        }
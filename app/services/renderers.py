@@ -0,0 +1,122 @@
+# services/renderers.py
+"""
+Mise en forme locale des résultats des outils, sans second appel au LLM.
+"""
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+from models.models import ToolResult, compact_value
+
+# Mots signalant une question qui demande un raisonnement (comparaison, conseil...)
+REASONING_KEYWORDS = (
+    "pourquoi", "comment", "compar", "meilleur", "conseil", "recommand", "lequel", "laquelle",
+    "moins cher", "plus proche", "plutot", "vaut", "itineraire", "organis", "planifi",
+    "idee", "suggest", "avis", "faut-il", "dois-je",
+)
+
+RESPONSE_MODES = ("llm", "template", "auto")
+
+
+def parse_tool_modes(spec: str) -> Dict[str, str]:
+    """Convertit "get_weather_info=template,get_hotels_info=auto" en dictionnaire outil -> mode."""
+    modes = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, mode = item.partition("=")
+        if mode.strip() not in RESPONSE_MODES:
+            raise ValueError(f"Mode de réponse invalide pour {name} : {mode}")
+        modes[name.strip()] = mode.strip()
+    return modes
+
+
+def _intro(fn_name: str, args: Dict) -> str:
+    if fn_name == "get_flights_info":
+        when = f" ({args['departure_date']})" if args.get("departure_date") else ""
+        return f"Voici les vols de {args.get('origin_city')} à {args.get('destination_city')}{when} :"
+    if fn_name == "get_hotels_info":
+        stars = f" {float(args['stars']):g} étoiles" if args.get("stars") else ""
+        return f"Voici les hôtels{stars} à {args.get('city')} :"
+    if fn_name == "get_restaurants_info":
+        cuisine = f" ({args['cuisine']})" if args.get("cuisine") else ""
+        return f"Voici les restaurants à {args.get('city')}{cuisine} :"
+    if fn_name == "get_weather_info":
+        when = f" le {args['date']}" if args.get("date") else ""
+        return f"Voici la météo à {args.get('city')}{when} :"
+    return "Voici les résultats trouvés :"
+
+
+def _table(headers: List[str], rows: List[List[str]]) -> str:
+    lines = ["| " + " | ".join(headers) + " |", "|" + "---|" * len(headers)]
+    lines += ["| " + " | ".join(row) + " |" for row in rows]
+    return "\n".join(lines)
+
+
+def _format_items(result: ToolResult) -> str:
+    """Tableau pour les vols et la météo, liste à puces pour les hôtels et restaurants."""
+    if result.tool == "get_flights_info":
+        return _table(
+            ["Vol", "Compagnie", "Date", "Départ", "Arrivée"],
+            [[compact_value(item.numero_de_vol), compact_value(item.compagnie_aerienne),
+              compact_value(item.date_de_depart), compact_value(item.heure_de_depart),
+              compact_value(item.heure_arrivee)] for item in result.items]
+        )
+    if result.tool == "get_weather_info":
+        return _table(
+            ["Date", "Condition", "Température (°C)"],
+            [[compact_value(item.date), compact_value(item.condition), compact_value(item.temperature)]
+             for item in result.items]
+        )
+    if result.tool == "get_hotels_info":
+        return "\n".join(
+            f"- **{item.nom}** ({compact_value(item.etoiles)} étoiles) : {item.adresse or 'adresse inconnue'}"
+            + (f", disponible le {item.date_de_disponibilite}" if item.date_de_disponibilite else "")
+            for item in result.items
+        )
+    return "\n".join(
+        f"- **{item.nom}** ({item.cuisine or 'cuisine variée'}, {item.budget or 'budget inconnu'}"
+        + (f", note {compact_value(item.evaluation)}/5" if item.evaluation is not None else "") + ")"
+        + (f" : {item.adresse}" if item.adresse else "")
+        for item in result.items
+    )
+
+
+def render_tool_result(fn_name: str, args: Dict, result: ToolResult) -> str:
+    """
+    Présente le résultat d'un outil : phrase d'introduction puis les résultats mis en forme.
+    Les messages d'erreur et les réponses vides sont renvoyés tels quels.
+    """
+    if result.status != "ok":
+        return result.message or ""
+
+    lines = [_intro(fn_name, args), _format_items(result)]
+    if result.has_more:
+        lines.append("D'autres résultats sont disponibles : précisez votre recherche ou demandez la suite.")
+    return "\n".join(lines)
+
+
+def render_tool_results(tool_calls: List[Dict], results: List[ToolResult]) -> str:
+    """Assemble la présentation de plusieurs appels d'outils (une section par outil)."""
+    return "\n\n".join(
+        render_tool_result(call["name"], call.get("args") or {}, result)
+        for call, result in zip(tool_calls, results)
+    )
+
+
+def needs_reasoning(question: str) -> bool:
+    """Heuristique : la question demande-t-elle plus qu'une simple consultation ?"""
+    text = "".join(c for c in unicodedata.normalize("NFKD", question.casefold()) if not unicodedata.combining(c))
+    return any(keyword in text for keyword in REASONING_KEYWORDS)
+
+
+def resolve_response_mode(question: str, tool_names: Iterable[str], default_mode: str,
+                          tool_modes: Dict[str, str], request_mode: Optional[str] = None) -> str:
+    """
+    Choisit entre reformulation par le LLM (`llm`) et gabarit local (`template`).
+    Le mode de la requête prime sur la configuration par outil ; `auto` utilise le gabarit
+    sauf si la question demande un raisonnement.
+    """
+    modes = {request_mode or tool_modes.get(name, default_mode) for name in tool_names}
+    if "llm" in modes or not modes:
+        return "llm"
+    if "auto" in modes and needs_reasoning(question):
+        return "llm"
+    return "template"
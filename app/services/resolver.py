@@ -0,0 +1,229 @@
+# services/resolver.py
+"""
+Résolution des villes et des cuisines demandées vers les valeurs exactes du catalogue.
+
+Les noms fournis par le LLM ("paris ", "Marseile", "NYC") sont rapprochés des valeurs
+distinctes des collections : forme normalisée (casse et accents ignorés), alias, puis
+similarité de trigrammes pour les fautes de frappe. Les outils interrogent ensuite MongoDB
+par égalité sur les valeurs trouvées, ce qui utilise les index.
+"""
+import asyncio
+import logging
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+# Champs contenant une ville, par collection du catalogue
+CITY_FIELDS = {
+    "vols": ["ville_dorigine", "ville_de_destination"],
+    "hotels": ["ville"],
+    "restaurants": ["ville"],
+    "climat": ["ville"],
+}
+CUISINE_FIELDS = {"restaurants": ["cuisine"]}
+
+# Alias usuels (forme saisie -> nom du catalogue) ; complétés par CITY_ALIASES / CUISINE_ALIASES
+DEFAULT_CITY_ALIASES = {
+    "NYC": "New York",
+    "New York City": "New York",
+    "London": "Londres",
+    "Lisbon": "Lisbonne",
+    "Athens": "Athènes",
+    "Roma": "Rome",
+    "Munchen": "Munich",
+    "Mexico City": "Mexico",
+    "Montréal": "Montreal",
+}
+DEFAULT_CUISINE_ALIASES = {
+    "italien": "italienne",
+    "japonais": "japonaise",
+    "sushi": "japonaise",
+    "pizza": "italienne",
+    "marocain": "marocaine",
+    "libanais": "libanaise",
+    "espagnol": "espagnole",
+    "indien": "indienne",
+    "francais": "française",
+}
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_name(text: str) -> str:
+    """Forme de comparaison : sans accents, en minuscules, ponctuation remplacée par des espaces."""
+    text = "".join(c for c in unicodedata.normalize("NFKD", str(text)) if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(" ", text.casefold()).strip()
+
+
+def trigrams(name: str) -> Set[str]:
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def parse_aliases(spec: str) -> Dict[str, str]:
+    """Convertit "NYC=New York,Big Apple=New York" en dictionnaire d'alias."""
+    aliases = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        alias, _, target = item.partition("=")
+        if target.strip():
+            aliases[alias.strip()] = target.strip()
+    return aliases
+
+
+class NameIndex:
+    """
+    Index des valeurs distinctes d'un champ : forme normalisée -> valeurs brutes du catalogue
+    (plusieurs graphies d'une même ville sont regroupées), alias et index de trigrammes.
+    Construit une fois, en lecture seule ensuite.
+    """
+
+    def __init__(self, values: Iterable[str], aliases: Optional[Dict[str, str]] = None, min_similarity: float = 0.45):
+        self.variants: Dict[str, List[str]] = defaultdict(list)
+        for value in values:
+            key = normalize_name(value)
+            if key:
+                self.variants[key].append(value)
+        self.variants = dict(self.variants)
+        self.aliases = {normalize_name(alias): normalize_name(target) for alias, target in (aliases or {}).items()}
+        self.min_similarity = min_similarity
+        self._trigram_sizes = {key: len(trigrams(key)) for key in self.variants}
+        self._postings: Dict[str, List[str]] = defaultdict(list)
+        for key in self.variants:
+            for gram in trigrams(key):
+                self._postings[gram].append(key)
+
+    def __len__(self) -> int:
+        return len(self.variants)
+
+    def closest(self, key: str) -> Optional[str]:
+        """Valeur la plus proche au sens de Jaccard sur les trigrammes, si elle est assez proche et sans ex æquo."""
+        grams = trigrams(key)
+        shared = Counter(candidate for gram in grams for candidate in self._postings.get(gram, ()))
+        scored = sorted(
+            ((count / (len(grams) + self._trigram_sizes[candidate] - count), candidate)
+             for candidate, count in shared.items()),
+            reverse=True
+        )
+        if not scored or scored[0][0] < self.min_similarity:
+            return None
+        if len(scored) > 1 and scored[1][0] == scored[0][0]:
+            return None  # Ambigu : mieux vaut ne rien supposer
+        return scored[0][1]
+
+    def resolve(self, text: str) -> tuple:
+        """
+        Retourne `(clé normalisée ou None, méthode)` avec méthode parmi
+        `exact`, `alias`, `fuzzy` et `unknown`.
+        """
+        key = normalize_name(text)
+        if key in self.variants:
+            return key, "exact"
+        alias = self.aliases.get(key)
+        if alias in self.variants:
+            return alias, "alias"
+        if key:
+            match = self.closest(key)
+            if match:
+                return match, "fuzzy"
+        return None, "unknown"
+
+    def containing(self, text: str) -> List[str]:
+        """Clés contenant le terme (ex: "ital" -> "italienne"), comme l'ancienne recherche par sous-chaîne."""
+        key = normalize_name(text)
+        return [candidate for candidate in self.variants if key and key in candidate]
+
+
+class CatalogResolver:
+    """
+    Résolveur partagé des villes et des cuisines, rechargé depuis les valeurs distinctes du catalogue.
+    Tant qu'il n'est pas chargé (ou pour une valeur inconnue), la valeur demandée est utilisée telle quelle.
+    """
+
+    def __init__(self, db, city_aliases: Optional[Dict[str, str]] = None,
+                 cuisine_aliases: Optional[Dict[str, str]] = None, min_similarity: float = 0.45):
+        self.db = db
+        self.city_aliases = {**DEFAULT_CITY_ALIASES, **(city_aliases or {})}
+        self.cuisine_aliases = {**DEFAULT_CUISINE_ALIASES, **(cuisine_aliases or {})}
+        self.min_similarity = min_similarity
+        self.cities = NameIndex([])
+        self.cuisines = NameIndex([])
+        self.loaded_at: Optional[datetime] = None
+        self.resolutions = Counter()
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    async def _distinct(self, fields: Dict[str, List[str]]) -> Set[str]:
+        values = set()
+        for collection, names in fields.items():
+            for field in names:
+                values.update(v for v in await self.db[collection].distinct(field) if isinstance(v, str))
+        return values
+
+    def load(self, cities: Iterable[str], cuisines: Iterable[str]) -> None:
+        """Construit les index à partir de listes de valeurs et les remplace d'un bloc."""
+        self.cities, self.cuisines = (
+            NameIndex(cities, self.city_aliases, self.min_similarity),
+            NameIndex(cuisines, self.cuisine_aliases, self.min_similarity),
+        )
+        self.loaded_at = datetime.utcnow()
+
+    async def refresh(self) -> None:
+        """Recharge les valeurs distinctes du catalogue puis reconstruit les index."""
+        cities, cuisines = await self._distinct(CITY_FIELDS), await self._distinct(CUISINE_FIELDS)
+        await asyncio.to_thread(self.load, cities, cuisines)
+        logging.info(f"Résolveur du catalogue chargé : {len(self.cities)} villes, {len(self.cuisines)} cuisines.")
+
+    async def run_periodic_refresh(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Rechargement du résolveur impossible : {e}")
+
+    @staticmethod
+    def _filter(values: List[str]) -> Union[str, Dict]:
+        return values[0] if len(values) == 1 else {"$in": values}
+
+    def city_filter(self, city: str) -> Union[str, Dict]:
+        """Filtre MongoDB d'un champ ville : égalité sur la (ou les) graphie(s) du catalogue."""
+        if not self.loaded:
+            return city
+        key, method = self.cities.resolve(city)
+        self.resolutions[f"city_{method}"] += 1
+        if key is None:
+            return city
+        if method != "exact":
+            logging.info(f"Ville « {city} » résolue en « {self.cities.variants[key][0]} » ({method}).")
+        return self._filter(self.cities.variants[key])
+
+    def cuisine_filter(self, cuisine: str) -> Union[str, Dict]:
+        """
+        Filtre MongoDB du champ cuisine : toutes les cuisines contenant le terme demandé,
+        à défaut l'alias ou la cuisine la plus proche. Avant chargement : recherche par sous-chaîne.
+        """
+        if not self.loaded:
+            return {"$regex": re.escape(cuisine), "$options": "i"}
+        keys = self.cuisines.containing(cuisine)
+        method = "exact"
+        if not keys:
+            key, method = self.cuisines.resolve(cuisine)
+            keys = [key] if key else []
+        self.resolutions[f"cuisine_{method}"] += 1
+        if not keys:
+            return cuisine
+        return self._filter([value for key in keys for value in self.cuisines.variants[key]])
+
+    def stats(self) -> Dict:
+        return {
+            "cities": len(self.cities),
+            "cuisines": len(self.cuisines),
+            "loaded_at": self.loaded_at,
+            "resolutions": dict(self.resolutions),
+        }
@@ -0,0 +1,305 @@
+# services/response_cache.py
+"""
+Cache des réponses de l'assistant : évite les appels au LLM pour les questions déjà posées.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from models.models import ChatResponse
+
+# Collections du catalogue lues par chaque outil (pour l'invalidation)
+TOOL_COLLECTIONS = {
+    "get_flights_info": "vols",
+    "get_hotels_info": "hotels",
+    "get_restaurants_info": "restaurants",
+    "get_weather_info": "climat",
+}
+
+STOP_WORDS = {
+    "a", "au", "aux", "avec", "ce", "ces", "cette", "de", "des", "du", "en", "est", "et", "il", "je",
+    "j", "l", "la", "le", "les", "me", "moi", "mon", "ma", "mes", "on", "ou", "par", "pour", "quel",
+    "quelle", "quelles", "quels", "qu", "que", "qui", "sur", "un", "une", "y", "d", "s", "vous", "nous",
+    "svp", "stp", "merci", "bonjour", "cherche", "veux", "voudrais", "aimerais", "donne", "donner",
+    "trouve", "trouver", "liste", "connaitre", "savoir", "peux", "pouvez", "dans",
+}
+
+# Mots génériques du domaine : deux questions ne différant que par ces mots sont équivalentes
+GENERIC_WORDS = {
+    "hotel", "hebergement", "logement", "restaurant", "resto", "manger", "vol", "avion", "billet",
+    "meteo", "temps", "climat", "temperature", "prevision", "etoile", "disponible", "info",
+    "information", "bon", "meilleur", "partir", "aller",
+}
+
+# Questions sur les vols : le sens du trajet compte, ses marqueurs sont conservés
+FLIGHT_WORDS = {"vol", "vols", "avion", "avions", "billet", "billets"}
+# Expressions de départ et d'arrivée, ramenées à "depuis" ou "vers" (la plus longue l'emporte)
+DIRECTION_MARKERS = sorted([
+    (("au", "depart", "de"), "depuis"), (("en", "provenance", "de"), "depuis"), (("depart", "de"), "depuis"),
+    (("partant", "de"), "depuis"), (("de",), "depuis"), (("du",), "depuis"), (("depuis",), "depuis"),
+    (("a", "destination", "de"), "vers"), (("destination", "de"), "vers"), (("arrivee", "a"), "vers"),
+    (("a",), "vers"), (("au",), "vers"), (("aux",), "vers"), (("vers",), "vers"), (("pour",), "vers"),
+    (("destination",), "vers"),
+], key=lambda marker: -len(marker[0]))
+
+
+def _unaccent(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def _direction_marker(words: List[str], position: int) -> Optional[tuple]:
+    for phrase, direction in DIRECTION_MARKERS:
+        if tuple(words[position:position + len(phrase)]) == phrase:
+            return phrase, direction
+    return None
+
+
+def normalize_question(text: str) -> str:
+    """
+    Forme canonique d'une question : minuscules, sans accents ni ponctuation,
+    sans mots vides, pluriels simples ramenés au singulier ("4*" devient "4 etoile").
+    Pour les vols, les marqueurs de départ et d'arrivée deviennent "depuis" et "vers"
+    ("vols au départ de Paris à destination de Rome" devient "vol depuis paris vers rome").
+    """
+    text = _unaccent(text.casefold())
+    text = re.sub(r"(\d)\s*\*", r"\1 etoiles", text)
+    words = re.findall(r"[a-z0-9$\-]+", text)
+    directed = not FLIGHT_WORDS.isdisjoint(words)
+    tokens = []
+    position = 0
+    while position < len(words):
+        marker = _direction_marker(words, position) if directed else None
+        if marker:
+            phrase, direction = marker
+            if not tokens or tokens[-1] != direction:
+                tokens.append(direction)
+            position += len(phrase)
+            continue
+        token = words[position]
+        position += 1
+        if token in STOP_WORDS:
+            continue
+        if len(token) > 3 and token.endswith(("s", "x")) and not token[-2].isdigit():
+            token = token[:-1]
+        tokens.append(token)
+    return " ".join(tokens)
+
+
+def _entity_tokens(normalized: str) -> List[str]:
+    """
+    Mots porteurs de sens (villes, nombres, cuisines, sens du trajet...), dans l'ordre de la question :
+    ils doivent être identiques pour un rapprochement ("paris vers dubai" n'est pas "dubai vers paris").
+    """
+    return [token for token in normalized.split() if token not in GENERIC_WORDS]
+
+
+class _Entry:
+    __slots__ = ("key", "scope", "normalized", "vector", "response", "collections", "versions", "expires_at", "row")
+
+    def __init__(self, key, scope, normalized, vector, response, collections, versions, expires_at):
+        self.key = key
+        self.scope = scope
+        self.normalized = normalized
+        self.vector = vector
+        self.response = response
+        self.collections = collections
+        self.versions = versions
+        self.expires_at = expires_at
+        self.row = -1  # Ligne de l'embedding dans l'index vectoriel de la portée
+
+
+class _VectorIndex:
+    """
+    Embeddings d'une portée dans une matrice préallouée, agrandie par doublement : un ajout écrit
+    une ligne, une suppression déplace la dernière ligne à la place libérée (pas de reconstruction).
+    """
+
+    def __init__(self, dimension: int, capacity: int = 64):
+        self.matrix = np.empty((capacity, dimension), dtype=np.float32)
+        self.entries: List[_Entry] = []
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, entry: _Entry) -> None:
+        size = len(self.entries)
+        if size == len(self.matrix):
+            grown = np.empty((size * 2, self.matrix.shape[1]), dtype=np.float32)
+            grown[:size] = self.matrix
+            self.matrix = grown
+        self.matrix[size] = entry.vector
+        entry.row = size
+        self.entries.append(entry)
+
+    def remove(self, entry: _Entry) -> None:
+        last = self.entries.pop()
+        if last is not entry:
+            self.matrix[entry.row] = self.matrix[last.row]
+            self.entries[entry.row] = last
+            last.row = entry.row
+        entry.row = -1
+
+    def scores(self, vector: np.ndarray) -> np.ndarray:
+        return self.matrix[:len(self.entries)] @ vector
+
+
+class ResponseCache:
+    """
+    Cache des `ChatResponse` par question normalisée :
+    - correspondance exacte par hachage de la forme canonique ;
+    - sinon, similarité cosinus des embeddings au-dessus d'un seuil (index vectoriel en mémoire),
+      à condition que les mots porteurs de sens soient identiques.
+
+    Les entrées sont cloisonnées par portée (`global` ou propre à un utilisateur et à son contexte)
+    et invalidées lorsqu'une collection du catalogue dont elles dépendent change.
+    """
+
+    def __init__(self, embeddings=None, similarity_threshold: float = 0.92,
+                 ttl: float = 3600, max_entries: int = 10000):
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.catalog_versions: Dict[str, int] = {name: 0 for name in TOOL_COLLECTIONS.values()}
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._indexes: Dict[str, _VectorIndex] = {}  # portée -> embeddings des entrées
+
+    @staticmethod
+    def scope_for(user_id: str, history: List) -> str:
+        """
+        Une question sans historique est indépendante de l'utilisateur : elle est partagée.
+        Sinon la réponse peut dépendre du contexte : elle est réservée à l'utilisateur et à ce contexte.
+        """
+        if not history:
+            return "global"
+        context = "\n".join(str(getattr(msg, "content", msg)) for msg in history[-2:])
+        return f"{user_id}:{hashlib.sha256(context.encode('utf-8')).hexdigest()[:16]}"
+
+    @staticmethod
+    def _key(scope: str, normalized: str) -> str:
+        return f"{scope}:{hashlib.sha256(normalized.encode('utf-8')).hexdigest()}"
+
+    async def _embed(self, text: str) -> Optional[np.ndarray]:
+        if self.embeddings is None:
+            return None
+        try:
+            vector = np.asarray(await self.embeddings.aembed_query(text), dtype=np.float32)
+            return vector / (np.linalg.norm(vector) or 1.0)
+        except Exception as e:
+            logging.warning(f"Embedding indisponible pour le cache de réponses : {e}")
+            return None
+
+    def _is_valid(self, entry: _Entry) -> bool:
+        if entry.expires_at <= time.monotonic():
+            return False
+        return all(self.catalog_versions.get(name, 0) == version for name, version in entry.versions.items())
+
+    async def lookup(self, question: str, scope: str) -> Optional[ChatResponse]:
+        normalized = normalize_question(question)
+        entry = self._entries.get(self._key(scope, normalized))
+        if entry and self._is_valid(entry):
+            self._entries.move_to_end(entry.key)
+            self.exact_hits += 1
+            return entry.response.copy(deep=True)
+
+        index = self._indexes.get(scope)
+        if index:
+            vector = await self._embed(normalized)
+            # L'index a pu changer pendant le calcul de l'embedding
+            if vector is not None and len(index):
+                scores = index.scores(vector)
+                candidates = index.entries
+                entities = _entity_tokens(normalized)
+                for row in np.argsort(scores)[::-1][:5]:
+                    if scores[row] < self.similarity_threshold:
+                        break
+                    candidate = candidates[row]
+                    if self._is_valid(candidate) and _entity_tokens(candidate.normalized) == entities:
+                        self._entries.move_to_end(candidate.key)
+                        self.semantic_hits += 1
+                        return candidate.response.copy(deep=True)
+
+        self.misses += 1
+        return None
+
+    async def store(self, question: str, scope: str, response: ChatResponse, tools: Iterable[str]) -> None:
+        normalized = normalize_question(question)
+        if not normalized:
+            return
+        collections = {TOOL_COLLECTIONS[name] for name in tools if name in TOOL_COLLECTIONS}
+        key = self._key(scope, normalized)
+        if key in self._entries:
+            self._remove(key)
+
+        entry = _Entry(
+            key=key,
+            scope=scope,
+            normalized=normalized,
+            vector=await self._embed(normalized),
+            response=response.copy(deep=True),
+            collections=collections,
+            versions={name: self.catalog_versions.get(name, 0) for name in collections},
+            expires_at=time.monotonic() + self.ttl,
+        )
+        self._entries[key] = entry
+        if entry.vector is not None:
+            if scope not in self._indexes:
+                self._indexes[scope] = _VectorIndex(len(entry.vector))
+            self._indexes[scope].add(entry)
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        if entry.vector is not None:
+            index = self._indexes[entry.scope]
+            index.remove(entry)
+            if not index:
+                del self._indexes[entry.scope]
+
+    def invalidate_collections(self, collections: Iterable[str]) -> None:
+        """
+        Invalide les réponses construites à partir des collections indiquées
+        (incrément de version : les entrées concernées ne seront plus servies).
+        """
+        for name in collections:
+            self.catalog_versions[name] = self.catalog_versions.get(name, 0) + 1
+        logging.info(f"Cache de réponses invalidé pour : {list(collections)}")
+
+    async def watch_catalog(self, db) -> None:
+        """
+        Écoute les change streams MongoDB du catalogue et invalide les réponses concernées.
+        Nécessite un replica set (cas de MongoDB Atlas).
+        """
+        pipeline = [{"$match": {"ns.coll": {"$in": list(self.catalog_versions)}}}]
+        while True:
+            try:
+                async with db.watch(pipeline) as stream:
+                    async for change in stream:
+                        self.invalidate_collections([change["ns"]["coll"]])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Change stream du catalogue interrompu : {e}")
+                await asyncio.sleep(30)
+
+    def stats(self) -> Dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,157 @@
+# services/summarizer.py
+"""
+Résumé incrémental des sessions, mis à jour en tâche de fond.
+
+Chaque session porte un état de résumé (`history_summary`, `summary_bullets`, `summary_one_liner`)
+couvrant ses `summary_upto` premiers messages. Toutes les `every_n` nouveaux messages, seul le
+delta est envoyé au LLM avec l'état précédent : le coût d'une mise à jour dépend du nombre de
+nouveaux messages, pas de la longueur de la session. L'état sert à l'endpoint de résumé
+(lecture directe, sans appel au LLM) et remplace les anciens tours dans les requêtes (mode `summary`).
+"""
+import json
+import logging
+import re
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from services.history import message_role
+from services.mongo_service import MongoService
+
+# Champs de la session contenant l'état du résumé
+SUMMARY_FIELDS = ["history_summary", "summary_bullets", "summary_one_liner", "summary_upto", "summary_updated_at"]
+
+SUMMARY_INSTRUCTIONS = (
+    "Vous tenez à jour le résumé d'une conversation entre un utilisateur et un assistant de voyage. "
+    "À partir du résumé existant et des nouveaux échanges, produisez le résumé de toute la conversation. "
+    "Conservez les villes, dates, budgets, préférences et décisions importantes. "
+    "Répondez uniquement avec un objet JSON : "
+    '{"full_summary": "résumé en un paragraphe", "bullet_points": ["point principal", ...], '
+    '"one_liner": "résumé en une phrase"} (au plus 8 points).'
+)
+
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+
+
+def parse_summary(text: str) -> Dict:
+    """
+    Extrait l'état du résumé de la réponse du LLM. Si elle n'est pas du JSON valide,
+    le texte entier devient le résumé complet et sa première phrase le résumé court.
+    """
+    match = _JSON_OBJECT.search(text)
+    try:
+        data = json.loads(match.group(0)) if match else {}
+    except ValueError:
+        data = {}
+    full_summary = str(data.get("full_summary") or text).strip()
+    bullets = data.get("bullet_points")
+    one_liner = str(data.get("one_liner") or re.split(r"(?<=[.!?])\s", full_summary, maxsplit=1)[0]).strip()
+    return {
+        "history_summary": full_summary,
+        "summary_bullets": [str(item).strip() for item in bullets if str(item).strip()] if isinstance(bullets, list) else [],
+        "summary_one_liner": one_liner,
+    }
+
+
+def summary_state(session: Optional[Dict]) -> Dict:
+    """État du résumé d'une session (valeurs vides si la session n'a pas encore été résumée)."""
+    session = session or {}
+    return {
+        "full_summary": session.get("history_summary") or "",
+        "bullet_points": session.get("summary_bullets") or [],
+        "one_liner": session.get("summary_one_liner") or "",
+        "covered_messages": session.get("summary_upto", 0),
+        "message_count": session.get("message_count", 0),
+        "updated_at": session.get("summary_updated_at"),
+    }
+
+
+class SessionSummarizer:
+    """
+    Met à jour le résumé d'une session dès que `every_n` messages ne sont pas encore résumés.
+    Le delta est traité par lots de `max_batch` messages au plus (une session ancienne jamais
+    résumée est rattrapée en plusieurs appels). Une seule mise à jour à la fois par session.
+    """
+
+    def __init__(self, mongo_service: MongoService, generate: Callable[[List[BaseMessage]], Awaitable[str]],
+                 every_n: int = 10, max_batch: int = 40):
+        self.mongo_service = mongo_service
+        self.generate = generate
+        self.every_n = max(every_n, 1)
+        self.max_batch = max(max_batch, self.every_n)
+        self._running: Set[str] = set()
+        self.updates = 0
+        self.summarized_messages = 0
+        self.failures = 0
+
+    def due(self, message_count: int, summary_upto: int) -> bool:
+        return message_count - summary_upto >= self.every_n
+
+    async def refresh(self, session_id: str) -> Optional[Dict]:
+        """
+        Intègre au résumé les messages non encore résumés, si assez nombreux.
+        Retourne les champs mis à jour (None si rien n'a changé).
+        """
+        if session_id in self._running:
+            return None  # Une mise à jour est déjà en cours ; elle sera relancée au prochain message
+        self._running.add(session_id)
+        try:
+            return await self._refresh(session_id)
+        except Exception as e:
+            self.failures += 1
+            logging.error(f"Erreur lors de la mise à jour du résumé de la session {session_id} : {e}")
+            return None
+        finally:
+            self._running.discard(session_id)
+
+    async def _refresh(self, session_id: str) -> Optional[Dict]:
+        session = await self.mongo_service.conversations_collection.find_one(
+            {"session_id": session_id},
+            {"_id": 0, "session_id": 1, "storage": 1, "message_count": 1, **{field: 1 for field in SUMMARY_FIELDS}}
+        )
+        if not session or "message_count" not in session:
+            return None
+
+        updated = None
+        while self.due(session["message_count"], session.get("summary_upto", 0)):
+            start = session.get("summary_upto", 0)
+            end = min(session["message_count"], start + self.max_batch)
+            delta = await self.mongo_service.get_messages_page(session, offset=start, limit=end - start)
+            if not delta:
+                break
+            fields = parse_summary(await self.generate(self._prompt(session, delta)))
+            fields.update(summary_upto=start + len(delta), summary_updated_at=datetime.utcnow())
+
+            # Mise à jour conditionnelle pour éviter d'écraser un résumé plus récent (autre worker)
+            result = await self.mongo_service.conversations_collection.update_one(
+                {"session_id": session_id, "summary_upto": session.get("summary_upto")},
+                {"$set": fields}
+            )
+            if not result.modified_count:
+                break
+            session.update(fields)
+            updated = {field: session[field] for field in SUMMARY_FIELDS}
+            self.updates += 1
+            self.summarized_messages += len(delta)
+            logging.info(f"Résumé de la session {session_id} mis à jour (messages {start}-{fields['summary_upto']}).")
+        return updated
+
+    @staticmethod
+    def _prompt(session: Dict, delta: List[Dict]) -> List[BaseMessage]:
+        transcript = "\n".join(f"{message_role(msg)}: {msg.get('content', '')}" for msg in delta)
+        return [
+            SystemMessage(content=SUMMARY_INSTRUCTIONS),
+            HumanMessage(content=(
+                f"Résumé existant : {session.get('history_summary') or 'aucun'}\n\n"
+                f"Nouveaux échanges :\n{transcript}"
+            )),
+        ]
+
+    def stats(self) -> Dict:
+        return {
+            "updates": self.updates,
+            "summarized_messages": self.summarized_messages,
+            "failures": self.failures,
+            "running": len(self._running),
+        }
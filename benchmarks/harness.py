@@ -0,0 +1,248 @@
+"""
+Éléments communs aux benchmarks : modèle de chat factice, MongoDB instrumenté
+et génération de données de catalogue et de conversations.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+sys.path.insert(0, APP_DIR)
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "benchmark")
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage  # noqa: E402
+from langchain_core.outputs import ChatGeneration, LLMResult  # noqa: E402
+
+# Méthodes de collection qui déclenchent un aller-retour vers le serveur
+ROUNDTRIP_OPERATIONS = {
+    "find", "find_one", "find_one_and_update", "insert_one", "insert_many",
+    "update_one", "update_many", "delete_one", "delete_many", "aggregate", "count_documents", "bulk_write",
+}
+
+CITIES = ["Paris", "Lyon", "Marseille", "Dubai", "Tokyo", "Rome", "Madrid", "Berlin", "Lisbonne",
+          "Casablanca", "Tunis", "Marrakech", "Montreal", "Londres", "Athenes", "Istanbul"]
+AIRLINES = ["Air France", "Emirates", "Lufthansa", "Iberia", "Royal Air Maroc", "Tunisair", "ANA"]
+CUISINES = ["française", "italienne", "japonaise", "marocaine", "libanaise", "espagnole", "indienne"]
+CONDITIONS = ["Ensoleillé", "Nuageux", "Pluvieux", "Orageux", "Neigeux", "Venteux"]
+
+
+# ---- MongoDB instrumenté ----
+
+class CountingCollection:
+    """Enveloppe une collection Motor et compte les opérations émises."""
+
+    def __init__(self, collection, counter: Counter):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in ROUNDTRIP_OPERATIONS:
+            self._counter[name] += 1
+        return attr
+
+
+class CountingDatabase:
+    """Base de données dont chaque collection est instrumentée."""
+
+    def __init__(self, database, counter: Counter):
+        self._database = database
+        self._counter = counter
+
+    def __getitem__(self, name):
+        return CountingCollection(self._database[name], self._counter)
+
+    def __getattr__(self, name):
+        return getattr(self._database, name)
+
+
+class CountingClient:
+    """Client MongoDB dont les bases sont instrumentées (à passer à `ServiceContainer`)."""
+
+    def __init__(self, client, counter: Counter):
+        self._client = client
+        self.counter = counter
+
+    def __getitem__(self, name):
+        return CountingDatabase(self._client[name], self.counter)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def make_client(backend: str):
+    """`mock` : mongomock-motor en mémoire ; `mongo` : serveur désigné par MONGODB_URI (mongod local)."""
+    if backend == "mock":
+        from mongomock_motor import AsyncMongoMockClient
+        return AsyncMongoMockClient()
+    from motor.motor_asyncio import AsyncIOMotorClient
+    return AsyncIOMotorClient(os.environ["MONGODB_URI"])
+
+
+# ---- Modèle de chat factice ----
+
+# Intentions reconnues dans les questions générées par les scénarios
+INTENTS = [
+    ("get_flights_info", re.compile(r"vols? de (?P<origin_city>\w+) à (?P<destination_city>\w+)(?: en (?P<departure_date>\d{4}-\d{2}))?")),
+    ("get_hotels_info", re.compile(r"hôtels?(?: (?P<stars>\d) étoiles)? à (?P<city>\w+)")),
+    ("get_restaurants_info", re.compile(r"restaurants?(?: (?P<cuisine>\w+))? à (?P<city>\w+)")),
+    ("get_weather_info", re.compile(r"météo à (?P<city>\w+)")),
+]
+
+
+def _usage(prompt: str, completion: str) -> Dict[str, int]:
+    prompt_tokens, completion_tokens = len(prompt) // 4 + 1, len(completion) // 4 + 1
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+class FakeChatModel:
+    """
+    Remplace `ChatOpenAI` : réponses déterministes, latence configurable.
+    - Une question reconnue par `INTENTS` produit les appels d'outils correspondants
+      (plusieurs à la fois pour une question composée).
+    - Après des résultats d'outils, produit une reformulation de `answer_words` mots.
+    - En streaming, les mots sont émis un par un avec `token_delay` secondes d'intervalle.
+    """
+
+    def __init__(self, latency: float = 0.2, token_delay: float = 0.0, answer_words: int = 60):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.answer_words = answer_words
+        self.calls = Counter()
+
+    def _reply(self, messages: List, tools: Optional[List], tool_choice: Optional[str]) -> AIMessage:
+        if tools and tool_choice != "none" and not isinstance(messages[-1], ToolMessage):
+            question = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+            tool_calls = []
+            for name, pattern in INTENTS:
+                match = pattern.search(question)
+                if match:
+                    args = {key: value for key, value in match.groupdict().items() if value}
+                    if "stars" in args:
+                        args["stars"] = int(args["stars"])
+                    tool_calls.append({"name": name, "args": args, "id": f"call_{len(tool_calls)}"})
+            if tool_calls:
+                self.calls["tool_selection"] += 1
+                return AIMessage(content="", tool_calls=tool_calls)
+
+        results = [m.content for m in messages if isinstance(m, ToolMessage)]
+        self.calls["rephrase" if results else "answer"] += 1
+        words = " ".join(results).split() or ["Réponse", "simulée", "de", "l'assistant."]
+        return AIMessage(content=" ".join(words[i % len(words)] for i in range(self.answer_words)))
+
+    async def agenerate(self, batches, tools=None, tool_choice=None, **kwargs):
+        messages = batches[0]
+        await asyncio.sleep(self.latency)
+        message = self._reply(messages, tools, tool_choice)
+        prompt = " ".join(str(m.content) for m in messages)
+        completion = message.content or json.dumps(message.tool_calls)
+        return LLMResult(generations=[[ChatGeneration(message=message)]],
+                         llm_output={"token_usage": _usage(prompt, completion)})
+
+    async def astream(self, messages, tools=None, tool_choice=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        message = self._reply(messages, tools, tool_choice)
+        if message.tool_calls:
+            yield AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": index}
+                for index, call in enumerate(message.tool_calls)
+            ])
+        else:
+            for word in message.content.split(" "):
+                if self.token_delay:
+                    await asyncio.sleep(self.token_delay)
+                yield AIMessageChunk(content=word + " ")
+        usage = _usage(" ".join(str(m.content) for m in messages), message.content)
+        yield AIMessageChunk(content="", usage_metadata={
+            "input_tokens": usage["prompt_tokens"], "output_tokens": usage["completion_tokens"],
+            "total_tokens": usage["total_tokens"],
+        })
+
+
+# ---- Données générées ----
+
+async def seed_catalog(db, scale: int, seed: int = 42) -> Dict[str, int]:
+    """
+    Remplit `vols`, `hotels`, `restaurants` et `climat` (`scale` documents par ville et par collection,
+    sauf la météo : un relevé par jour sur `scale` jours). Les données sont reproductibles (`seed`).
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    documents = {"vols": [], "hotels": [], "restaurants": [], "climat": []}
+    for city in CITIES:
+        for i in range(scale):
+            departure = start + timedelta(days=rng.randrange(365), hours=rng.randrange(24))
+            documents["vols"].append({
+                "ville_dorigine": city,
+                "ville_de_destination": rng.choice([c for c in CITIES if c != city]),
+                "date_de_depart": departure.replace(hour=0),
+                "numero_de_vol": f"{rng.choice('AEIKLT')}{rng.choice('FKHBAU')}{rng.randrange(100, 9999)}",
+                "compagnie_aerienne": rng.choice(AIRLINES),
+                "heure_de_depart": departure.strftime("%H:%M"),
+                "heure_arrivee": (departure + timedelta(hours=rng.randrange(1, 14))).strftime("%H:%M"),
+            })
+            documents["hotels"].append({
+                "ville": city,
+                "nom_de_lhôtel": f"Hôtel {city} {i}",
+                "etoiles": rng.randint(1, 5),
+                "adresse": f"{rng.randrange(1, 200)} rue {rng.choice(CITIES)}",
+                "date_de_disponibilite": (start + timedelta(days=rng.randrange(365))).strftime("%Y-%m-%d"),
+            })
+            documents["restaurants"].append({
+                "ville": city,
+                "nom_du_restaurant": f"Restaurant {city} {i}",
+                "cuisine": rng.choice(CUISINES),
+                "budget": rng.choice(["$", "$$", "$$$"]),
+                "evaluation": round(rng.uniform(2.5, 5), 1),
+                "adresse": f"{rng.randrange(1, 200)} avenue {rng.choice(CITIES)}",
+            })
+            documents["climat"].append({
+                "ville": city,
+                "date": start + timedelta(days=i),
+                "condition": rng.choice(CONDITIONS),
+                "temperature_(°c)": round(rng.uniform(-5, 40), 1),
+            })
+    for name, docs in documents.items():
+        await db[name].delete_many({})
+        await db[name].insert_many(docs)
+    return {name: len(docs) for name, docs in documents.items()}
+
+
+async def seed_conversation(mongo_service, session_id: str, user_id: str, messages: int) -> None:
+    """Crée une session active contenant `messages` messages (questions et réponses alternées)."""
+    await mongo_service.conversations_collection.update_many({"user_id": user_id}, {"$set": {"is_active": False}})
+    await mongo_service.conversations_collection.insert_one(mongo_service.new_session_document(session_id, user_id))
+    batch = []
+    for i in range(messages):
+        batch.append({
+            "id": f"msg_{session_id}_{i}",
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Message {i} : " + "contenu de la conversation " * 8,
+            "timestamp": datetime.utcnow(),
+            "user_id": user_id,
+        })
+        if len(batch) == 100:
+            await mongo_service.append_messages(session_id, batch)
+            batch = []
+    if batch:
+        await mongo_service.append_messages(session_id, batch)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentile par interpolation linéaire (0 <= q <= 100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
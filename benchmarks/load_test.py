@@ -0,0 +1,306 @@
+"""
+Test de charge hors ligne de l'API FastAPI : LLM factice et MongoDB en mémoire (ou mongod local).
+
+Les requêtes traversent toute l'application (routes, middleware, services) via un transport ASGI.
+Chaque scénario est exécuté par `--users` utilisateurs virtuels concurrents jusqu'à `--requests`
+requêtes HTTP ; le rapport JSON donne les latences p50/p95/p99, le débit, les opérations MongoDB
+et les appels au LLM par requête.
+
+Usage (depuis la racine du projet) :
+    python benchmarks/load_test.py [--backend mock|mongo] [--scenarios conversation,long_session,tool_heavy,stream]
+                                   [--users 20] [--requests 200] [--llm-latency 0.2] [--scale 200]
+                                   [--history 400] [--output resultats.json] [--compare reference.json]
+
+Les réglages de l'application (caches, historique, stockage...) se font par variables d'environnement,
+comme en production ; les index ne sont créés qu'avec `--backend mongo`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+from harness import (  # ajoute app/ au chemin d'import
+    CITIES, CUISINES, CountingClient, FakeChatModel, make_client, percentile, seed_catalog, seed_conversation,
+)
+
+os.environ.setdefault("AUTO_CREATE_INDEXES", "false")
+
+import httpx  # noqa: E402
+
+from main import app  # noqa: E402
+from services.container import ServiceContainer  # noqa: E402
+
+ERROR_MARKER = "Une erreur critique est survenue"
+
+
+class Recorder:
+    """Latences et erreurs par point d'accès, pour un scénario."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.first_tokens: List[float] = []
+        self.errors = Counter()
+        self.count = 0  # Requêtes émises (réussies ou non)
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        self.count += 1
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except Exception:
+            self.errors[name] += 1
+            return None
+        self.latencies[name].append(time.perf_counter() - started)
+        if response.status_code >= 400 or ERROR_MARKER in response.text:
+            self.errors[name] += 1
+        return response
+
+    async def stream(self, client: httpx.AsyncClient, name: str, url: str, payload: Dict) -> None:
+        self.count += 1
+        started = time.perf_counter()
+        first_token = None
+        try:
+            async with client.stream("POST", url, json=payload) as response:
+                async for line in response.aiter_lines():
+                    if first_token is None and line == "event: token":
+                        first_token = time.perf_counter() - started
+                    if line == "event: error":
+                        self.errors[name] += 1
+        except Exception:
+            self.errors[name] += 1
+            return
+        self.latencies[name].append(time.perf_counter() - started)
+        if first_token is not None:
+            self.first_tokens.append(first_token)
+
+
+def _latency_summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "mean_ms": 1000 * sum(values) / len(values) if values else 0.0,
+        "p50_ms": 1000 * percentile(values, 50),
+        "p95_ms": 1000 * percentile(values, 95),
+        "p99_ms": 1000 * percentile(values, 99),
+        "max_ms": 1000 * max(values, default=0.0),
+    }
+
+
+# ---- Scénarios ----
+
+async def register_and_login(client: httpx.AsyncClient, recorder: Recorder) -> Optional[Dict]:
+    username = f"bench_{uuid4().hex[:12]}"
+    response = await recorder.request(client, "register", "POST", "/chat/register", json={
+        "username": username, "password": "secret", "age": 30, "loisirs": ["voyage"],
+        "pays_de_naissance": "France", "pays_de_residence": "France", "ville_de_residence": "Paris",
+    })
+    if response is None or response.status_code >= 400:
+        return None
+    response = await recorder.request(client, "login", "POST", "/chat/login",
+                                      json={"username": username, "password": "secret"})
+    return response.json() if response is not None and response.status_code < 400 else None
+
+
+def simple_question(rng: random.Random) -> str:
+    return rng.choice([
+        "Bonjour, que peux-tu faire pour moi ?",
+        f"Quels hôtels à {rng.choice(CITIES)} ?",
+        f"Des restaurants {rng.choice(CUISINES)} à {rng.choice(CITIES)} ?",
+        f"Quelle météo à {rng.choice(CITIES)} ?",
+    ])
+
+
+def tool_heavy_question(rng: random.Random) -> str:
+    origin, destination = rng.sample(CITIES, 2)
+    return (f"Je cherche des vols de {origin} à {destination} en 2025-{rng.randint(1, 12):02d}, "
+            f"des hôtels {rng.randint(3, 5)} étoiles à {destination}, des restaurants à {destination} "
+            f"et la météo à {destination}.")
+
+
+async def conversation(client, recorder, rng, state, options) -> None:
+    """Inscription, connexion puis quelques questions (parcours d'un nouvel utilisateur)."""
+    user = await register_and_login(client, recorder)
+    if not user:
+        return
+    for _ in range(3):
+        await recorder.request(client, "ask", "POST", "/chat/ask",
+                               json={"user_id": user["user_id"], "question": simple_question(rng)})
+
+
+async def long_session(client, recorder, rng, state, options) -> None:
+    """Questions posées dans une session qui contient déjà un long historique."""
+    user_id = state.get("user_id")
+    if user_id is None:
+        user_id = state["user_id"] = f"user_{uuid4()}"
+        await seed_conversation(options["mongo_service"], f"session_{uuid4()}", user_id, options["history"])
+    await recorder.request(client, "ask", "POST", "/chat/ask",
+                           json={"user_id": user_id, "question": simple_question(rng)})
+
+
+async def tool_heavy(client, recorder, rng, state, options) -> None:
+    """Questions composées déclenchant plusieurs appels d'outils en parallèle."""
+    user_id = state.setdefault("user_id", f"user_{uuid4()}")
+    await recorder.request(client, "ask", "POST", "/chat/ask",
+                           json={"user_id": user_id, "question": tool_heavy_question(rng)})
+
+
+async def stream(client, recorder, rng, state, options) -> None:
+    """Questions composées en mode streamé (SSE) : latence totale et délai avant le premier token."""
+    user_id = state.setdefault("user_id", f"user_{uuid4()}")
+    await recorder.stream(client, "ask_stream", "/chat/ask/stream",
+                          {"user_id": user_id, "question": tool_heavy_question(rng)})
+
+
+SCENARIOS = {
+    "conversation": conversation,
+    "long_session": long_session,
+    "tool_heavy": tool_heavy,
+    "stream": stream,
+}
+
+
+# ---- Exécution ----
+
+async def run_scenario(name: str, client: httpx.AsyncClient, services: ServiceContainer,
+                       fake_llm: FakeChatModel, options: Dict) -> Dict:
+    counter = services.mongo_client.counter
+    recorder = Recorder()
+    scenario = SCENARIOS[name]
+
+    # Préparation (historiques pré-remplis) exclue des mesures
+    states = [{} for _ in range(options["users"])]
+    if name == "long_session":
+        for index, state in enumerate(states):
+            await scenario(client, Recorder(), random.Random(index), state, options)
+
+    counter.clear()
+    llm_calls_before = sum(fake_llm.calls.values())
+
+    async def virtual_user(index: int) -> None:
+        rng = random.Random(options["seed"] + index)
+        while recorder.count < options["requests"]:
+            await scenario(client, recorder, rng, states[index], options)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(index) for index in range(options["users"])))
+    elapsed = time.perf_counter() - started
+
+    requests = recorder.count
+    all_latencies = [value for values in recorder.latencies.values() for value in values]
+    result = {
+        "requests": requests,
+        "errors": sum(recorder.errors.values()),
+        "duration_s": elapsed,
+        "rps": requests / elapsed if elapsed else 0.0,
+        "latency": _latency_summary(all_latencies),
+        "endpoints": {
+            endpoint: {**_latency_summary(values), "errors": recorder.errors[endpoint]}
+            for endpoint, values in sorted(recorder.latencies.items())
+        },
+        "mongo_ops_per_request": sum(counter.values()) / requests if requests else 0.0,
+        "mongo_ops_by_operation": {op: count / requests for op, count in sorted(counter.items())},
+        "llm_calls_per_request": (sum(fake_llm.calls.values()) - llm_calls_before) / requests if requests else 0.0,
+    }
+    if recorder.first_tokens:
+        result["first_token"] = _latency_summary(recorder.first_tokens)
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict, reference: Dict) -> Dict:
+    """Écart relatif (en %) du débit et des latences p95/p99 par rapport à une exécution de référence."""
+    deltas = {}
+    for name, current in results["scenarios"].items():
+        previous = reference.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        deltas[name] = {
+            metric: 100 * (now - before) / before if before else None
+            for metric, now, before in (
+                ("rps", current["rps"], previous["rps"]),
+                ("p95_ms", current["latency"]["p95_ms"], previous["latency"]["p95_ms"]),
+                ("p99_ms", current["latency"]["p99_ms"], previous["latency"]["p99_ms"]),
+                ("mongo_ops_per_request", current["mongo_ops_per_request"], previous["mongo_ops_per_request"]),
+            )
+        }
+    return deltas
+
+
+async def main(args: argparse.Namespace) -> None:
+    mongo_client = CountingClient(make_client(args.backend), Counter())
+    services = ServiceContainer(mongo_client)
+    fake_llm = FakeChatModel(latency=args.llm_latency, token_delay=args.token_delay)
+    services.llm_service.chat_model = fake_llm
+
+    catalog = await seed_catalog(services.mongo_service.db, args.scale, args.seed)
+    if args.backend == "mongo":
+        await services.llm_service.initialize_indexes()
+    await services.startup()
+    app.state.services = services
+
+    options = {
+        "users": args.users,
+        "requests": args.requests,
+        "history": args.history,
+        "seed": args.seed,
+        "mongo_service": services.mongo_service,
+    }
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "backend": args.backend, "users": args.users, "requests": args.requests,
+            "llm_latency_s": args.llm_latency, "token_delay_s": args.token_delay,
+            "scale": args.scale, "history": args.history, "catalog": catalog,
+        },
+        "scenarios": {},
+    }
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for name in args.scenarios.split(","):
+                results["scenarios"][name] = await run_scenario(name, client, services, fake_llm, options)
+    finally:
+        await services.shutdown()
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            results["comparison"] = {"reference": args.compare, "delta_percent": compare(results, json.load(file))}
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["mock", "mongo"], default="mock")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--users", type=int, default=20, help="Utilisateurs virtuels concurrents")
+    parser.add_argument("--requests", type=int, default=200, help="Requêtes HTTP par scénario")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Latence de chaque appel au LLM (s)")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Délai entre deux tokens streamés (s)")
+    parser.add_argument("--scale", type=int, default=200, help="Documents par ville et par collection du catalogue")
+    parser.add_argument("--history", type=int, default=400, help="Messages déjà présents dans le scénario long_session")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Fichier JSON de résultats")
+    parser.add_argument("--compare", help="Résultats de référence (JSON) à comparer")
+    args = parser.parse_args()
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Scénarios inconnus : {', '.join(sorted(unknown))}")
+    asyncio.run(main(args))
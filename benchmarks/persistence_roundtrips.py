@@ -0,0 +1,92 @@
+"""
+Compte les allers-retours MongoDB par requête `/chat/ask`, avant et après la persistance groupée.
+
+Le LLM est remplacé par un modèle factice : seul l'accès à MongoDB est mesuré.
+
+Usage (depuis la racine du projet) :
+    python benchmarks/persistence_roundtrips.py [--backend mock|mongo] [--requests 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+from collections import Counter
+from uuid import uuid4
+
+from harness import CountingCollection, make_client  # ajoute app/ au chemin d'import
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from services.llm_service import LLMService
+
+
+class StaticChatModel:
+    """Modèle factice : répond immédiatement sans appel de fonction."""
+
+    async def agenerate(self, batches, **kwargs):
+        return LLMResult(generations=[[ChatGeneration(message=AIMessage(content="Réponse de test."))]])
+
+
+def use_database(llm_service: LLMService, client, counter: Counter) -> None:
+    """Branche le service sur `client` et instrumente ses collections."""
+    mongo_service = llm_service.mongo_service
+    mongo_service.client = client
+    mongo_service.db = client[os.environ["DATABASE_NAME"]]
+    mongo_service.users_collection = CountingCollection(mongo_service.db["users"], counter)
+    mongo_service.conversations_collection = CountingCollection(mongo_service.db["conversations"], counter)
+    mongo_service.buckets_collection = CountingCollection(mongo_service.db["conversation_buckets"], counter)
+
+
+async def legacy_ask(llm_service: LLMService, user_id: str, question: str) -> None:
+    """Reproduit la séquence d'accès MongoDB de l'implémentation initiale de `/ask`."""
+    conversations = llm_service.mongo_service.conversations_collection
+    session = await conversations.find_one({"user_id": user_id, "is_active": True})
+    session_id = session["session_id"]
+    await conversations.find_one({"session_id": session_id})  # chargement de l'historique
+    for role, content in (("user", question), ("assistant", "Réponse de test.")):
+        await conversations.find_one({"session_id": session_id})  # vérification d'existence
+        await conversations.update_one(
+            {"session_id": session_id},
+            {"$push": {"messages": {"role": role, "content": content, "user_id": user_id}}},
+        )
+
+
+async def current_ask(llm_service: LLMService, user_id: str, question: str) -> None:
+    """Chemin actuel de `/ask` : résolution + historique en une requête, écriture groupée."""
+    session = await llm_service.resolve_active_session(user_id)
+    await llm_service.generate_response(question, session["session_id"], user_id, session)
+
+
+async def measure(llm_service: LLMService, counter: Counter, ask, requests: int) -> dict:
+    user_id = f"user_{uuid4()}"
+    await llm_service.create_new_session(user_id)
+    counter.clear()
+    for i in range(requests):
+        await ask(llm_service, user_id, f"Question {i}")
+    return {
+        "requests": requests,
+        "roundtrips_per_request": sum(counter.values()) / requests,
+        "by_operation": {name: count / requests for name, count in sorted(counter.items())},
+    }
+
+
+async def main(backend: str, requests: int) -> None:
+    counter = Counter()
+    llm_service = LLMService()
+    llm_service.chat_model = StaticChatModel()
+    use_database(llm_service, make_client(backend), counter)
+
+    results = {
+        "backend": backend,
+        "before": await measure(llm_service, counter, legacy_ask, requests),
+        "after": await measure(llm_service, counter, current_ask, requests),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["mock", "mongo"], default="mock")
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.backend, args.requests))
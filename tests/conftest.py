@@ -0,0 +1,15 @@
+"""
+Configuration commune des tests : le code de l'application est importé depuis `app`
+(comme dans les benchmarks) et les variables obligatoires ont des valeurs de test.
+
+Dépendances : requirements.txt et tests/requirements.txt (mongomock-motor).
+Les tests sont synchrones et exécutent leurs coroutines avec `asyncio.run`.
+"""
+import os
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+sys.path.insert(0, APP_DIR)
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "tests")
+os.environ.setdefault("OPENAI_API_KEY", "sk-tests")
@@ -0,0 +1,202 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("pymongo")
+pytest.importorskip("dotenv")
+
+from core.config import Config  # noqa: E402
+from services.message_buffer import MessageBuffer, MessageBufferFull  # noqa: E402
+
+
+class FakeCollection:
+    def with_options(self, **kwargs):
+        return self
+
+
+class FakeMongoService:
+    """Ajouts en mode bucket, avec des échecs programmés par session."""
+
+    def __init__(self, failures=None):
+        self.conversations_collection = FakeCollection()
+        self.failures = dict(failures or {})
+        self.appended = {}
+
+    async def append_messages(self, session_id, messages):
+        if self.failures.get(session_id, 0) > 0:
+            self.failures[session_id] -= 1
+            raise ConnectionError("MongoDB indisponible")
+        self.appended.setdefault(session_id, []).extend(msg["id"] for msg in messages)
+        return True
+
+
+class ApplyThenFailCollection:
+    """Collection dont les premiers `bulk_write` sont appliqués puis signalés en échec (délai réseau)."""
+
+    def __init__(self, collection, failures: int):
+        self.collection = collection
+        self.failures = failures
+
+    def with_options(self, **kwargs):
+        return self
+
+    async def bulk_write(self, operations, **kwargs):
+        result = await self.collection.bulk_write(operations, **kwargs)
+        if self.failures > 0:
+            self.failures -= 1
+            raise TimeoutError("Délai dépassé")
+        return result
+
+    def find(self, *args, **kwargs):
+        return self.collection.find(*args, **kwargs)
+
+
+class EmbeddedMongoService:
+    def __init__(self, collection):
+        self.conversations_collection = collection
+
+
+def msg(message_id: str) -> dict:
+    return {"id": message_id, "role": "user", "content": message_id, "user_id": "u1"}
+
+
+@pytest.fixture(autouse=True)
+def bucket_storage(monkeypatch):
+    monkeypatch.setattr(Config, "conversation_storage", "bucket")
+
+
+def test_only_failed_sessions_are_retried():
+    async def scenario():
+        mongo = FakeMongoService(failures={"b": 1})
+        buffer = MessageBuffer(mongo)
+        await buffer.enqueue("a", [msg("a1"), msg("a2")])
+        await buffer.enqueue("b", [msg("b1")])
+
+        await buffer.flush()
+        assert mongo.appended == {"a": ["a1", "a2"]}
+        assert buffer.pending("b") == [msg("b1")]
+        assert buffer.stats()["pending"] == 1
+
+        await buffer.enqueue("b", [msg("b2")])
+        await buffer.flush()
+        assert mongo.appended == {"a": ["a1", "a2"], "b": ["b1", "b2"]}
+        assert buffer.stats()["pending"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_save_is_rejected_when_backlog_does_not_drain():
+    async def scenario():
+        mongo = FakeMongoService(failures={"a": 100})
+        buffer = MessageBuffer(mongo, max_pending=2, max_wait=0.05)
+        await buffer.enqueue("a", [msg("a1"), msg("a2")])
+        await buffer.flush()  # Échec : les messages restent en attente
+        with pytest.raises(MessageBufferFull):
+            await buffer.enqueue("a", [msg("a3")])
+        assert buffer.stats()["rejected"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_waiting_save_resumes_after_flush():
+    async def scenario():
+        mongo = FakeMongoService()
+        buffer = MessageBuffer(mongo, max_pending=2, max_wait=1)
+        await buffer.enqueue("a", [msg("a1"), msg("a2")])
+        waiting = asyncio.create_task(buffer.enqueue("a", [msg("a3")]))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        await buffer.flush()
+        await waiting
+        assert buffer.pending("a") == [msg("a3")]
+
+    asyncio.run(scenario())
+
+
+def test_snapshot_keeps_messages_flushed_during_a_read():
+    async def scenario():
+        buffer = MessageBuffer(FakeMongoService())
+        await buffer.enqueue("a", [msg("a1")])
+        snapshot = buffer.snapshot()
+        await buffer.flush()  # Écriture terminée pendant la lecture (qui n'a pas vu a1)
+        session = buffer.merge_pending({"session_id": "a", "messages": [], "message_count": 0}, snapshot=snapshot)
+        assert [m["id"] for m in session["messages"]] == ["a1"]
+        assert session["message_count"] == 1
+        # Lecture postérieure à l'écriture : pas de doublon
+        session = buffer.merge_pending({"session_id": "a", "messages": [msg("a1")], "message_count": 1}, snapshot=snapshot)
+        assert session["message_count"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_spill_segment_keeps_only_failed_sessions(tmp_path):
+    async def scenario():
+        spill = str(tmp_path / "spill")
+        buffer = MessageBuffer(FakeMongoService(failures={"b": 1}), spill_path=spill)
+        await buffer.start()
+        await buffer.enqueue("a", [msg("a1")])
+        await buffer.enqueue("b", [msg("b1")])
+        await buffer.flush()
+        buffer._task.cancel()
+
+        # Redémarrage : seul le lot non écrit est rejoué
+        recovered = MessageBuffer(FakeMongoService(), spill_path=spill)
+        await asyncio.to_thread(recovered._recover)
+        assert recovered.pending("a") == []
+        assert [m["id"] for m in recovered.pending("b")] == ["b1"]
+
+    asyncio.run(scenario())
+
+
+def test_partially_applied_batch_keeps_newer_messages(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    monkeypatch.setattr(Config, "conversation_storage", "embedded")
+
+    async def scenario():
+        conversations = mongomock_motor.AsyncMongoMockClient()["tests"]["conversations"]
+        await conversations.insert_one({"session_id": "a", "messages": [], "message_count": 0})
+        buffer = MessageBuffer(EmbeddedMongoService(ApplyThenFailCollection(conversations, failures=1)))
+
+        await buffer.enqueue("a", [msg("a1"), msg("a2")])
+        await buffer.flush()  # Écrit, mais signalé en échec : le lot est remis en file
+        assert buffer.stats()["pending"] == 2
+        await buffer.enqueue("a", [msg("a3"), msg("a4")])
+        await buffer.flush()
+
+        session = await conversations.find_one({"session_id": "a"})
+        assert [m["id"] for m in session["messages"]] == ["a1", "a2", "a3", "a4"]
+        assert session["message_count"] == 4
+        assert buffer.stats()["pending"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_buffer_is_reported_as_503_by_generate_response(monkeypatch):
+    pytest.importorskip("langchain_openai")
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from fastapi import HTTPException
+    from langchain_core.messages import HumanMessage
+
+    from models.models import ChatResponse
+    from services.llm_service import LLMService
+    from services.mongo_service import MongoService
+
+    async def scenario():
+        service = LLMService(MongoService(mongomock_motor.AsyncMongoMockClient()))
+        service.message_buffer = MessageBuffer(service.mongo_service, max_pending=0, max_wait=0)
+
+        async def build_messages(message, session_id, session):
+            return [HumanMessage(content=message)]
+
+        async def cached_response(message, user_id, messages):
+            return "global", ChatResponse(response="Réponse en cache")
+
+        monkeypatch.setattr(service, "_build_messages", build_messages)
+        monkeypatch.setattr(service, "_lookup_cached_response", cached_response)
+
+        with pytest.raises(HTTPException) as raised:
+            await service.generate_response("Hôtels à Paris", "s1", "u1")
+        assert raised.value.status_code == 503
+        assert "Retry-After" in raised.value.headers
+
+    asyncio.run(scenario())
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("motor")
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from core.config import Config  # noqa: E402
+from services.mongo_service import MongoService  # noqa: E402
+
+
+def make_service(monkeypatch) -> MongoService:
+    monkeypatch.setattr(Config, "conversation_storage", "bucket")
+    service = MongoService(mongomock_motor.AsyncMongoMockClient())
+    service.bucket_size = 3
+    return service
+
+
+def message(index: int) -> dict:
+    return {"id": f"msg_{index}", "role": "user" if index % 2 == 0 else "assistant", "content": f"m{index}", "user_id": "u1"}
+
+
+async def new_bucket_session(service: MongoService, session_id: str = "s1") -> None:
+    await service.conversations_collection.insert_one(service.new_session_document(session_id, "u1"))
+
+
+def test_append_and_read_across_buckets(monkeypatch):
+    async def scenario():
+        service = make_service(monkeypatch)
+        await new_bucket_session(service)
+        for start in range(0, 8, 2):
+            assert await service.append_messages("s1", [message(start), message(start + 1)])
+
+        session = await service.get_session_window({"session_id": "s1"}, last=4)
+        assert [msg["id"] for msg in session["messages"]] == ["msg_4", "msg_5", "msg_6", "msg_7"]
+        assert session["message_count"] == 8
+        page = await service.get_messages_page(session, offset=2, limit=3)
+        assert [msg["id"] for msg in page] == ["msg_2", "msg_3", "msg_4"]
+        assert all("pos" not in msg for msg in page)
+
+    asyncio.run(scenario())
+
+
+def test_lost_position_does_not_shift_later_pages(monkeypatch):
+    async def scenario():
+        service = make_service(monkeypatch)
+        await new_bucket_session(service)
+        await service.append_messages("s1", [message(0), message(1)])
+        # Position réservée puis jamais écrite (échec entre `$inc` et `$push`)
+        await service.conversations_collection.update_one({"session_id": "s1"}, {"$inc": {"message_count": 1}})
+        await service.append_messages("s1", [message(3), message(4)])
+
+        session = await service.get_session_window({"session_id": "s1"})
+        assert [msg["id"] for msg in session["messages"]] == ["msg_0", "msg_1", "msg_3", "msg_4"]
+        page = await service.get_messages_page(session, offset=3, limit=2)
+        assert [msg["id"] for msg in page] == ["msg_3", "msg_4"]
+
+    asyncio.run(scenario())
+
+
+def test_messages_are_read_in_position_order(monkeypatch):
+    async def scenario():
+        service = make_service(monkeypatch)
+        await new_bucket_session(service)
+        # Deux ajouts concurrents dont les `$push` arrivent dans le désordre
+        await service.buckets_collection.insert_one({
+            "session_id": "s1", "seq": 0, "count": 2,
+            "messages": [{**message(1), "pos": 1}, {**message(0), "pos": 0}],
+        })
+        await service.conversations_collection.update_one({"session_id": "s1"}, {"$set": {"message_count": 2}})
+
+        session = await service.get_session_window({"session_id": "s1"})
+        assert [msg["id"] for msg in session["messages"]] == ["msg_0", "msg_1"]
+
+    asyncio.run(scenario())
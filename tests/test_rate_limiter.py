@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+openai = pytest.importorskip("openai")
+pytest.importorskip("prometheus_client")
+
+from services.rate_limiter import LLMOverloaded, LLMRateLimiter  # noqa: E402
+
+
+def rate_limit_error(headers=None) -> openai.RateLimitError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    return openai.RateLimitError("429", response=httpx.Response(429, headers=headers or {}, request=request), body=None)
+
+
+def test_throttling_halves_the_limit_then_recovers():
+    async def scenario():
+        limiter = LLMRateLimiter(max_concurrency=8, base_delay=0, max_delay=0)
+        failures = iter([rate_limit_error()])
+
+        async def call():
+            error = next(failures, None)
+            if error:
+                raise error
+            return "ok"
+
+        assert await limiter.call(call) == "ok"
+        assert limiter.limit == 4 and limiter.retries == 1 and limiter.throttled == 1
+
+        # Une série de `limit` succès relève la limite d'un cran
+        for _ in range(4):
+            await limiter.call(call)
+        assert limiter.limit == 5
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_header_sets_the_delay():
+    limiter = LLMRateLimiter(max_delay=20)
+    assert limiter._retry_delay(rate_limit_error({"retry-after": "3"}), attempt=0) == 3
+    assert limiter._retry_delay(rate_limit_error({"retry-after-ms": "250"}), attempt=0) == 0.25
+    assert limiter._retry_delay(rate_limit_error({"retry-after": "120"}), attempt=0) == 20
+    assert 0 <= limiter._retry_delay(rate_limit_error(), attempt=2) <= limiter.base_delay * 4
+
+
+def test_non_retryable_error_is_raised_immediately():
+    async def scenario():
+        limiter = LLMRateLimiter()
+
+        async def call():
+            raise KeyError("réponse inattendue")
+
+        with pytest.raises(KeyError):
+            await limiter.call(call)
+        assert limiter.retries == 0 and limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_exhausted_retries_raise_overloaded():
+    async def scenario():
+        limiter = LLMRateLimiter(max_retries=2, base_delay=0, max_delay=0)
+
+        async def call():
+            raise rate_limit_error()
+
+        with pytest.raises(LLMOverloaded):
+            await limiter.call(call)
+        assert limiter.retries == 2 and limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_rejected_after_max_wait():
+    async def scenario():
+        limiter = LLMRateLimiter(max_concurrency=1, max_wait=0.05)
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return "ok"
+
+        running = asyncio.create_task(limiter.call(slow))
+        await asyncio.sleep(0)
+        with pytest.raises(LLMOverloaded):
+            await limiter.call(slow)
+        assert limiter.stats()["rejected"] == 1
+
+        release.set()
+        assert await running == "ok"
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_overload_is_mapped_to_503_with_retry_after(monkeypatch):
+    pytest.importorskip("langchain_openai")
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from fastapi import HTTPException
+    from langchain_core.messages import HumanMessage
+
+    from services.llm_service import LLMService
+    from services.mongo_service import MongoService
+
+    async def scenario():
+        service = LLMService(MongoService(mongomock_motor.AsyncMongoMockClient()))
+
+        async def build_messages(message, session_id, session):
+            return [HumanMessage(content=message)]
+
+        async def no_cached_response(message, user_id, messages):
+            return None, None
+
+        async def overloaded(*args, **kwargs):
+            raise LLMOverloaded("Trop de requêtes en cours vers le LLM.", retry_after=2.4)
+
+        monkeypatch.setattr(service, "_build_messages", build_messages)
+        monkeypatch.setattr(service, "_lookup_cached_response", no_cached_response)
+        monkeypatch.setattr(service, "_route_locally", lambda message: None)
+        monkeypatch.setattr(service, "_generate", overloaded)
+
+        with pytest.raises(HTTPException) as raised:
+            await service.generate_response("Raconte-moi une anecdote de voyage", "s1", "u1")
+        assert raised.value.status_code == 503
+        assert raised.value.headers["Retry-After"] == "2"
+
+    asyncio.run(scenario())
@@ -0,0 +1,75 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pydantic")
+
+from models.models import ChatResponse
+from services.response_cache import ResponseCache, _VectorIndex, normalize_question
+
+
+class FakeEmbeddings:
+    """Embedding déterministe : un axe par mot porteur de sens."""
+
+    def __init__(self, vocabulary):
+        self.vocabulary = vocabulary
+
+    async def aembed_query(self, text):
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for word in text.split():
+            if word in self.vocabulary:
+                vector[self.vocabulary.index(word)] = 1.0
+        return vector.tolist()
+
+
+class _Row:
+    def __init__(self, vector):
+        self.vector = np.asarray(vector, dtype=np.float32)
+        self.row = -1
+
+
+def test_vector_index_grows_and_keeps_rows_aligned():
+    index = _VectorIndex(dimension=3, capacity=2)
+    rows = [_Row(np.eye(3)[i % 3] * (i + 1)) for i in range(5)]
+    for row in rows:
+        index.add(row)
+    assert len(index) == 5 and len(index.matrix) >= 5
+
+    index.remove(rows[1])
+    index.remove(rows[0])
+    assert len(index) == 3
+    for position, entry in enumerate(index.entries):
+        assert entry.row == position
+        assert np.array_equal(index.matrix[position], entry.vector)
+    assert np.allclose(index.scores(np.array([1, 0, 0], dtype=np.float32)), [entry.vector[0] for entry in index.entries])
+
+
+def test_semantic_lookup_after_store_and_eviction():
+    async def scenario():
+        embeddings = FakeEmbeddings(["hotel", "hebergement", "paris", "lyon", "nice"])
+        cache = ResponseCache(embeddings=embeddings, similarity_threshold=0.4, max_entries=2)
+        for city in ["paris", "lyon", "nice"]:
+            await cache.store(f"hotel {city}", "global", ChatResponse(response=city), ["get_hotels_info"])
+
+        # "paris" a été évincé (LRU) : plus de correspondance, exacte ou sémantique
+        assert await cache.lookup("hébergement à Paris", "global") is None
+        hit = await cache.lookup("hébergement à Nice", "global")
+        assert hit is not None and hit.response == "nice"
+        assert cache.stats()["semantic_hits"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_flight_direction_is_part_of_the_match():
+    async def scenario():
+        # Embeddings identiques pour les deux sens : seul l'ordre des villes les distingue
+        cache = ResponseCache(embeddings=FakeEmbeddings(["vol", "paris", "dubai"]), similarity_threshold=0.5)
+        await cache.store("vols de Paris vers Dubai", "global", ChatResponse(response="PAR-DXB"), ["get_flights_info"])
+
+        assert normalize_question("vols de Dubai pour Paris") != normalize_question("vols pour Dubai de Paris")
+        assert await cache.lookup("vols de Dubai vers Paris", "global") is None
+        hit = await cache.lookup("vols au départ de Paris à destination de Dubai", "global")
+        assert hit is not None and hit.response == "PAR-DXB"
+
+    asyncio.run(scenario())
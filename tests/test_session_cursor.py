@@ -0,0 +1,48 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("motor")
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from bson import ObjectId  # noqa: E402
+
+from services.mongo_service import MongoService, decode_session_cursor, encode_session_cursor  # noqa: E402
+
+
+def test_cursor_round_trip():
+    session = {"updated_at": datetime(2025, 3, 1, 12, 30, 15, 123000), "_id": ObjectId()}
+    assert decode_session_cursor(encode_session_cursor(session)) == (session["updated_at"], session["_id"])
+
+
+@pytest.mark.parametrize("cursor", ["", "pas-un-curseur", "eyJ1IjogIjIwMjUifQ==", "eyJ1IjogIngiLCAiaSI6ICJ5In0="])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_session_cursor(cursor)
+
+
+def test_list_sessions_pages_without_gaps_or_duplicates():
+    async def scenario():
+        service = MongoService(mongomock_motor.AsyncMongoMockClient())
+        start = datetime(2025, 3, 1)
+        # Plusieurs sessions partagent le même `updated_at` : `_id` les départage
+        await service.conversations_collection.insert_many([
+            {"session_id": f"s{i}", "user_id": "u1", "updated_at": start + timedelta(minutes=i // 3),
+             "created_at": start, "is_active": False, "message_count": 0}
+            for i in range(10)
+        ] + [{"session_id": "autre", "user_id": "u2", "updated_at": start, "created_at": start, "message_count": 0}])
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = await service.list_sessions("u1", limit=4, cursor=cursor)
+            assert all("messages" not in session for session in page)
+            seen.extend(page)
+            if cursor is None:
+                break
+
+        assert len(seen) == 10 and len({session["session_id"] for session in seen}) == 10
+        keys = [(session["updated_at"], session["_id"]) for session in seen]
+        assert keys == sorted(keys, reverse=True)
+
+    asyncio.run(scenario())
@@ -0,0 +1,85 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from services import memory  # noqa: E402
+from services.memory import SessionStore  # noqa: E402
+
+
+def session(session_id: str, *contents: str) -> dict:
+    return {
+        "session_id": session_id,
+        "messages": [{"id": f"{session_id}_{i}", "content": content} for i, content in enumerate(contents)],
+        "message_count": len(contents),
+    }
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(memory.time, "monotonic", clock)
+    return clock
+
+
+def test_least_recently_used_session_is_evicted(clock):
+    store = SessionStore(max_sessions=2)
+    store.put("u1", session("s1", "a"))
+    store.put("u2", session("s2", "b"))
+    assert store.get("s1") is not None  # s2 devient la moins récemment utilisée
+    store.put("u3", session("s3", "c"))
+
+    assert store.get("s2") is None
+    assert store.get_active("u2") is None
+    assert store.get("s1") is not None and store.get("s3") is not None
+    assert store.stats()["evictions"] == 1
+
+
+def test_byte_budget_evicts_and_tracks_size(clock):
+    one = SessionStore()._estimate_size(session("s1", "x" * 100))
+    store = SessionStore(max_bytes=2 * one)
+    store.put("u1", session("s1", "x" * 100))
+    store.put("u2", session("s2", "y" * 100))
+    assert store.stats()["bytes"] == 2 * one
+
+    store.append("s2", [{"id": "s2_1", "content": "z" * 100}])
+    assert store.get("s1") is None
+    assert store.get("s2")["message_count"] == 2
+    assert store.stats()["bytes"] <= store.max_bytes
+
+
+def test_idle_sessions_expire(clock):
+    store = SessionStore(idle_ttl=60)
+    store.put("u1", session("s1", "a"))
+    clock.now += 30
+    assert store.get_active("u1")["session_id"] == "s1"  # l'accès repousse l'expiration
+    clock.now += 59
+    assert store.get("s1") is not None
+    clock.now += 61
+    assert store.get_active("u1") is None
+    assert store.stats()["sessions"] == 0 and store.stats()["bytes"] == 0
+
+
+def test_window_and_copies(clock):
+    store = SessionStore(window=2)
+    store.put("u1", session("s1", "a", "b", "c"))
+    cached = store.get("s1")
+    assert [msg["content"] for msg in cached["messages"]] == ["b", "c"]
+
+    cached["messages"].append({"id": "x", "content": "modifié"})
+    assert len(store.get("s1")["messages"]) == 2  # copie : la session stockée n'est pas modifiée
+
+
+def test_new_active_session_replaces_previous(clock):
+    store = SessionStore()
+    store.put("u1", session("s1", "a"))
+    store.put("u1", session("s2", "b"))
+    assert store.get("s1") is None
+    assert store.get_active("u1")["session_id"] == "s2"
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from services.cache import InMemoryCache, LoadCancelled, ToolCache
+
+
+def make_cache() -> ToolCache:
+    return ToolCache(InMemoryCache(max_entries=100, max_bytes=1024 * 1024), ttls={}, default_ttl=60)
+
+
+def test_concurrent_identical_calls_share_one_load():
+    async def scenario():
+        cache = make_cache()
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"ville": "Paris"}
+
+        results = await asyncio.gather(*(cache.get_or_call("get_hotels_info", {"ville": "Paris"}, loader) for _ in range(5)))
+        assert calls == 1
+        assert all(result == {"ville": "Paris"} for result in results)
+        assert cache.stats()["coalesced"] == 4
+        # Valeur désormais en cache
+        assert await cache.get_or_call("get_hotels_info", {"ville": "Paris"}, loader) == {"ville": "Paris"}
+        assert calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_leader_timeout_does_not_cancel_follower():
+    async def scenario():
+        cache = make_cache()
+
+        async def loader():
+            await asyncio.sleep(0.1)
+            return "résultat"
+
+        leader = asyncio.create_task(asyncio.wait_for(cache.get_or_call("get_weather_info", {}, loader), timeout=0.02))
+        await asyncio.sleep(0)  # Le premier appel lance le chargement
+        follower = asyncio.create_task(cache.get_or_call("get_weather_info", {}, loader))
+
+        with pytest.raises(asyncio.TimeoutError):
+            await leader
+        assert await follower == "résultat"
+        # Le chargement s'est terminé malgré l'abandon du premier appelant
+        assert await cache.backend.get(cache.make_key("get_weather_info", {})) == "résultat"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_load_raises_ordinary_error():
+    async def scenario():
+        cache = make_cache()
+
+        async def loader():
+            await asyncio.sleep(1)
+
+        caller = asyncio.create_task(cache.get_or_call("get_flights_info", {}, loader))
+        await asyncio.sleep(0)
+        cache._inflight[cache.make_key("get_flights_info", {})].cancel()
+        with pytest.raises(LoadCancelled):
+            await caller
+
+    asyncio.run(scenario())
+
+
+def test_loader_error_is_shared_and_not_cached():
+    async def scenario():
+        cache = make_cache()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ValueError("MongoDB indisponible")
+
+        results = await asyncio.gather(
+            cache.get_or_call("get_hotels_info", {}, failing),
+            cache.get_or_call("get_hotels_info", {}, failing),
+            return_exceptions=True,
+        )
+        assert all(isinstance(result, ValueError) for result in results)
+        assert await cache.backend.get(cache.make_key("get_hotels_info", {})) is None
+
+    asyncio.run(scenario())